@@ -42,7 +42,7 @@ import sys
 import shutil
 from glob import glob
 from datetime import datetime
-from itertools import chain
+from itertools import chain, takewhile
 from functools import partial
 import logging
 import csv
@@ -53,7 +53,7 @@ import yaml
 
 from urllib.parse import urlparse
 
-from elasticsearch.helpers import scan, parallel_bulk
+from elasticsearch.helpers import scan
 from elasticsearch_dsl import Search, query as dsl_query
 
 from logilab.database import get_connection
@@ -64,6 +64,7 @@ from cubicweb.cwctl import CWCTL
 from cubicweb.cwconfig import CubicWebConfiguration as cwcfg
 from cubicweb.toolsutils import Command, underline_title
 from cubicweb.server.serverconfig import ServerConfiguration
+from cubicweb.server.serverctl import source_cnx
 
 
 from cubicweb_elasticsearch import es as cwes
@@ -72,22 +73,47 @@ from cubicweb_elasticsearch.es import indexable_entities
 
 from cubicweb_francearchives import S3_ACTIVE, NOMINA_INDEXABLE_ETYPES, ColoredLogsMixIn
 from cubicweb_francearchives.storage import S3BfssStorageMixIn
-from cubicweb_francearchives import admincnx, i18n, sitemap, init_bfss, utils, rdfdump, commemodump
+from cubicweb_francearchives import (
+    admincnx,
+    i18n,
+    sitemap,
+    init_bfss,
+    utils,
+    rdfdump,
+    commemodump,
+    geomap,
+    rgaa,
+    suggest,
+)
 from cubicweb_francearchives.dataimport.dc import import_filepath as dc_import_filepath
 from cubicweb_francearchives.dataimport.directories import import_directory
 from cubicweb_francearchives.dataimport.ead import readerconfig
+from cubicweb_francearchives.dataimport.esbulk import (
+    ESBulkSink,
+    count_es_failures,
+    es_failures_enabled,
+    replay_es_failures,
+)
+from cubicweb_francearchives.dataimport import importall
 from cubicweb_francearchives.dataimport.importer import import_filepaths
-from cubicweb_francearchives.dataimport import oai, es_bulk_index, log_in_db, strip_html
+from cubicweb_francearchives.dataimport import (
+    oai,
+    load_services_map,
+    log_in_db,
+    strip_html,
+)
 from cubicweb_francearchives.entities.es import SUGGEST_ETYPES
 from cubicweb_francearchives.entities.indexes import (
     LocationAuthority,
     SubjectAuthority,
     AgentAuthority,
 )
+from cubicweb_francearchives.cssimages import regenerate_css_thumbnails
 from cubicweb_francearchives.dataimport.eac import eac_import_files
 from cubicweb_francearchives.dataimport.maps import import_maps
 from cubicweb_francearchives.dataimport.newsletter import import_subscribers
 from cubicweb_francearchives.utils import init_repository, es_start_letter
+from cubicweb_francearchives.utils import bump_search_indexes_generation
 from cubicweb_francearchives.xmlutils import enhance_accessibility
 from cubicweb_francearchives import CMS_OBJECTS, CMS_I18N_OBJECTS
 from cubicweb_francearchives.dataimport.scripts.generate_ape_ead import generate_ape_ead_files
@@ -122,21 +148,14 @@ ETYPES_ES_MAP = {
 
 
 def get_indexable_fa(cnx, etype, chunksize=100000):
-    lasteid = 0
     rql = (
-        "Any X, E, D, U, S ORDERBY X LIMIT {} WHERE "
+        "Any X, E, D, U, S WHERE "
         "X is {}, E is EsDocument, E entity X, E doc D, "
-        "X cwuri U, X stable_id S, "
-        "X eid > %(l)s"
-    ).format(chunksize, etype)
-    while True:
-        rset = cnx.execute(rql, {"l": lasteid})
-        if not rset:
-            break
+        "X cwuri U, X stable_id S"
+    ).format(etype)
+    for rset in utils.iter_rql_chunks(cnx, rql, chunksize=chunksize):
         for e in rset.entities():
             yield e
-        cnx.drop_entity_cache()
-        lasteid = rset[-1][0]
 
 
 class PniaIndexInEs(IndexInES):
@@ -147,6 +166,11 @@ class PniaIndexInEs(IndexInES):
 
     """
 
+    def run(self, args):
+        appid = args[0]
+        super(PniaIndexInEs, self).run(args)
+        bump_search_indexes_generation(cwcfg.config_for(appid))
+
     def bulk_actions(self, etypes, cnx, index_name=None, dry_run=False):
         etypes = set(etypes) & set(cwes.indexable_types(cnx.vreg.schema))
         if not etypes:
@@ -223,7 +247,15 @@ class PniaIndexInEs(IndexInES):
 
 
 class ImportAll(Command):
-    """call all import command"""
+    """call all import command
+
+    Steps are listed in the `commands` entry of the configuration file. Each
+    step may declare the steps it depends on (`depends_on`), the number of
+    slots it uses (`slots`, e.g. its number of processes) and the command it
+    runs (`command`, defaults to the step name). Independent steps are run
+    concurrently within the `--jobs` budget, except the steps importing
+    through a massive store which are run one at a time.
+    """
 
     arguments = "<instance>"
     name = "import-all"
@@ -256,20 +288,40 @@ class ImportAll(Command):
                 "help": ("Commande d'import à partir de laquelle reprendre " "l'import"),
             },
         ),
+        (
+            "resume",
+            {
+                "short": "r",
+                "action": "store_true",
+                "default": False,
+                "help": "reprendre l'import précédent en ignorant les étapes déjà terminées",
+            },
+        ),
+        (
+            "jobs",
+            {
+                "short": "j",
+                "type": "int",
+                "default": 1,
+                "help": (
+                    "nombre maximal de slots (processus, connexions à la base) "
+                    "utilisés simultanément par les étapes"
+                ),
+            },
+        ),
     ]
 
-    def _build_cmd(self, cmd):
-        cmd_line = [cmd, self.appid]
-        if cmd not in self.yamlconfig:
-            return cmd_line
-        for k, v in list(self.yamlconfig[cmd].get("opts", {}).items()):
+    def _build_cmd(self, step):
+        stepconfig = self.yamlconfig.get(step) or {}
+        cmd_line = [stepconfig.get("command", step), self.appid]
+        for k, v in list(stepconfig.get("opts", {}).items()):
             opt_name = "--%s" % k
             if isinstance(v, bool) and v:
                 cmd_line.append(opt_name)
             else:
                 cmd_line.append(opt_name)
-                cmd_line.append(v)
-        for arg in self.yamlconfig[cmd].get("args", []):
+                cmd_line.append(str(v))
+        for arg in stepconfig.get("args", []):
             if "*" in arg:
                 cmd_line += glob(arg)
             else:
@@ -285,24 +337,41 @@ class ImportAll(Command):
             sys.exit(1)
         with open(self.config.config) as f:
             self.yamlconfig = yaml.load(f)
-        toskip = self.config.skip or ()
+        try:
+            steps = importall.build_steps(self.yamlconfig, self._build_cmd)
+        except ValueError as exc:
+            print("[import-all] {}".format(exc), file=sys.stderr)
+            sys.exit(1)
+        done = set(self.config.skip or ())
         fromcmd = self.config.import_from
-        for cmdname in self.yamlconfig["commands"]:
-            if fromcmd:
-                if fromcmd != cmdname:
-                    print("[import-all] skipping {}".format(cmdname))
-                    continue
-                fromcmd = None
-            if cmdname in toskip:
-                print("[import-all] skipping {}".format(cmdname))
-                continue
-            print("[import-all] {}".format(cmdname))
-            try:
-                CWCTL.run(self._build_cmd(cmdname))
-            except SystemExit as exc:
-                # if something went wrong, exit now
-                if exc.code != 0:
-                    raise
+        if fromcmd:
+            if fromcmd not in steps:
+                print("[import-all] unknown step {}".format(fromcmd), file=sys.stderr)
+                sys.exit(1)
+            done.update(takewhile(lambda name: name != fromcmd, steps))
+        config = ServerConfiguration.config_for(self.appid)
+        sqlcnx = source_cnx(config.system_source_config, interactive=False)
+        try:
+            journal = importall.StepsJournal(sqlcnx)
+            if self.config.resume:
+                done |= journal.done_steps()
+            else:
+                journal.reset()
+            for name in steps:
+                if name in done:
+                    print("[import-all] skipping {}".format(name))
+            failed = importall.run_steps(steps, max(self.config.jobs, 1), journal, done=done)
+            for line in importall.timings_report(steps, journal):
+                print("[import-all] {}".format(line))
+        finally:
+            sqlcnx.close()
+        if failed:
+            print(
+                "[import-all] failed steps: {}, run again with --resume to restart "
+                "from them".format(", ".join(failed)),
+                file=sys.stderr,
+            )
+            sys.exit(1)
 
 
 class ImportEAD(Command):
@@ -358,6 +427,25 @@ class ImportEAD(Command):
                 "help": "which mode of autodedupe algorithme we want to use",
             },
         ),
+        (
+            "stats-dir",
+            {
+                "type": "string",
+                "default": None,
+                "help": (
+                    "répertoire dans lequel sont écrites les durées des étapes de l'import "
+                    "de chaque fichier (JSON lines) et leur synthèse"
+                ),
+            },
+        ),
+        (
+            "profile",
+            {
+                "action": "store_true",
+                "default": False,
+                "help": "profile l'import de chaque fichier avec cProfile (nécessite --stats-dir)",
+            },
+        ),
     ]
 
     def run(self, args):
@@ -385,6 +473,8 @@ class ImportEAD(Command):
                     self.config.nodrop,
                     autodedupe_authorities=self.config.dedupe_authorities,
                     noes=self.config.noes,
+                    stats_dir=self.config.stats_dir,
+                    profile=self.config.profile,
                 ),
             )
 
@@ -419,12 +509,22 @@ class ImportEAC(Command):
     arguments = "<instance> <xmlfiles>"
     name = "import-eac"
     min_args = 2
+    options = [
+        (
+            "processes",
+            {
+                "type": "int",
+                "default": 1,
+                "help": "number of processes used to parse the EAC files",
+            },
+        ),
+    ]
 
     def run(self, args):
         appid = args.pop(0)
         with admincnx(appid) as cnx:
             init_bfss(cnx.repo)
-            eac_import_files(cnx, args)
+            eac_import_files(cnx, args, processes=self.config.processes)
 
 
 class ImportOai(Command):
@@ -468,16 +568,14 @@ class ImportOai(Command):
         appid = args.pop(0)
         with admincnx(appid) as cnx:
             services_map = self.load_services()
+            services = load_services_map(cnx)
             for url in args:
                 url_key = self.url_key(url)
                 service_infos = None
                 service_code = services_map.get(url_key)
                 if service_code:
-                    rset = cnx.execute(
-                        "Any X WHERE X is Service, X code %(s)s", {"s": service_code}
-                    )
-                    if len(rset) == 1:
-                        service = rset.one()
+                    service = services.get(service_code.upper())
+                    if service is not None:
                         service_infos = {
                             "code": service_code,
                             "name": service.publisher(),
@@ -548,6 +646,32 @@ class IndexESAutocomplete(Command):
                 "LocationAuthority, SubjectAuthority, AgentAuthority",
             },
         ),
+        (
+            "delta",
+            {
+                "type": "yn",
+                "default": False,
+                "help": "only index authorities whose statistics changed since "
+                "the last completed indexing of their type",
+            },
+        ),
+        (
+            "rebuild-stats",
+            {
+                "type": "yn",
+                "default": False,
+                "help": "recompute statistics of all authorities before indexing "
+                "(statistics are otherwise maintained by hooks and imports)",
+            },
+        ),
+        (
+            "es-thread-count",
+            {
+                "type": "int",
+                "default": 4,
+                "help": "number of concurrent elasticsearch bulk requests",
+            },
+        ),
     ]
 
     def suggest_index_name(self, cnx):
@@ -569,19 +693,26 @@ class IndexESAutocomplete(Command):
             indexer.create_index(index_name=self.suggest_index_name(cnx))
             es = indexer.get_connection()
             if es:
-                log_in_db(self.index_es_autosuggest)(cnx, es)
+                if self.config.dry_run:
+                    # do not record dry runs as they are used as reference by
+                    # the delta mode
+                    self.index_es_autosuggest(cnx, es)
+                else:
+                    log_in_db(self.index_es_autosuggest)(cnx, es)
             else:
                 if self.config.debug:
                     self.log.debug("no elasticsearch configuration found, skipping")
 
     def index_es_autosuggest(self, cnx, es):
-        for _ in parallel_bulk(
-            es,
-            self.bulk_actions(cnx, es, dry_run=self.config.dry_run),
-            raise_on_error=False,
-            raise_on_exception=False,
-        ):
-            pass
+        record = not self.config.dry_run and suggest.suggest_stats_enabled(cnx)
+        if record:
+            watermark = suggest.indexing_watermark(cnx)
+        sink = ESBulkSink(es, cnx, source=self.name, thread_count=self.config.es_thread_count)
+        sink.send(self.bulk_actions(cnx, es, dry_run=self.config.dry_run))
+        if record:
+            # documents which failed are journaled, see fa-es-replay-failures
+            suggest.record_indexing(cnx, self.config.etypes or self.etype2type.keys(), watermark)
+            cnx.commit()
 
     etype2type = {
         "LocationAuthority": "geogname",
@@ -596,77 +727,49 @@ class IndexESAutocomplete(Command):
 
     def bulk_actions(self, cnx, es, dry_run=False):
         etypes = self.config.etypes or self.etype2type.keys()
-        auth_circ_map = dict(
-            cnx.execute(
-                """DISTINCT Any A, COUNT(X) GROUPBY A WITH X, A BEING (
-                (Any X, A WHERE X is Circular, X business_field F, A same_as F)
-                UNION
-                (Any X, A WHERE X is Circular, X action F, A same_as F)
-                UNION
-                (Any X, A WHERE X is Circular, X document_type F, A same_as F)
-                UNION
-                (Any X, A WHERE X is Circular, X historical_context F, A same_as F)
-                )"""
-            )
-        )
         try:
             suggest_index_name = self.suggest_index_name(cnx)
-            for (
-                etype,
-                authtable,
-                indextable,
-            ) in (
-                ("LocationAuthority", "cw_locationauthority", "cw_geogname"),
-                ("SubjectAuthority", "cw_subjectauthority", "cw_subject"),
-                ("AgentAuthority", "cw_agentauthority", "cw_agentname"),
-            ):
+            if self.config.rebuild_stats and suggest.suggest_stats_enabled(cnx):
+                cnx.info(f"[{suggest_index_name}]: rebuilding authorities statistics...")
+                if self.config.debug:
+                    print(f"[{suggest_index_name}]: rebuilding authorities statistics...")
+                suggest.refresh_suggest_stats(cnx, etypes=etypes)
+                cnx.commit()
+            for etype, authtable, indextable in suggest.SUGGEST_AUTHORITIES:
                 if etype not in etypes:
                     continue
-                cnx.info(f"[{suggest_index_name}]: processing {etype}: loading data...")
-                if self.config.debug:
-                    print(f"[{suggest_index_name}]: processing {etype}: loading data...")
-                # execute an SQL query instead of RQL like
-                # Any X, L, COUNT(F), COUNT(B), COUNT(X1) GROUPBY X, L WHERE X is {etype},
-                # X label L, A? authority X, B? related_authority X, A index F?,
-                # X grouped_with X1?
-                # as there is no simple way in RQL to count only distinct values
-
-                query = """
-                SELECT at.cw_eid, at.cw_label, at.cw_quality,
-                    COUNT(DISTINCT rel_index.eid_to),
-                    COUNT(DISTINCT rel_auth.eid_from),
-                    COUNT(DISTINCT rel_group.eid_to)
-                FROM {authtable} AS at
-                    LEFT OUTER JOIN {indextable} AS it ON (it.cw_authority=at.cw_eid)
-                    LEFT OUTER JOIN same_as_relation AS sa ON (sa.eid_from=at.cw_eid)
-                    LEFT OUTER JOIN related_authority_relation AS rel_auth
-                               ON (rel_auth.eid_to=at.cw_eid)
-                    LEFT OUTER JOIN index_relation AS rel_index
-                              ON (rel_index.eid_from=it.cw_eid)
-                    LEFT OUTER JOIN grouped_with_relation AS rel_group
-                              ON (rel_group.eid_from=at.cw_eid)
-                GROUP BY at.cw_eid,at.cw_label"""
-                rset = cnx.system_sql(
-                    query.format(authtable=authtable, indextable=indextable)
-                ).fetchall()
-                cnx.info(f"start indexing {len(rset)} {etype}...")
+                since = None
+                if self.config.delta and suggest.suggest_stats_enabled(cnx):
+                    since = suggest.last_indexing_date(cnx, etype)
+                    msg = f"only index {etype} modified since {since}"
+                    cnx.info(f"[{suggest_index_name}]: {msg}")
+                    if self.config.debug:
+                        print(f"[{suggest_index_name}]: {msg}")
+                cnx.info(f"[{suggest_index_name}]: start indexing {etype}...")
                 if self.config.debug:
-                    print(f"start indexing {len(rset)} {etype}...")
-                progress_bar = _tqdm(total=len(rset))
-                for i, (
+                    print(f"[{suggest_index_name}]: start indexing {etype}...")
+                if suggest.suggest_stats_enabled(cnx) and not dry_run:
+                    for autheid in suggest.deleted_authorities(cnx, etype, since=since):
+                        yield {
+                            "_op_type": "delete",
+                            "_index": suggest_index_name,
+                            "_type": "_doc",
+                            "_id": autheid,
+                        }
+                progress_bar = _tqdm()
+                for (
                     autheid,
                     label,
                     quality,
                     countfa,
-                    countcomext,
-                    countgrouped,
-                ) in enumerate(rset):
+                    count_docs,
+                    grouped,
+                ) in suggest.iter_suggest_stats(cnx, etype, authtable, indextable, since=since):
                     if not dry_run:
                         try:
                             progress_bar.update()
                         except Exception:
                             pass
-                        count_docs = countcomext + auth_circ_map.get(autheid, 0)
                         yield {
                             "_op_type": "index",
                             "_index": suggest_index_name,
@@ -686,7 +789,7 @@ class IndexESAutocomplete(Command):
                                 "archives": countfa,
                                 "siteres": count_docs,
                                 "count": countfa + count_docs,
-                                "grouped": bool(countgrouped),
+                                "grouped": grouped,
                                 "quality": quality,
                                 "letter": es_start_letter(label),
                             },
@@ -998,6 +1101,67 @@ class GenSitemap(Command):
             cnx.info("[sitemap]: finished generating sitemap files")
 
 
+@CWCTL.register
+class ComputeGeomap(Command):
+    """(re)compute the data of the finding aids map (`fa-map.json`) of the
+    cms and consultation instances. Imports only update the markers of the
+    authorities they touch, this command recomputes all of them."""
+
+    arguments = "<instance>"
+    name = "fa-compute-geomap"
+    min_args = max_args = 1
+
+    def run(self, args):
+        appid = args.pop()
+        with admincnx(appid) as cnx:
+            if not geomap.geomap_enabled(cnx):
+                cnx.error("[geomap]: abort: geomap is only available on postgres")
+                return
+            cnx.info("[geomap]: start computing geomap")
+            markers = geomap.compute_geomap(cnx)
+            cnx.commit()
+            cnx.info("[geomap]: %s location(s) put on the map", len(markers))
+
+
+@CWCTL.register
+class GenerateHeroThumbnails(Command):
+    """generate the missing or outdated thumbnails of the hero images
+    (`CssImage`) of the instance. Images whose thumbnails were generated from
+    their current content are skipped, unless `force` is set."""
+
+    arguments = "<instance>"
+    name = "fa-gen-hero-thumbnails"
+    min_args = max_args = 1
+    options = [
+        (
+            "processes",
+            {
+                "type": "int",
+                "default": 1,
+                "help": "number of processes used to resize the images",
+            },
+        ),
+        (
+            "force",
+            {
+                "type": "yn",
+                "default": False,
+                "help": "regenerate all thumbnails",
+            },
+        ),
+    ]
+
+    def run(self, args):
+        appid = args.pop()
+        with admincnx(appid) as cnx:
+            init_bfss(cnx.repo)
+            cnx.info("[thumbnails]: start generating hero thumbnails")
+            count = regenerate_css_thumbnails(
+                cnx, force=self.config.force, processes=self.config.processes
+            )
+            cnx.info("[thumbnails]: thumbnails of %s image(s) generated", count)
+
+
 @CWCTL.register
 class ImportNLSubscribers(Command):
     """import newsletter subscribers emails"""
@@ -1198,6 +1362,7 @@ class DeleteEAD(Command):
                 interactive=self.config.interactive,
                 is_filename=not self.config.stable_id,
             )
+            bump_search_indexes_generation(cnx.vreg.config)
 
 
 @CWCTL.register
@@ -1237,7 +1402,8 @@ class DeleteInEs(Command):
             es_docs = []
             for etype in self.config.etypes:
                 es_docs.append(self.es_documents(es, indexer.index_name, etype))
-        es_bulk_index(es, chain(*es_docs), raise_on_error=False)
+            ESBulkSink(es, cnx, source=self.name).send(chain(*es_docs))
+            bump_search_indexes_generation(cnx.vreg.config)
 
 
 @CWCTL.register
@@ -1350,7 +1516,13 @@ class ReindexIRFromESDoc(Command):
                 "_id": serializer.es_id,
                 "_source": json,
             }
-            es_bulk_index(es, [data], raise_on_error=True)
+            _, failed = ESBulkSink(es, cnx, source=self.name).send([data])
+            if failed:
+                self.log.error(
+                    "[fa-reindex-ead-esdoc] Error: failed to index %s, see fa-es-replay-failures",
+                    serializer.es_id,
+                )
+            bump_search_indexes_generation(cnx.vreg.config)
 
 
 @CWCTL.register
@@ -1434,6 +1606,14 @@ class ReindexEsService(Command):
             },
         ),
         ("chunksize", {"type": "int", "default": 100000, "help": "chunksize size"}),
+        (
+            "es-thread-count",
+            {
+                "type": "int",
+                "default": 4,
+                "help": "number of concurrent elasticsearch bulk requests",
+            },
+        ),
         (
             "debug",
             {
@@ -1484,8 +1664,8 @@ class ReindexEsService(Command):
                     doc_type="_doc",
                     body={"query": {"bool": {"must": must}}},
                 )
-            for _ in parallel_bulk(
-                es,
+            sink = ESBulkSink(es, cnx, source=self.name, thread_count=self.config.es_thread_count)
+            sink.send(
                 self.bulk_actions(
                     cnx,
                     publisher,
@@ -1493,11 +1673,13 @@ class ReindexEsService(Command):
                     service_code=service_code,
                     chunksize=self.config.chunksize,
                     dry_run=self.config.dry_run,
-                ),
-                raise_on_error=False,
-                raise_on_exception=False,
-            ):
-                pass
+                )
+            )
+            self.log.info(
+                f"[fa-reindex-es-service] {sink.success} documents indexed, "
+                f"{sink.failed} failed"
+            )
+            bump_search_indexes_generation(cnx.vreg.config)
 
     def bulk_actions(self, cnx, publisher, index_name, service_code, chunksize, dry_run=True):
         for etype, gen in (
@@ -1551,28 +1733,15 @@ class ReindexEsService(Command):
     def get_indexable_fa(self, cnx, etype, publisher, chunksize=100000):
         self.log.info(f"[fa-reindex-es-service] Reindex {etype}")
         rqlpart = (
-            "X publisher %(p)s, "
-            if etype == "FindingAid"
-            else "X finding_aid FA, FA publisher %(p)s, "
+            "X publisher %(p)s" if etype == "FindingAid" else "X finding_aid FA, FA publisher %(p)s"
         )
-        lasteid = 0
         rql = (
-            "Any X, E, D, U, S ORDERBY X LIMIT {} WHERE "
+            "Any X, E, D, U, S WHERE "
             "X is {}, E is EsDocument, E entity X, E doc D, "
-            "X cwuri U, X stable_id S, "
-            "{} "
-            "X eid > %(l)s"
-        ).format(chunksize, etype, rqlpart)
-        while True:
-            print("will execute", rql, {"l": lasteid, "p": publisher})
-            rset = cnx.execute(rql, {"l": lasteid, "p": publisher})
-            print("\tget", len(rset), "rows")
-            if not rset:
-                break
-            for e in rset.entities():
-                yield e
-            cnx.drop_entity_cache()
-            lasteid = rset[-1][0]
+            "X cwuri U, X stable_id S, {}"
+        ).format(etype, rqlpart)
+        for rset in utils.iter_rql_chunks(cnx, rql, {"p": publisher}, chunksize=chunksize):
+            yield from rset.entities()
 
 
 @CWCTL.register
@@ -1590,6 +1759,7 @@ class ReindexEsAuthority(Command):
         appid, eid = args
         with admincnx(appid) as cnx:
             reindex_authority(cnx, eid)
+            bump_search_indexes_generation(cnx.vreg.config)
 
 
 @CWCTL.register
@@ -1641,6 +1811,78 @@ class ReindexESNomina(Command):
                 delete=self.config.force,
                 logger=log,
             )
+            bump_search_indexes_generation(cnx.vreg.config)
+
+
+@CWCTL.register
+class ReplayEsFailures(Command):
+    """send again to elasticsearch the documents which could not be indexed
+    and were recorded in the `es_failed_documents` table"""
+
+    name = "fa-es-replay-failures"
+    arguments = "<instance>"
+    min_args = max_args = 1
+
+    options = [
+        (
+            "index-name",
+            {
+                "type": "string",
+                "default": None,
+                "help": "only replay documents of this index",
+            },
+        ),
+        (
+            "source",
+            {
+                "type": "string",
+                "default": None,
+                "help": "only replay documents sent by this process "
+                "(e.g. a filepath or a command name)",
+            },
+        ),
+        (
+            "es-thread-count",
+            {
+                "type": "int",
+                "default": 4,
+                "help": "number of concurrent elasticsearch bulk requests",
+            },
+        ),
+        (
+            "dry-run",
+            {
+                "type": "yn",
+                "default": False,
+                "help": "only print the number of documents to replay",
+            },
+        ),
+    ]
+
+    def run(self, args):
+        appid = args[0]
+        log = logging.getLogger("fa-es-replay-failures")
+        with admincnx(appid) as cnx:
+            if not es_failures_enabled(cnx):
+                log.error("failed documents are only journaled on postgres")
+                return
+            nb_docs = count_es_failures(cnx, self.config.index_name, self.config.source)
+            log.info("%s documents to replay", nb_docs)
+            if self.config.dry_run or not nb_docs:
+                return
+            es = cnx.vreg["es"].select("indexer", cnx).get_connection()
+            if not es:
+                log.error("no elasticsearch configuration found, skipping")
+                return
+            success, failed = replay_es_failures(
+                cnx,
+                es,
+                index_name=self.config.index_name,
+                source=self.config.source,
+                thread_count=self.config.es_thread_count,
+            )
+            log.info("%s documents indexed, %s still failing", success, failed)
+            bump_search_indexes_generation(cnx.vreg.config)
 
 
 @CWCTL.register
@@ -1896,11 +2138,59 @@ class EnhanceAccessibility(Command):
     name = "rgaa"
     arguments = "<instance>"
     min_args = max_args = 1
-    options = (("replace", {"short": "r", "action": "store_true", "help": "replace all content"}),)
+    options = (
+        ("replace", {"short": "r", "action": "store_true", "help": "replace all content"}),
+        (
+            "batch",
+            {
+                "action": "store_true",
+                "help": "process content in a worker pool, write changes in batched "
+                "updates and purge varnish / reindex in elasticsearch once at the end",
+            },
+        ),
+        (
+            "processes",
+            {"type": "int", "default": 4, "help": "number of worker processes (batch mode)"},
+        ),
+        (
+            "batch-size",
+            {
+                "type": "int",
+                "default": 500,
+                "help": "number of entities written per commit (batch mode)",
+            },
+        ),
+        (
+            "dry-run",
+            {
+                "action": "store_true",
+                "help": "do not write anything, only report the changes (batch mode)",
+            },
+        ),
+        (
+            "diff-file",
+            {
+                "type": "string",
+                "default": None,
+                "help": "write the diff of the changes to this file (batch mode)",
+            },
+        ),
+        (
+            "es-thread-count",
+            {
+                "type": "int",
+                "default": 4,
+                "help": "number of concurrent elasticsearch bulk requests (batch mode)",
+            },
+        ),
+    )
 
     def run(self, args):
         appid = args.pop()
         replace_all = self.config.replace
+        if self.config.batch:
+            self.run_batch(appid, replace_all)
+            return
         with admincnx(appid) as cnx:
             init_bfss(cnx.repo)
             with cnx.allow_all_hooks_but("metadata"):
@@ -1948,6 +2238,43 @@ class EnhanceAccessibility(Command):
                         cnx.commit()
             print("fixed {} entities".format(count))
 
+    def run_batch(self, appid, replace_all):
+        with admincnx(appid) as cnx:
+            init_bfss(cnx.repo)
+            changes = rgaa.rgaa_changes(
+                cnx, processes=self.config.processes, replace_all=replace_all
+            )
+            if self.config.diff_file or self.config.dry_run:
+                changes = self.report(changes)
+            if self.config.dry_run:
+                count = len(set(change[1] for change in changes))
+                print("{} entities would be fixed".format(count))
+                return
+            eids = rgaa.write_rgaa_changes(cnx, changes, batch_size=self.config.batch_size)
+            print("fixed {} entities".format(len(eids)))
+            indexed, failed = rgaa.invalidate_rgaa_changes(
+                cnx, eids, es_thread_count=self.config.es_thread_count
+            )
+            print("{} documents reindexed, {} failed".format(indexed, failed))
+            bump_search_indexes_generation(cnx.vreg.config)
+
+    def report(self, changes):
+        """write the diff of `changes` to the diff file (or stdout) and
+        return the list of changes"""
+        changes = list(changes)
+        if self.config.diff_file:
+            stream = open(self.config.diff_file, "w")
+        else:
+            stream = sys.stdout
+        try:
+            for change in changes:
+                for line in rgaa.rgaa_diff(change):
+                    stream.write(line + "\n")
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        return changes
+
 
 @CWCTL.register
 class GenerateApeEadFiles(Command):
@@ -31,7 +31,9 @@
 # standard library imports
 import os.path
 import subprocess
+import time
 import zipfile
+from contextlib import contextmanager
 
 # third party imports
 # CubicWeb specific imports
@@ -50,6 +52,22 @@ TABLE_NAMES = [
     "public.commemo_programm_dump",
 ]
 
+# rest paths of the dumped entities, see ``CommemorationItem.rest_path``
+# (CommemoCollection was dropped in 2.13.0, collections have no URI)
+URI_PATHS = (("public.commemo_dump", "commemo", "pages_histoire"),)
+
+CONTENT_ARCNAME = "files/commemo_content_{}.txt"
+
+
+@contextmanager
+def timed(stage):
+    """print the time spent in `stage`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        print("-> {} took {:.2f}s".format(stage, time.perf_counter() - start))
+
 
 def create_tables(cnx):
     cnx.system_sql(
@@ -294,45 +312,53 @@ def delete_tables(cnx):
 def update_uris(cnx):
     """Update URIs.
 
+    URIs are computed in SQL from the rest paths of the entities, without
+    instantiating them.
+
     :param Connection cnx: CubicWeb database connection
     """
-    for table, prefix in (
-        ("public.commemo_dump", "commemo"),
-        ("public.commemo_collection_dump", "collection"),
-    ):
-        cnx.cnxset.cu.executemany(
-            "UPDATE {} SET uri=%s WHERE {}_eid=%s".format(table, prefix),
-            [
-                (cnx.entity_from_eid(eid).absolute_url(), eid)
-                for eid, in cnx.system_sql("SELECT {}_eid FROM {}".format(prefix, table)).fetchall()
-            ],
+    for table, prefix, path in URI_PATHS:
+        cnx.system_sql(
+            "UPDATE {table} SET uri=%(path)s || {prefix}_eid".format(table=table, prefix=prefix),
+            {"path": "{}{}/".format(cnx.base_url(), path)},
         )
 
 
-def update_files(cnx, output_dir):
+def update_files(cnx):
     """Update content files.
 
+    Content files are not written on disk, they are streamed into the
+    archive (see `content_files`).
+
     :param Connection cnx: CubicWeb database connection
-    :param str output_dir: output_directory basename
     """
-    rows = cnx.system_sql("SELECT commemo_eid, coalesce(content, '') FROM public.commemo_dump")
-    basename = os.path.join(output_dir, "commemo_content_{}.txt")
-    disknames = []
-    for eid, content in rows:
-        diskname = basename.format(eid)
-        with open(diskname, "w") as fp:
-            fp.write(content)
-        disknames.append((diskname, eid))
-    cnx.cnxset.cu.executemany(
-        "UPDATE public.commemo_dump_csv SET file=%s WHERE commemo_eid=%s", disknames
+    # same names as CONTENT_ARCNAME
+    cnx.system_sql(
+        "UPDATE public.commemo_dump_csv "
+        "SET file='files/commemo_content_' || commemo_eid || '.txt'"
     )
 
 
-def make_archive(archive, filenames):
+def content_files(cnx):
+    """Yield content files.
+
+    :param Connection cnx: CubicWeb database connection
+
+    :returns: arcname-content tuples
+    """
+    cursor = cnx.system_sql(
+        "SELECT cw_eid, coalesce(cw_content, '') FROM published.cw_commemorationitem"
+    )
+    for eid, content in cursor:
+        yield CONTENT_ARCNAME.format(eid), content
+
+
+def make_archive(archive, filenames, contents=()):
     """Create Zip archive.
 
     :param str archive: path of Zip archive
     :param list filenames: list of diskname-arcname tuples
+    :param contents: iterable of arcname-content tuples
     """
     with zipfile.ZipFile(archive, "w", compression=zipfile.ZIP_DEFLATED) as fp:
         for diskname, arcname in set(filenames):  # remove duplicates
@@ -342,6 +368,8 @@ def make_archive(archive, filenames):
                         fp.write(os.path.join(root, file), arcname=os.path.join(arcname, file))
                 continue
             fp.write(diskname, arcname)
+        for arcname, content in contents:
+            fp.writestr(arcname, content)
         # add  README
         for filename, arcname in (("readme_commemodump.md", "README.md"),):
             fp.write(
@@ -350,15 +378,15 @@ def make_archive(archive, filenames):
             )
 
 
-def run_pg_dump(cnx, table, directory):
-    """Dump table into directory-format archive. The output directory
-    must not exist.
+def start_pg_dump(cnx, table, directory):
+    """Start dumping table into directory-format archive. The output
+    directory must not exist.
 
     :param Connection cnx: CubicWeb database connection
     :param str table: name of table or regex matching multiple tables
     :param str directory: name of directory to dump into
 
-    :raises Exception: if dumping table failed
+    :returns: the pg_dump process
     """
     system_source_config = cnx.repo.config.system_source_config
     host = "@{}".format(
@@ -377,17 +405,37 @@ def run_pg_dump(cnx, table, directory):
         port=port,
         name=system_source_config["db-name"],
     )
-    process = subprocess.Popen(
+    return subprocess.Popen(
         ("pg_dump", dbname, "-t", table, "-Fd", "-f", directory),
         stderr=subprocess.PIPE,
         text=True,
     )
+
+
+def wait_pg_dump(process):
+    """Wait for a pg_dump process started by `start_pg_dump`.
+
+    :raises Exception: if dumping table failed
+    """
     _, err = process.communicate()
     return_code = process.wait()
     if return_code != 0:
         raise Exception(err)
 
 
+def run_pg_dump(cnx, table, directory):
+    """Dump table into directory-format archive. The output directory
+    must not exist.
+
+    :param Connection cnx: CubicWeb database connection
+    :param str table: name of table or regex matching multiple tables
+    :param str directory: name of directory to dump into
+
+    :raises Exception: if dumping table failed
+    """
+    wait_pg_dump(start_pg_dump(cnx, table, directory))
+
+
 def get_files(cnx, table, eid_column):
     """Return related files.
 
@@ -417,57 +465,86 @@ def get_files(cnx, table, eid_column):
 def dump_data(cnx, output_dir, formats):
     """Dump commemoration data.
 
+    pg_dump processes of all the tables run concurrently, while CSV files
+    are copied from the CubicWeb connection.
+
     :param Connection cnx: CubicWeb database connection
     :param str output_dir: output directory basename
     :param tuple formats: list of export formats
+
+    :returns: list of diskname-arcname tuples
+    :rtype: list
     """
     FTABLES = {
         "public.commemo_images_dump": "commemo_eid",
         "public.commemo_programm_files_dump": "programm_file_eid",
-        "public.commemo_dump_csv": "commemo_eid",
         "public.commemo_collection_images_dump": "collection_eid",
     }
-    for table in TABLE_NAMES:
-        print("-> write {}".format(table))
-        if table in FTABLES.keys():
-            for file_tuple in get_files(cnx, table, FTABLES[table]):
-                yield file_tuple
-        for fmt in formats:
-            path = os.path.join(output_dir, table.split(".")[1])
-            if fmt == "csv":
-                if table == "public.commemo_dump":  # dump as pg only
-                    continue
-                path += ".csv"
-                with open(path, "w") as fp:
-                    cnx.cnxset.cu.copy_expert(
-                        """COPY {} TO STDOUT
-                        WITH (FORMAT CSV, DELIMITER '\t', NULL '', HEADER)""".format(
-                            table
-                        ),
-                        fp,
-                    )
-            else:
-                if table == "public.commemo_dump_csv":  # dump as CSV only
+    filenames = []
+    with timed("collect files"):
+        for table, eid_column in FTABLES.items():
+            filenames.extend(get_files(cnx, table, eid_column))
+        # pg_dump uses its own connection, file columns must be committed
+        cnx.commit()
+    with timed("export tables"):
+        processes = []
+        try:
+            for fmt in formats:
+                if fmt == "csv":
                     continue
-                # use pg_dump
-                path += "_pg"
-                run_pg_dump(cnx, table, path)
-            yield (path, os.path.basename(path))
-
-
-def init_temp_tables(cnx, output_dir):
+                for table in TABLE_NAMES:
+                    if table == "public.commemo_dump_csv":  # dump as CSV only
+                        continue
+                    print("-> write {} (pg_dump)".format(table))
+                    path = os.path.join(output_dir, table.split(".")[1]) + "_pg"
+                    processes.append(start_pg_dump(cnx, table, path))
+                    filenames.append((path, os.path.basename(path)))
+            if "csv" in formats:
+                for table in TABLE_NAMES:
+                    if table == "public.commemo_dump":  # dump as pg only
+                        continue
+                    print("-> write {} (csv)".format(table))
+                    path = os.path.join(output_dir, table.split(".")[1]) + ".csv"
+                    with open(path, "w") as fp:
+                        cnx.cnxset.cu.copy_expert(
+                            """COPY {} TO STDOUT
+                            WITH (FORMAT CSV, DELIMITER '\t', NULL '', HEADER)""".format(
+                                table
+                            ),
+                            fp,
+                        )
+                    filenames.append((path, os.path.basename(path)))
+            errors = []
+            while processes:
+                try:
+                    wait_pg_dump(processes[0])
+                except Exception as exception:
+                    errors.append(str(exception))
+                processes.pop(0)
+        finally:
+            # the export failed: do not leave the remaining pg_dump running
+            for process in processes:
+                process.terminate()
+                process.communicate()
+        if errors:
+            raise Exception("\n".join(errors))
+    return filenames
+
+
+def init_temp_tables(cnx):
     """Initialize temporary tables.
 
     :param Connection cnx: CubicWeb database connection
-    :param str output_dir: output directory basename
     """
     # delete any trailing temporary tables
     delete_tables(cnx)
     # create and fill temporary tables
-    create_tables(cnx)
+    with timed("create tables"):
+        create_tables(cnx)
     # update values
-    update_uris(cnx)
-    update_files(cnx, output_dir)
+    with timed("update uris"):
+        update_uris(cnx)
+    update_files(cnx)
     # commit changes
     cnx.commit()
 
@@ -481,8 +558,8 @@ def create_dumps(cnx, output_dir, formats):
     """
     archive = "{}.zip".format(output_dir)
     try:
-        init_temp_tables(cnx, output_dir)
-        filenames = list(dump_data(cnx, output_dir, formats))
+        init_temp_tables(cnx)
+        filenames = dump_data(cnx, output_dir, formats)
     except Exception as exception:
         print("error encountered while exporting ({})".format(exception))
         return
@@ -491,6 +568,7 @@ def create_dumps(cnx, output_dir, formats):
         cnx.commit()
     print("\n-> wrote archive '{}'".format(archive))
     try:
-        make_archive(archive, filenames)
+        with timed("write archive"):
+            make_archive(archive, filenames, content_files(cnx))
     except Exception as exception:
         print("error encountered while exporting ({})".format(exception))
@@ -31,7 +31,10 @@
 
 """cubicweb-francearchives cssimages"""
 
+import hashlib
+from functools import partial
 from io import BytesIO
+import multiprocessing as mp
 import os.path as osp
 from PIL import Image
 
@@ -54,34 +57,143 @@ def thumbnail_name(basename, suffix, ext):
     return "{}-{}{}".format(basename, suffix, ext)
 
 
-def generate_thumbnails(cnx, image_file, image_path, sizes):
-    """generate X images for given sizes"""
-    static_dir = static_css_dir(cnx.vreg.config.static_directory)
+def thumbnail_title(thumb_name):
+    return f"static/css/{thumb_name}"
+
+
+def resize_image(data, image_path, sizes):
+    """decode the image `data` once and return the ``(thumbnail name,
+    content)`` of each of `sizes`.
+
+    Only take and return picklable values so that it can be run in a
+    worker process.
+    """
+    source = Image.open(BytesIO(data))
+    source.load()
+    orig_width, orig_height = source.size
+    basename, ext = osp.splitext(image_path)
+    fmt = "PNG" if S3_ACTIVE else Image.registered_extensions().get(ext.lower())
+    thumbnails = []
     for size, suffix in sizes:
-        image_file.seek(0)
-        thumb = Image.open(image_file)
-        orig_width, orig_height = thumb.size
         width = size.get("w", orig_width) or orig_width
         height = size.get("h", orig_height) or orig_height
         quality = size.get("q", 100)
+        thumb = source.copy()
         thumb.thumbnail((width, height), Image.LANCZOS)
-        basename, ext = osp.splitext(image_path)
-        thumb_name = thumbnail_name(basename, suffix, ext)
-        if S3_ACTIVE:
-            byte_io = BytesIO()
-            thumb.save(byte_io, "PNG", quality=quality)
-            content = byte_io.getvalue()
+        byte_io = BytesIO()
+        thumb.save(byte_io, fmt, quality=quality)
+        thumbnails.append((thumbnail_name(basename, suffix, ext), byte_io.getvalue()))
+    return thumbnails
+
+
+def resize_css_image(source, sizes):
+    """`resize_image` for a ``(file eid, image path, data)`` source"""
+    eid, image_path, data = source
+    return eid, resize_image(data, image_path, sizes)
+
+
+def iter_resized_css_images(sources, sizes, processes=1):
+    """yield `resize_css_image` results for `sources`, in a pool of
+    `processes` processes if `processes` is greater than 1"""
+    resize = partial(resize_css_image, sizes=sizes)
+    if processes <= 1:
+        yield from map(resize, sources)
+        return
+    with mp.Pool(processes) as pool:
+        yield from pool.imap_unordered(resize, sources)
+
+
+def thumbnails_uptodate(cnx, image_path, sha1, sizes):
+    """return True if all thumbnails of `image_path` have been generated
+    from an image whose sha1 is `sha1`"""
+    basename, ext = osp.splitext(image_path)
+    titles = [thumbnail_title(thumbnail_name(basename, suffix, ext)) for _, suffix in sizes]
+    rset = cnx.execute(
+        "Any T WHERE X is File, X title IN ({}), X title T, X description %(sha1)s".format(
+            ", ".join("%(t{})s".format(idx) for idx in range(len(titles)))
+        ),
+        dict({"t{}".format(idx): title for idx, title in enumerate(titles)}, sha1=sha1),
+    )
+    return {title for title, in rset} == set(titles)
+
+
+def store_thumbnails(cnx, thumbnails, data_format, sha1):
+    """write the thumbnails as `File` entities (and in the static directory
+    if S3 is not used).
+
+    Existing thumbnails are updated, so that storing thumbnails again does not
+    create new entities. The sha1 of the source image is kept as the
+    thumbnail description.
+    """
+    static_dir = static_css_dir(cnx.vreg.config.static_directory)
+    for thumb_name, content in thumbnails:
+        if not S3_ACTIVE:
+            with open(osp.join(static_dir, thumb_name), "wb") as thumbfile:
+                thumbfile.write(content)
+        attrs = {
+            "data": Binary(content),
+            "data_format": data_format,
+            "data_name": thumb_name,
+            "description": sha1,
+            "description_format": "text/plain",
+        }
+        title = thumbnail_title(thumb_name)
+        rset = cnx.find("File", title=title)
+        if rset:
+            rset.get_entity(0, 0).cw_set(**attrs)
         else:
-            thumbpath = osp.join(static_dir, thumb_name)
-            thumb.save(thumbpath, quality=quality)
-            with open(thumbpath, "rb") as thumbfile:
-                content = thumbfile.read()
-        cnx.create_entity(
-            "File",
-            **{
-                "title": f"static/css/{thumb_name}",
-                "data": Binary(content),
-                "data_format": image_file.data_format,
-                "data_name": thumb_name,
-            }
-        )
+            cnx.create_entity("File", title=title, **attrs)
+
+
+def generate_thumbnails(cnx, image_file, image_path, sizes):
+    """generate X images for given sizes"""
+    image_file.seek(0)
+    data = image_file.read()
+    sha1 = hashlib.sha1(data).hexdigest()
+    if thumbnails_uptodate(cnx, image_path, sha1, sizes):
+        return False
+    store_thumbnails(cnx, resize_image(data, image_path, sizes), image_file.data_format, sha1)
+    return True
+
+
+def generate_css_thumbnails(repo, files, sizes=HERO_SIZES):
+    """generate the thumbnails of CssImage `files`, a list of ``(file eid,
+    cssid)``.
+
+    Meant to be run once the transaction which added the files has been
+    committed, in a thread (see `GenerateImageThumbnailsOp`): each file is
+    processed and committed in its own transaction.
+    """
+    with repo.internal_cnx() as cnx:
+        for eid, cssid in files:
+            rset = cnx.execute("Any X WHERE X eid %(x)s, X is File", {"x": eid})
+            if not rset:
+                # deleted in the meantime
+                continue
+            generate_thumbnails(cnx, rset.one(), "%s.jpg" % cssid, sizes)
+            cnx.commit()
+
+
+def regenerate_css_thumbnails(cnx, force=False, processes=1, sizes=HERO_SIZES):
+    """generate the missing or outdated thumbnails of all CssImage files.
+
+    Images are decoded and resized in a pool of `processes` processes (each
+    image is decoded once for all its sizes), the thumbnails are then stored
+    by the main process. Return the number of processed images.
+    """
+    sources, formats, hashes = [], {}, {}
+    for eid, cssid in cnx.execute(
+        "Any F, CI WHERE X is CssImage, X cssid CI, NOT X cssid NULL, X image_file F"
+    ):
+        image_file = cnx.entity_from_eid(eid)
+        data = image_file.data.getvalue()
+        image_path = "%s.jpg" % cssid
+        sha1 = hashlib.sha1(data).hexdigest()
+        if not force and thumbnails_uptodate(cnx, image_path, sha1, sizes):
+            continue
+        sources.append((eid, image_path, data))
+        formats[eid], hashes[eid] = image_file.data_format, sha1
+    for eid, thumbnails in iter_resized_css_images(sources, sizes, processes=processes):
+        store_thumbnails(cnx, thumbnails, formats[eid], hashes[eid])
+        cnx.commit()
+    return len(sources)
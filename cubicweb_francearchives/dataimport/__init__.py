@@ -58,9 +58,11 @@ from cubicweb.devtools.fake import FakeRequest
 
 from cubicweb_francearchives import Authkey
 from cubicweb_francearchives.entities import compute_file_data_hash
+from cubicweb_francearchives.dataimport.importstats import STATS
 from cubicweb_francearchives.dataimport.meminfo import memprint
 from cubicweb_francearchives.utils import remove_html_tags
-from cubicweb_francearchives.utils import pick, TRANSMAP, NO_PUNCT_MAP
+from cubicweb_francearchives.utils import pick, services_registry, TRANSMAP, NO_PUNCT_MAP
+from cubicweb_francearchives.utils import bump_search_indexes_generation
 
 LOGGER = logging.getLogger()
 
@@ -101,6 +103,9 @@ def log_in_db(func):
         log_cmd_in_db(cnx, func.__name__, logger)
         res = func(cnx, *args, **kwargs)
         log_cmd_in_db(cnx, func.__name__, logger, stop=True)
+        # invalidate the facets cached by the search views once the whole
+        # import is indexed
+        bump_search_indexes_generation(cnx.vreg.config)
         return res
 
     return wrapped
@@ -475,6 +480,7 @@ class IndexImporterMixin(object):
             keys = [(authtype, label, QUALITY_SERVICE_EID), (authtype, label, 0)]
         return [hash(key) for key in keys]
 
+    @STATS.timed("create_index")
     def create_index(self, infos, target, fa_attrs):
         # key will be fields for Geogname, AgentName, Subject entities
         # and values are set of targets that will be index relations
@@ -921,18 +927,9 @@ def capture_exception(exc, filepath):
 
 
 def load_services_map(cnx):
-    services = {}
-    rset = cnx.execute(
-        """Any X, C, N, N2, SN, L WHERE X is Service,
-        X code C, X name N, X name2 N2, X short_name SN,
-        X level L"""
-    )
-    for service in rset.entities():
-        code = service.code
-        if code is not None:
-            code = code.upper()
-        services[code] = service
-    return services
+    """return a dict mapping upper-cased service codes to `ServiceRecord`
+    from the process-wide services registry"""
+    return dict(services_registry(cnx)[0])
 
 
 def service_infos_from_filepath(filepath, services_map):
@@ -948,6 +945,7 @@ def service_infos_from_filepath(filepath, services_map):
                 "title": service.dc_title(),
                 "level": service.level,
                 "eid": service.eid,
+                "thumbnail_url": service.thumbnail_url,
             }
             break
     if infos is None:
@@ -958,6 +956,7 @@ def service_infos_from_filepath(filepath, services_map):
             "title": service_code,
             "level": None,
             "eid": None,
+            "thumbnail_url": None,
         }
     return infos
 
@@ -971,6 +970,7 @@ def service_infos_from_service_code(service_code, services_map):
             "title": service.dc_title(),
             "level": service.level,
             "eid": service.eid,
+            "thumbnail_url": service.thumbnail_url,
         }
     return {
         "code": service_code,
@@ -978,6 +978,7 @@ def service_infos_from_service_code(service_code, services_map):
         "title": service_code,
         "level": None,
         "eid": None,
+        "thumbnail_url": None,
     }
 
 
@@ -49,16 +49,17 @@ from cubicweb_francearchives.dataimport import (
     component_stable_id_for_dc,
     load_metadata_file,
     sqlutil,
-    es_bulk_index,
     remove_extension,
     log_in_db,
     service_infos_from_filepath,
     load_services_map,
 )
+from cubicweb_francearchives.dataimport.esbulk import ESBulkSink
 from cubicweb_francearchives.dataimport.ead import (
     Reader,
     capture_exception,
     service_infos_for_es_doc,
+    illustration_infos_for_es_doc,
 )
 from cubicweb_francearchives.storage import S3BfssStorageMixIn
 
@@ -293,6 +294,9 @@ class CSVReader(Reader):
             scopecontent=strip_html(comp_attrs.get("scopecontent")),
             index_entries=self.index_entries(entry, comp_eid, findingaid_data),
             digitized=bool(daodef),
+            **illustration_infos_for_es_doc(
+                [daodef] if daodef else [], findingaid_data.get("eadid") or "", service_infos
+            ),
             **service_infos_for_es_doc(self.store._cnx, service_infos),
         )
         self.create_entity("EsDocument", {"doc": json_dumps(es_doc["_source"]), "entity": comp_eid})
@@ -361,4 +365,4 @@ def csv_import_filepath(cnx, config, filepath, metadata_filepath=None):
     if es_docs and not config["noes"]:
         indexer = cnx.vreg["es"].select("indexer", cnx)
         es = indexer.get_connection()
-        es_bulk_index(es, es_docs)
+        ESBulkSink(es, cnx, source=filepath).send(es_docs)
@@ -31,10 +31,13 @@
 
 
 from collections import defaultdict
+from functools import partial
+import multiprocessing as mp
 
 from os.path import basename
 from time import time
 import logging
+import traceback
 
 from cubicweb.dataimport.importer import SimpleImportLog
 from cubicweb.web.views.cwsources import REVERSE_SEVERITIES
@@ -44,12 +47,15 @@ from cubicweb_eac.dataimport import ETYPES_ORDER_HINT
 from cubicweb_eac.sobjects import init_extid2eid_index as eac_init_extid2eid_index
 from cubicweb_skos.dataimport import dump_relations
 
-from cubicweb_francearchives.dataimport import log_in_db, es_bulk_index
+from cubicweb_francearchives.dataimport import log_in_db
+from cubicweb_francearchives.dataimport.esbulk import ESBulkSink
 
 from cubicweb_francearchives.dataimport.stores import create_massive_store
+from cubicweb_francearchives.entities.rdf import set_related_cache
 
 from cubicweb_francearchives.dataimport import sqlutil, to_unicode
 
+from cubicweb_francearchives.sobjects import EACCPFImporter
 from cubicweb_francearchives.storage import S3BfssStorageMixIn
 
 
@@ -68,24 +74,84 @@ class MyImportLog(SimpleImportLog):
         )
 
 
-def eac_import_file(service, store, fpath, extid2eid, log):
+# translation function of the EAC parser in the worker processes of
+# `iter_parsed_eac_files`, set by `init_parse_worker`
+_worker_translate = str
+
+
+def init_parse_worker(translate):
+    global _worker_translate
+    _worker_translate = translate
+
+
+def parse_eac_file(fpath, service_extids, _=None):
+    """parse the EAC file `fpath`, possibly in a worker process. `_` is the
+    translation function of the parser messages (the one given to
+    `init_parse_worker` by default).
+
+    Return a ``(fpath, (extentities, record), error)`` tuple, `record` being
+    the AuthorityRecord ExtEntity found in `extentities` and `error` the
+    formatted exception if the file could not be parsed.
+    """
     fname = basename(fpath)
     import_log = MyImportLog(fname, threshold=logging.ERROR)
     st = S3BfssStorageMixIn()
-    with st.storage_read_file(fpath) as stream:
-        try:
-            created, updated, record, not_visited = service.import_eac_stream(
-                stream, import_log, extid2eid=extid2eid, store=store, fpath=fpath
-            )
-        except Exception as exception:
-            service._cw.rollback()
-            if exception:
-                log.error("{} : {}".format(fname, to_unicode(exception)))
-            import traceback
+    try:
+        with st.storage_read_file(fpath) as stream:
+            generator = EACCPFImporter(stream, import_log, _ or _worker_translate)
+            generator.check_notice_validity(service_extids)
+            extentities = list(generator.external_entities())
+    except Exception as exception:
+        import_log.record_fatal(to_unicode(exception))
+        error = "{} : {}\n{}".format(fname, to_unicode(exception), traceback.format_exc())
+        return fpath, None, error
+    return fpath, (extentities, generator.record), None
 
-            log.error(traceback.format_exc())
-            return 0, 0, 0, 0
-        return created, updated, record, not_visited
+
+def iter_parsed_eac_files(fpaths, service_extids, processes=1, chunksize=8, _=str):
+    """yield `parse_eac_file` results for `fpaths`, in the same order.
+
+    With a single process, files are not parsed beforehand: ``(fpath, None,
+    None)`` is yielded and the file is parsed while it is imported.
+
+    Workers are forked so that they inherit the translation function `_`
+    (translation functions of a connection can not be pickled).
+    """
+    if processes <= 1:
+        for fpath in fpaths:
+            yield fpath, None, None
+        return
+    context = mp.get_context("fork")
+    with context.Pool(processes, initializer=init_parse_worker, initargs=(_,)) as pool:
+        yield from pool.imap(
+            partial(parse_eac_file, service_extids=service_extids), fpaths, chunksize=chunksize
+        )
+
+
+def eac_import_file(service, store, fpath, extid2eid, log, parsed=None):
+    """import the EAC file `fpath` in `store`. `parsed` is the
+    ``(extentities, record)`` tuple built by `parse_eac_file` if the file has
+    already been parsed"""
+    fname = basename(fpath)
+    import_log = MyImportLog(fname, threshold=logging.ERROR)
+    try:
+        if parsed is None:
+            st = S3BfssStorageMixIn()
+            with st.storage_read_file(fpath) as stream:
+                return service.import_eac_stream(
+                    stream, import_log, extid2eid=extid2eid, store=store, fpath=fpath
+                )
+        extentities, authority_record = parsed
+        created, updated, record = service.import_eac_extentities(
+            extentities, authority_record, import_log, store, extid2eid, fpath=fpath
+        )
+        return created, updated, record, ()
+    except Exception as exception:
+        service._cw.rollback()
+        if exception:
+            log.error("{} : {}".format(fname, to_unicode(exception)))
+        log.error(traceback.format_exc())
+        return 0, 0, 0, 0
 
 
 def eac_foreign_key_tables(schema):
@@ -155,25 +221,68 @@ def postprocess_same_as(cnx, sameas_authorityrecords, authrecords, log):
     log.info("Finish processing same_as relations")
 
 
-def build_es_doc(cnx, eid, index_name, log):
-    rset = cnx.find("AuthorityRecord", eid=eid)
-    if not rset:
-        cnx.error(f"AuthorityRecord with eid {eid} not found")
-        return
-    entity = rset.one()
-    try:
-        serializer = entity.cw_adapt_to("IFullTextIndexSerializable")
-        json = serializer.serialize(complete=False)
-    except Exception:
-        cnx.error("[{}] Failed to serialize entity {}".format(index_name, entity.eid))
-        return
-    return {
-        "_op_type": "index",
-        "_index": index_name,
-        "_type": "_doc",
-        "_id": serializer.es_id,
-        "_source": json,
-    }
+def authority_records_chunk(cnx, eids):
+    """fetch the AuthorityRecords `eids` with the attributes and relations
+    used by their ES serialization in a few queries"""
+    rset = cnx.execute(
+        "Any X, R, SD, ED, L, S, SN WHERE X is AuthorityRecord, X eid IN ({}), "
+        "X record_id R, X start_date SD, X end_date ED, X languages L, "
+        "X maintainer S?, S short_name SN".format(",".join(str(eid) for eid in eids))
+    )
+    records = {}
+    for idx, record in enumerate(rset.entities()):
+        records[record.eid] = record
+        # the record has at most one maintainer, fetched along with it
+        maintainers = [rset.get_entity(idx, 5)] if rset[idx][5] is not None else []
+        set_related_cache(record, "maintainer", maintainers)
+    if not records:
+        return []
+    names = cnx.execute(
+        "Any N, P, FV, X WHERE N is NameEntry, N name_entry_for X, "
+        "X eid IN ({}), N parts P, N form_variant FV".format(",".join(str(eid) for eid in records))
+    )
+    # same choice as `AuthorityRecord.authorized_name_entry`: an "authorized"
+    # NameEntry if any; otherwise any NameEntry
+    authorized = set()
+    for idx, (name_eid, parts, form_variant, eid) in enumerate(names):
+        record = records[eid]
+        if eid in authorized:
+            continue
+        if record._authorized_name_entry is None or form_variant == "authorized":
+            record._authorized_name_entry = names.get_entity(idx, 0)
+            if form_variant == "authorized":
+                authorized.add(eid)
+    return [records[eid] for eid in eids if eid in records]
+
+
+def iter_es_docs(cnx, eids, index_name, log, chunksize=1000):
+    """yield the ES documents of the AuthorityRecords `eids`, built from
+    records prefetched by chunks of `chunksize`"""
+    eids = sorted(eids)
+    for idx in range(0, len(eids), chunksize):
+        chunk = eids[idx : idx + chunksize]
+        entities = authority_records_chunk(cnx, chunk)
+        if len(entities) != len(chunk):
+            found = {entity.eid for entity in entities}
+            for eid in chunk:
+                if eid not in found:
+                    cnx.error(f"AuthorityRecord with eid {eid} not found")
+        for entity in entities:
+            try:
+                serializer = entity.cw_adapt_to("IFullTextIndexSerializable")
+                json = serializer.serialize(complete=False)
+            except Exception:
+                cnx.error("[{}] Failed to serialize entity {}".format(index_name, entity.eid))
+                continue
+            yield {
+                "_op_type": "index",
+                "_index": index_name,
+                "_type": "_doc",
+                "_id": serializer.es_id,
+                "_source": json,
+            }
+        # bound memory usage
+        cnx.drop_entity_cache()
 
 
 def postprocess_index_es(cnx, updated_authrecs, log):
@@ -190,10 +299,10 @@ def postprocess_index_es(cnx, updated_authrecs, log):
         if es is None:
             log.error("No connection to ES, skip ES indexing")
             return
-        es_docs = [
-            build_es_doc(cnx, eid, indexer.index_name, log) for eid, record_id in updated_authrecs
-        ]
-        es_bulk_index(es, es_docs)
+        es_docs = iter_es_docs(
+            cnx, {eid for eid, record_id in updated_authrecs}, indexer.index_name, log
+        )
+        ESBulkSink(es, cnx, source="import-eac").send(es_docs)
         log.info("Finish ES indexing.")
 
 
@@ -205,7 +314,9 @@ def init_extid2eid_index(cnx, source):
 
 
 @log_in_db
-def eac_import_files(cnx, fpaths, store=None, log=None):
+def eac_import_files(cnx, fpaths, store=None, log=None, processes=1):
+    """import EAC files `fpaths`. With `processes` > 1, files are parsed by a
+    pool of worker processes while the main process imports them"""
     if not log:
         log = logging.getLogger("import_eac")
     start_time = time()
@@ -227,12 +338,18 @@ def eac_import_files(cnx, fpaths, store=None, log=None):
     for record_id, autheid in store.rql(query):
         sameas_authorityrecords[record_id].add(autheid)
     created_authrecs = set()
+    service_extids = {extid for extid in extid2eid if extid.startswith("service-")}
     with sqlutil.no_trigger(cnx, foreign_keys, interactive=False):
-        for fpath in fpaths:
+        for fpath, parsed, error in iter_parsed_eac_files(
+            fpaths, service_extids, processes, _=cnx._
+        ):
             log.info("Process %r" % fpath)
             print("Process %r" % fpath)
+            if error is not None:
+                log.error(error)
+                continue
             _created, _updated, record, not_visited = eac_import_file(
-                service, store, fpath, extid2eid, log
+                service, store, fpath, extid2eid, log, parsed=parsed
             )
             if _created or _updated:
                 imported += 1
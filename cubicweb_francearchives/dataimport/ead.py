@@ -29,12 +29,14 @@
 # knowledge of the CeCILL-C license and that you accept its terms.
 #
 
+from collections import defaultdict
 from datetime import datetime
 import logging
 import os
 import os.path as osp
 import re
 from itertools import chain
+from urllib.parse import urlparse
 from uuid import uuid4
 import mimetypes
 from copy import deepcopy
@@ -48,7 +50,7 @@ import pytz
 from logilab.mtconverter import xml_escape
 
 from cubicweb.utils import json_dumps
-from cubicweb_francearchives.utils import merge_dicts, pick
+from cubicweb_francearchives.utils import is_absolute_url, iter_sql_chunks, merge_dicts, pick
 from cubicweb_francearchives.entities import ETYPE_CATEGORIES
 from cubicweb_francearchives.dataimport import (
     IndexImporterMixin,
@@ -70,6 +72,8 @@ from cubicweb_francearchives.dataimport import (
     default_service_name,
     load_services_map,
 )
+from cubicweb_francearchives.dataimport.esbulk import ESBulkSink
+from cubicweb_francearchives.dataimport.importstats import STATS
 from cubicweb_francearchives.dataimport.sqlutil import delete_from_filename
 from cubicweb_francearchives.dataimport.eadreader import (
     EADXMLReader,
@@ -167,6 +171,244 @@ def service_infos_for_es_doc(cnx, service_infos):
     }
 
 
+def sort_daos(daos):
+    """sort dao definitions as `digitized_versions` are (by url, NULL last)"""
+    return sorted(daos, key=lambda dao: (dao.get("url") is None, dao.get("url") or ""))
+
+
+def resolve_digitized_urls(daos, eadid):
+    """List of URLs of dao tags whose role is neither 'image' or 'thumbnail'.
+
+    :param list daos: dao definitions (dicts with `url`, `illustration_url`
+                      and `role` keys)
+    :param str eadid: eadid of the related FindingAid
+    """
+    urls = []
+    for dao in daos:
+        url = dao.get("url")
+        if url:
+            if urlparse(url).scheme:
+                urls.append(url)
+            elif eadid.startswith("FRAD015"):
+                path = url.replace("\\", "/")
+                urls.append(
+                    "http://archives.cantal.fr/accounts/mnesys_ad15/datas/medias/{}".format(path)
+                )
+    # try to sort urls especially for the case of viewer links such as
+    # http://www.archinoe.fr/ark:/77293/c2mzpfn3jmb4ootg/1,
+    # http://www.archinoe.fr/ark:/77293/c2mzpfn3jmb4ootg/N
+    return sorted(urls)
+
+
+def unprocessed_illustration_url(daos):
+    # take first url with role 'thumbnail' or 'image'. Otherwise, take
+    # any non null illustration url
+    url = None
+    for dao in daos:
+        if dao.get("illustration_url"):
+            url = dao["illustration_url"]
+            if dao.get("role") in {"thumbnail", "image"}:
+                break
+    return url
+
+
+def resolve_illustration_url(daos, eadid, service=None):
+    """Illustration URL.
+
+    :param list daos: dao definitions (dicts with `url`, `illustration_url`
+                      and `role` keys)
+    :param str eadid: eadid of the related FindingAid
+    :param dict service: `code` and `thumbnail_url` of the related Service if any
+    """
+    url = unprocessed_illustration_url(daos)
+    if url and is_absolute_url(url):
+        return url
+    service_code = service["code"] if service else None
+    thumbnail_url = service.get("thumbnail_url") if service else None
+    if not url and service_code == "FRBNF":
+        # special case for BnF
+        urls = [d["url"] for d in daos if d.get("url")]
+        url = urls[0] if urls else None
+    if not url:
+        return None
+    # not service and not url is a relative URL (root or path unknown)
+    if not urlparse(url).netloc and not service:
+        return None
+    if url.startswith("/"):
+        url = url[1:]
+    if service_code == "FRAD001":
+        return (
+            "http://hatch3.vtech.fr/cgi-bin/iipsrv.fcgi?"
+            "FIF=/home/httpd/ad01/data/files/images"
+            "/{eadid}/{url}&HEI=375&QLT=80&CVT=JPG&SIZE=1045163".format(
+                eadid=eadid.upper(), url=url
+            )
+        )
+    elif service_code == "FRAD015":
+        basepath, ext = osp.splitext(url)
+        return "http://archives.cantal.fr/accounts/mnesys_ad15/datas/medias/{}_{}_/0_0{}".format(
+            basepath.replace("\\", "/"), ext[1:], ext
+        )
+    elif service_code == "QUAIBR75":
+        basepath, ext = osp.splitext(url)
+        return (
+            "http://archives.quaibranly.fr:8990/accounts/"
+            "mnesys_quaibranly/datas/{}_{}_/0_0{}".format(
+                basepath.replace("\\", "/"), ext[1:], ext
+            )
+        )
+    else:
+        if service_code == "FRAD085" and not url.isdigit():
+            url = url.replace("\\", "/")
+        if thumbnail_url:
+            url = thumbnail_url.format(url=url)
+    # relative URL (root or path unknown)
+    if not url.startswith("http"):
+        return None
+    return url
+
+
+def illustration_infos_for_es_doc(daos, eadid, service_infos):
+    """precompute illustration and digitized URLs stored in es documents of
+    digitized FindingAids and FAComponents so that search results do not have
+    to compute them"""
+    if not daos:
+        return {}
+    daos = sort_daos(daos)
+    service = None
+    if service_infos and service_infos.get("eid"):
+        service = {
+            "code": service_infos["code"],
+            "thumbnail_url": service_infos.get("thumbnail_url"),
+        }
+    return {
+        "illustration_url": resolve_illustration_url(daos, eadid, service),
+        "digitized_urls": resolve_digitized_urls(daos, eadid),
+    }
+
+
+def update_illustration_infos(cnx, service_eid, chunksize=1000):
+    """Recompute illustration and digitized URLs stored in EsDocuments of
+    digitized FindingAids and FAComponents of a service (e.g. after its
+    `thumbnail_url` was modified), or of no service if `service_eid` is None.
+
+    EsDocuments are updated and committed by chunks of `chunksize` documents.
+    Generate ``(stable_id, infos, published)`` for each updated document once
+    its chunk is committed, `published` telling if the document is also in
+    the published index.
+    """
+    if service_eid is None:
+        service_infos = None
+        restriction = "IS NULL"
+    else:
+        service = cnx.entity_from_eid(service_eid)
+        service_infos = {
+            "eid": service.eid,
+            "code": service.code,
+            "thumbnail_url": service.thumbnail_url,
+        }
+        restriction = "= %(s)s"
+    query = """
+    SELECT x.eid, x.stable_id, fa.cw_eadid, es.cw_eid, es.cw_doc,
+      EXISTS(
+        SELECT 1 FROM in_state_relation AS isr JOIN cw_state AS st ON (st.cw_eid=isr.eid_to)
+        WHERE isr.eid_from=fa.cw_eid AND st.cw_name='wfs_cmsobject_published'
+      ) AS published
+    FROM (
+      SELECT cw_eid AS eid, cw_stable_id AS stable_id, cw_eid AS fa
+      FROM cw_findingaid WHERE cw_service {restriction}
+      UNION ALL
+      SELECT fac.cw_eid, fac.cw_stable_id, fac.cw_finding_aid
+      FROM cw_facomponent AS fac JOIN cw_findingaid AS f ON (fac.cw_finding_aid=f.cw_eid)
+      WHERE f.cw_service {restriction}
+    ) AS x
+    JOIN cw_findingaid AS fa ON (fa.cw_eid=x.fa)
+    JOIN cw_esdocument AS es ON (es.cw_entity=x.eid)
+    WHERE EXISTS(SELECT 1 FROM digitized_versions_relation AS dvr WHERE dvr.eid_from=x.eid)
+    """.format(
+        restriction=restriction
+    )
+    for rows in iter_sql_chunks(cnx, query, {"s": service_eid}, chunksize=chunksize, key="eid"):
+        daos = defaultdict(list)
+        cu = cnx.system_sql(
+            "SELECT dvr.eid_from, dv.cw_url, dv.cw_illustration_url, dv.cw_role "
+            "FROM digitized_versions_relation AS dvr "
+            "JOIN cw_digitizedversion AS dv ON (dv.cw_eid=dvr.eid_to) "
+            "WHERE dvr.eid_from IN ({})".format(",".join(str(int(row[0])) for row in rows))
+        )
+        for eid, url, illustration_url, role in cu.fetchall():
+            daos[eid].append({"url": url, "illustration_url": illustration_url, "role": role})
+        updated = []
+        for eid, stable_id, eadid, esdoc_eid, doc, published in rows:
+            infos = illustration_infos_for_es_doc(daos[eid], eadid, service_infos)
+            if isinstance(doc, str):
+                # sqlite returns unicode instead of dict
+                doc = json.loads(doc)
+            if all(doc.get(key) == value for key, value in infos.items()):
+                continue
+            doc.update(infos)
+            cnx.system_sql(
+                "UPDATE cw_esdocument SET cw_doc=%(d)s WHERE cw_eid=%(e)s",
+                {"d": json_dumps(doc), "e": esdoc_eid},
+            )
+            updated.append((stable_id, infos, published))
+        cnx.commit()
+        yield from updated
+
+
+def illustration_infos_es_actions(cnx, service_eids, chunksize=1000):
+    """Generate the partial updates of the es documents whose illustration
+    infos are recomputed by `update_illustration_infos`"""
+    index_name = cnx.vreg["es"].select("indexer", cnx).index_name
+    published_indexer = cnx.vreg["es"].select("indexer", cnx, published=True)
+    for service_eid in service_eids:
+        for stable_id, infos, published in update_illustration_infos(
+            cnx, service_eid, chunksize=chunksize
+        ):
+            index_names = [index_name]
+            if published and published_indexer:
+                # not published documents are missing from the published index
+                index_names.append(published_indexer.index_name)
+            for name in index_names:
+                yield {
+                    "_op_type": "update",
+                    "_index": name,
+                    "_type": "_doc",
+                    "_id": stable_id,
+                    "doc": infos,
+                }
+
+
+def reindex_illustration_infos(cnx, service_eids, chunksize=1000):
+    """Recompute the illustration infos of digitized FindingAids and
+    FAComponents of services `service_eids` and stream them to elasticsearch
+    (documents which could not be updated are journaled, see `ESBulkSink`)
+    """
+    es = cnx.vreg["es"].select("indexer", cnx).get_connection()
+    actions = illustration_infos_es_actions(cnx, service_eids, chunksize=chunksize)
+    if es:
+        ESBulkSink(es, cnx, source="illustration-infos").send(actions)
+    else:
+        # EsDocuments are still updated
+        for _ in actions:
+            pass
+
+
+def reindex_illustration_infos_task(repo, service_eids):
+    """`reindex_illustration_infos` meant to be run once the transaction which
+    modified the services has been committed, in a thread (see
+    `UpdateIllustrationInfosOp`)
+    """
+    with repo.internal_cnx() as cnx:
+        service_eids = [
+            eid
+            for eid in service_eids
+            if cnx.execute("Any S WHERE S eid %(s)s, S is Service", {"s": eid})
+        ]
+        if service_eids:
+            reindex_illustration_infos(cnx, service_eids)
+
+
 def component_stable_id(fa_id, comp_id, comp_path):
     if comp_id:
         return usha1("{}{}".format(fa_id, comp_id))
@@ -182,6 +424,10 @@ def readerconfig(cwconfig, appid, esonly, nodrop=False, **kwargs):
         "elasticsearch-locations": cwconfig["elasticsearch-locations"],
         "esonly": esonly,
         "appfiles-dir": cwconfig["appfiles-dir"],
+        "pdf-text-cache-dir": cwconfig["pdf-text-cache-dir"],
+        "pdf-text-cache-size": cwconfig["pdf-text-cache-size"],
+        "pdftotext-timeout": cwconfig["pdftotext-timeout"],
+        "pdftotext-processes": cwconfig["pdftotext-processes"],
         "nodrop": nodrop,
         "force_delete": False,
         # compare authorities grouped by service without calling normalize_entry
@@ -430,6 +676,7 @@ class Reader(MetadataReaderMixIn, IndexImporterMixin):
         self.delete_existing_findingaid = False
         self.deferred = {}
         self._pdf_metadata_cache = {}
+        self._pdf_text_cache = pdf.pdf_text_cache(config)
         self._files = {}
         self._stable_id_map = None
         self._richstring_cache = {}
@@ -589,6 +836,9 @@ class Reader(MetadataReaderMixIn, IndexImporterMixin):
             did=es_dict(did_attrs, ["unittitle", "unitid", "note", "abstract"]),
             publisher=findingaid_attrs["publisher"],
             digitized=bool(comp_props["daos"]),
+            **illustration_infos_for_es_doc(
+                comp_props["daos"], findingaid_attrs["eadid"], service_infos
+            ),
             index_entries=unique_indices(index_entries),
             originators=findingaid_attrs["originators"],
             fa_stable_id=findingaid_attrs["stable_id"],
@@ -685,12 +935,14 @@ class Reader(MetadataReaderMixIn, IndexImporterMixin):
         fa_attrs      : attributes to add to FindingAid
         """
         filepath = fa_support["data"]
-        binary = self.storage.storage_get_file_content(filepath)
+        with STATS.timer("storage_read"):
+            binary = self.storage.storage_get_file_content(filepath)
         if not binary:
             self.log.error('Could not find file "%r". Please reimport it.', filepath)
             return []
         try:
-            tree = preprocess_ead(binary)
+            with STATS.timer("preprocess_ead"):
+                tree = preprocess_ead(binary)
         except Exception as exc:
             self.log.exception("Import aborted: invalid xml %r", filepath)
             capture_exception(exc, filepath)
@@ -935,6 +1187,7 @@ class Reader(MetadataReaderMixIn, IndexImporterMixin):
             fa_stable_id=findingaid_attrs["stable_id"],
             did=es_dict(did_attrs, ["unittitle", "unitid", "note", "abstract"]),
             digitized=bool(fa_properties["daos"]),
+            **illustration_infos_for_es_doc(fa_properties["daos"], eadid, service_infos),
             index_entries=index_entries,
             originators=ead_reader.originators(),
             creation_date=findingaid_attrs["creation_date"],
@@ -958,7 +1211,7 @@ class Reader(MetadataReaderMixIn, IndexImporterMixin):
         # update findingaid_attrs['originators'] from es_doc
         # we do not use findingaid_attrs further
         findingaid_attrs["originators"] = fa_es_doc["originators"]
-        for comp_node, comp_attrs in ead_reader.walk():
+        for comp_node, comp_attrs in STATS.timed_iter("walk", ead_reader.walk()):
             parent_component = path2eid[comp_attrs["path"][:-1]]
             es_doc = self.import_component(
                 comp_attrs, findingaid_attrs, service_infos, parent_component=parent_component
@@ -984,7 +1237,13 @@ class Reader(MetadataReaderMixIn, IndexImporterMixin):
         creation_date = self.creation_date_from_filepath(filepath)
         if not self.config["esonly"]:
             self.delete_from_filename(filepath)
-        infos = pdf.pdf_infos(filepath)
+        with STATS.timer("pdftotext"):
+            infos = pdf.pdf_infos(
+                filepath,
+                sha1=fa_support.get("data_hash"),
+                cache=self._pdf_text_cache,
+                timeout=self.config.get("pdftotext-timeout", pdf.PDFTOTEXT_TIMEOUT),
+            )
         if metadata is None:
             metadata = self.pdf_metadata(filepath)
         metadata["creation_date"] = creation_date
@@ -86,6 +86,97 @@ def raw_content(node):
     return etree.tostring(node, method="html", encoding="unicode")
 
 
+# rich nodes which the XSLT renders as their children wrapped in the
+# "ead-wrapper" div (``<tag>[not(head)]`` templates or no template at all)
+PLAIN_RICH_TAGS = frozenset(
+    (
+        "accessrestrict",
+        "accruals",
+        "acqinfo",
+        "altformavail",
+        "appraisal",
+        "arrangement",
+        "bibliography",
+        "bioghist",
+        "custodhist",
+        "descgrp",
+        "fileplan",
+        "index",
+        "note",
+        "odd",
+        "originalsloc",
+        "otherfindaid",
+        "phystech",
+        "prefercite",
+        "processinfo",
+        "relatedmaterial",
+        "scopecontent",
+        "separatedmaterial",
+        "userestrict",
+    )
+)
+
+NON_ASCII_RGX = re.compile(r"[^\x00-\x7f]")
+
+
+def html_escape_like_xslt(text):
+    """escape `text` as the html serialization of the XSLT result does: the
+    result document has no encoding, non-ASCII characters are written as
+    hexadecimal character references"""
+    if not text:
+        return ""
+    text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    text = text.replace("\r", "&#13;")
+    return NON_ASCII_RGX.sub(lambda m: "&#x%X;" % ord(m.group()), text)
+
+
+def is_plain_rich_node(node):
+    """return True if `node` only holds plain text, paragraphs and heads of
+    plain text, without any of the attributes the XSLT handles"""
+    if node.tag not in PLAIN_RICH_TAGS or "id" in node.attrib or "label" in node.attrib:
+        return False
+    for child in node:
+        if child.tag not in ("p", "head") or "label" in child.attrib or len(child):
+            return False
+        if child.tag == "head" and node.tag == "bibliography":
+            # the generic `bibliography` template applies
+            return False
+    return True
+
+
+def plain_rich_content(node):
+    """pure lxml version of ``raw_content(html_formatter(node))`` for plain
+    rich nodes (see `is_plain_rich_node`)"""
+    # heads are only displayed above some text
+    with_title = any(child.tag != "head" and child.text is not None for child in node)
+    parts = ['<div class="ead-wrapper">', html_escape_like_xslt(node.text)]
+    for child in node:
+        if child.tag == "p":
+            parts.append('<div class="ead-p">')
+            parts.append(html_escape_like_xslt(child.text))
+            parts.append("</div>")
+        elif with_title:
+            parts.append('<span class="ead-title">')
+            parts.append(html_escape_like_xslt(child.text))
+            parts.append("</span>")
+        parts.append(html_escape_like_xslt(child.tail))
+    parts.append("</div>")
+    return "".join(parts)
+
+
+def html_content(node):
+    """return the html serialization of `node` converted by the XSLT
+
+    Plain rich nodes, which are the vast majority in real files, are
+    converted without the XSLT (see `plain_rich_content`).
+    """
+    if node is None:
+        return None
+    if is_plain_rich_node(node):
+        return plain_rich_content(node)
+    return raw_content(html_formatter(node))
+
+
 def unnest(node):
     for subnode in node.findall(".//%s" % node.tag):
         subnode.tag = "p"
@@ -95,9 +186,9 @@ def unnest(node):
 
 def to_html(node):
     if isinstance(node, (list, tuple)):
-        return "\n".join([raw_content(html_formatter(node)) or "" for node in node])
+        return "\n".join([html_content(node) or "" for node in node])
     else:
-        return raw_content(html_formatter(node))
+        return html_content(node)
 
 
 def optset(value):
@@ -107,7 +198,7 @@ def optset(value):
 
 
 def optset_html(node):
-    return optset(raw_content(html_formatter(node)))
+    return optset(html_content(node))
 
 
 def delete(node):
@@ -286,7 +377,7 @@ def did_infos(did, log=None):
 def elt_description(node):
     if node is not None:
         unnest(node)
-        content = raw_content(html_formatter(node))
+        content = html_content(node)
         if content is not None:
             return '<div class="ead-section ead-{}">{}</div>'.format(node.tag, content)
     return ""
@@ -403,10 +494,7 @@ def eadheader_props(eadheader):
         "author": to_html(eadheader.find("author")),
         "author_format": "text/html",
         "changes": "\n".join(
-            [
-                raw_content(html_formatter(node)) or ""
-                for node in eadheader.findall(".//revisiondesc/change")
-            ]
+            [html_content(node) or "" for node in eadheader.findall(".//revisiondesc/change")]
         ),
         "changes_format": "text/html",
         "creation": to_html(eadheader.find("creation")),
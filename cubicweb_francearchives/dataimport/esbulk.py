@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © LOGILAB S.A. (Paris, FRANCE) 2016-2023
+# Contact http://www.logilab.fr -- mailto:contact@logilab.fr
+#
+# This software is governed by the CeCILL-C license under French law and
+# abiding by the rules of distribution of free software. You can use,
+# modify and/ or redistribute the software under the terms of the CeCILL-C
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# "http://www.cecill.info".
+#
+# As a counterpart to the access to the source code and rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty and the software's author, the holder of the
+# economic rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated
+# with loading, using, modifying and/or developing or reproducing the
+# software by the user in light of its specific status of free software,
+# that may mean that it is complicated to manipulate, and that also
+# therefore means that it is reserved for developers and experienced
+# professionals having in-depth computer knowledge. Users are therefore
+# encouraged to load and test the software's suitability as regards their
+# requirements in conditions enabling the security of their systemsand/or
+# data to be ensured and, more generally, to use and operate it in the
+# same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+#
+
+"""streaming elasticsearch bulk indexing
+
+`ESBulkSink` consumes an iterable of bulk actions lazily, cuts it into
+chunks bounded by a number of documents and a size in bytes, and sends
+them with a bounded number of concurrent bulk requests: the iterable is
+only consumed when a request slot is available. Requests rejected by ES
+with a 429 status are retried with an exponential backoff.
+
+Documents which could not be indexed after all retries are recorded in the
+`es_failed_documents` table so that `fa-es-replay-failures` can send them
+again later.
+"""
+
+import json
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
+from elasticsearch import helpers as es_helpers
+
+from cubicweb_francearchives.utils import iter_sql_rows
+
+LOGGER = logging.getLogger("francearchives.esbulk")
+
+ES_FAILURES_TABLE = "es_failed_documents"
+
+
+def create_es_failures_table(sql):
+    sql(
+        """
+    CREATE TABLE IF NOT EXISTS es_failed_documents (
+    index_name varchar(256) NOT NULL,
+    doc_id varchar(256) NOT NULL,
+    op_type varchar(16) NOT NULL,
+    action text NOT NULL,
+    status varchar(16),
+    error text,
+    source varchar(256),
+    nb_failures integer NOT NULL DEFAULT 1,
+    failure_date TIMESTAMP WITH TIME ZONE DEFAULT current_timestamp,
+    PRIMARY KEY (index_name, doc_id)
+    );
+    """
+    )
+
+
+def es_failures_enabled(cnx):
+    """failures journal is only available on postgres"""
+    return cnx.repo.system_source.dbdriver == "postgres"
+
+
+def action_size(serializer, action):
+    """return the size in bytes of ``action`` in a bulk request body"""
+    action_line, data = es_helpers.expand_action(action)
+    size = len(serializer.dumps(action_line).encode("utf-8")) + 1
+    if data is not None:
+        size += len(serializer.dumps(data).encode("utf-8")) + 1
+    return size
+
+
+def chunk_actions(actions, chunk_size, max_chunk_bytes, sizeof):
+    """group ``actions`` in lists of at most ``chunk_size`` actions and
+    ``max_chunk_bytes`` bytes (an action bigger than ``max_chunk_bytes``
+    is sent alone)
+    """
+    chunk, chunk_bytes = [], 0
+    for action in actions:
+        size = sizeof(action)
+        if chunk and (len(chunk) >= chunk_size or chunk_bytes + size > max_chunk_bytes):
+            yield chunk
+            chunk, chunk_bytes = [], 0
+        chunk.append(action)
+        chunk_bytes += size
+    if chunk:
+        yield chunk
+
+
+def action_key(action):
+    return action.get("_index"), action.get("_id")
+
+
+class ESBulkSink(object):
+    """send a stream of bulk actions to elasticsearch
+
+    :param Elasticsearch es: elasticsearch connection
+    :param Connection cnx: database connection used to journal failures
+      (failures are only logged if None)
+    :param str source: name of the process which sends the documents,
+      recorded with failures
+    :param int chunk_size: maximum number of actions in a bulk request
+    :param int max_chunk_bytes: maximum size of a bulk request
+    :param int thread_count: number of concurrent bulk requests
+    :param int max_retries: number of retries of documents rejected with a 429
+    :param int initial_backoff: seconds to wait before the first retry, then
+      doubled for each retry up to `max_backoff`
+    """
+
+    def __init__(
+        self,
+        es,
+        cnx=None,
+        source=None,
+        chunk_size=500,
+        max_chunk_bytes=10 * 1024 * 1024,
+        thread_count=1,
+        max_retries=5,
+        initial_backoff=2,
+        max_backoff=600,
+    ):
+        self.es = es
+        self.cnx = cnx
+        self.journal = cnx is not None and es_failures_enabled(cnx)
+        self.source = source
+        self.chunk_size = chunk_size
+        self.max_chunk_bytes = max_chunk_bytes
+        self.thread_count = max(thread_count, 1)
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.success = 0
+        self.failed = 0
+
+    def sizeof(self, action):
+        return action_size(self.es.transport.serializer, action)
+
+    def send_chunk(self, chunk):
+        """send a list of actions and return failed (action, status, error) tuples"""
+        actions = {action_key(action): action for action in chunk}
+        failures = []
+        for ok, item in es_helpers.streaming_bulk(
+            self.es,
+            chunk,
+            chunk_size=len(chunk),
+            max_chunk_bytes=self.max_chunk_bytes,
+            raise_on_error=False,
+            raise_on_exception=False,
+            max_retries=self.max_retries,
+            initial_backoff=self.initial_backoff,
+            max_backoff=self.max_backoff,
+            yield_ok=False,
+        ):
+            op_type, info = item.popitem()
+            status = info.get("status")
+            if op_type == "delete" and status == 404:
+                # document is already absent from the index
+                continue
+            action = actions.get((info.get("_index"), info.get("_id")))
+            failures.append((action, op_type, status, info.get("error") or info.get("exception")))
+        return len(chunk), failures
+
+    def chunks(self, actions):
+        return chunk_actions(actions, self.chunk_size, self.max_chunk_bytes, self.sizeof)
+
+    def send(self, actions):
+        """consume ``actions`` and return (number of indexed documents,
+        number of failed documents)
+        """
+        if not self.es:
+            return 0, 0
+        if self.thread_count == 1:
+            for chunk in self.chunks(actions):
+                self.handle_result(*self.send_chunk(chunk))
+        else:
+            pending = deque()
+            with ThreadPoolExecutor(max_workers=self.thread_count) as executor:
+                for chunk in self.chunks(actions):
+                    if len(pending) >= self.thread_count:
+                        # backpressure: wait for a request to be done before
+                        # consuming more actions
+                        self.handle_result(*pending.popleft().result())
+                    pending.append(executor.submit(self.send_chunk, chunk))
+                while pending:
+                    self.handle_result(*pending.popleft().result())
+        return self.success, self.failed
+
+    def handle_result(self, nb_actions, failures):
+        self.success += nb_actions - len(failures)
+        self.failed += len(failures)
+        if not failures:
+            return
+        for action, op_type, status, error in failures:
+            LOGGER.error(
+                "failed to %s document %r in %r (%s): %s",
+                op_type,
+                action and action.get("_id"),
+                action and action.get("_index"),
+                status,
+                error,
+            )
+        if self.journal:
+            self.journal_failures(failures)
+
+    def journal_failures(self, failures):
+        serializer = self.es.transport.serializer
+        rows = [
+            {
+                "index": action["_index"],
+                "id": str(action["_id"]),
+                "op": op_type,
+                "action": serializer.dumps(action),
+                "status": None if status is None else str(status),
+                "error": None if error is None else str(error),
+                "source": self.source,
+            }
+            for action, op_type, status, error in failures
+            if action is not None and action.get("_id") is not None
+        ]
+        if not rows:
+            return
+        # use a dedicated connection: failures must be kept even if the
+        # current transaction is rolled back
+        sqlcnx = self.cnx.repo.system_source.get_connection()
+        try:
+            crs = sqlcnx.cursor()
+            crs.executemany(
+                "INSERT INTO es_failed_documents "
+                "(index_name, doc_id, op_type, action, status, error, source) "
+                "VALUES (%(index)s, %(id)s, %(op)s, %(action)s, %(status)s, "
+                "%(error)s, %(source)s) "
+                "ON CONFLICT (index_name, doc_id) DO UPDATE SET "
+                "op_type=EXCLUDED.op_type, action=EXCLUDED.action, "
+                "status=EXCLUDED.status, error=EXCLUDED.error, "
+                "source=COALESCE(EXCLUDED.source, es_failed_documents.source), "
+                "nb_failures=es_failed_documents.nb_failures + 1, "
+                "failure_date=current_timestamp",
+                rows,
+            )
+            sqlcnx.commit()
+        except Exception:
+            LOGGER.exception("failed to record %s documents in %s", len(rows), ES_FAILURES_TABLE)
+        finally:
+            sqlcnx.close()
+
+
+def es_failures_restriction(index_name=None, source=None):
+    restrictions = []
+    if index_name is not None:
+        restrictions.append("index_name = %(index)s")
+    if source is not None:
+        restrictions.append("source = %(source)s")
+    if not restrictions:
+        return ""
+    return " WHERE " + " AND ".join(restrictions)
+
+
+def count_es_failures(cnx, index_name=None, source=None):
+    return cnx.system_sql(
+        "SELECT COUNT(*) FROM es_failed_documents"
+        + es_failures_restriction(index_name, source),
+        {"index": index_name, "source": source},
+    ).fetchone()[0]
+
+
+def iter_es_failures(cnx, index_name=None, source=None):
+    """yield bulk actions recorded in the failures journal"""
+    for (action,) in iter_sql_rows(
+        cnx,
+        "SELECT action FROM es_failed_documents"
+        + es_failures_restriction(index_name, source),
+        {"index": index_name, "source": source},
+        name="es_failures",
+    ):
+        yield json.loads(action)
+
+
+def replay_es_failures(cnx, es, index_name=None, source=None, **sink_options):
+    """send again documents recorded in the failures journal
+
+    documents which are successfully sent are removed from the journal,
+    the other ones are kept with an incremented `nb_failures`.
+
+    :returns: (number of indexed documents, number of failed documents)
+    """
+    started = cnx.system_sql("SELECT clock_timestamp()").fetchone()[0]
+    sink = ESBulkSink(es, cnx, **sink_options)
+    actions = iter_es_failures(cnx, index_name, source)
+    # peek the first action to avoid opening a connection to ES for nothing
+    first = next(actions, None)
+    if first is None:
+        return 0, 0
+    result = sink.send(chain((first,), actions))
+    restriction = es_failures_restriction(index_name, source)
+    cnx.system_sql(
+        "DELETE FROM es_failed_documents"
+        + (restriction + " AND" if restriction else " WHERE")
+        + " failure_date < %(started)s",
+        {"index": index_name, "source": source, "started": started},
+    )
+    cnx.commit()
+    return result
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © LOGILAB S.A. (Paris, FRANCE) 2016-2023
+# Contact http://www.logilab.fr -- mailto:contact@logilab.fr
+#
+# This software is governed by the CeCILL-C license under French law and
+# abiding by the rules of distribution of free software. You can use,
+# modify and/ or redistribute the software under the terms of the CeCILL-C
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# "http://www.cecill.info".
+#
+# As a counterpart to the access to the source code and rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty and the software's author, the holder of the
+# economic rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated
+# with loading, using, modifying and/or developing or reproducing the
+# software by the user in light of its specific status of free software,
+# that may mean that it is complicated to manipulate, and that also
+# therefore means that it is reserved for developers and experienced
+# professionals having in-depth computer knowledge. Users are therefore
+# encouraged to load and test the software's suitability as regards their
+# requirements in conditions enabling the security of their systemsand/or
+# data to be ensured and, more generally, to use and operate it in the
+# same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+#
+"""orchestration of the steps of the `import-all` command
+
+Steps are run as `cubicweb-ctl` subprocesses as soon as their dependencies
+are done, within a global budget of slots (processes / database
+connections). Their status is recorded in the `import_all_steps` table so
+that a failed run can be resumed from the failed steps.
+"""
+
+# standard library imports
+import logging
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+
+# third party imports
+# CubicWeb specific imports
+# library specific imports
+
+LOGGER = logging.getLogger("francearchives.import-all")
+
+# commands importing through a MassiveObjectStore. All the stores share the
+# `cwmassive_initialized` table, which the `finish()` of one of them merges
+# and drops, so two of these commands must never run at the same time
+MASSIVE_STORE_COMMANDS = frozenset(
+    (
+        "import-ead",
+        "import-eac",
+        "import-dc",
+        "import-oai",
+        "import-directories",
+        "import-subscribers",
+        "fa-harvest-oai",
+        "fa-reindex-ead",
+        "fa-es-reindex",
+    )
+)
+
+
+def create_import_steps_table(sql):
+    sql(
+        """
+    CREATE TABLE IF NOT EXISTS import_all_steps (
+    step varchar(128) PRIMARY KEY NOT NULL,
+    status varchar(16) NOT NULL,
+    start TIMESTAMP WITH TIME ZONE,
+    stop TIMESTAMP WITH TIME ZONE
+    );
+    """
+    )
+
+
+class ImportStep(object):
+    """a step of `import-all`: a cubicweb-ctl command line, its dependencies
+    (step names), the number of slots it uses and whether it must not run at
+    the same time as another exclusive step"""
+
+    def __init__(self, name, cmd_line, depends_on=(), slots=1, exclusive=False):
+        self.name = name
+        self.cmd_line = cmd_line
+        self.depends_on = tuple(depends_on)
+        self.slots = max(int(slots), 1)
+        self.exclusive = exclusive
+
+    def __repr__(self):
+        return "<ImportStep {}>".format(self.name)
+
+
+def spawn_step(step):
+    """start the command of `step` in a subprocess"""
+    return subprocess.Popen([sys.executable, "-m", "cubicweb.cwctl"] + list(step.cmd_line))
+
+
+def build_steps(yamlconfig, build_cmd):
+    """Build the steps listed in the `commands` entry of `yamlconfig`.
+
+    A step runs the command of the same name, or the one given by the
+    `command` key of its configuration (e.g. to run the same command with
+    other arguments). If no step declares its dependencies (`depends_on`
+    key), steps are run one after the other in the listed order.
+
+    Steps running one of the `MASSIVE_STORE_COMMANDS` (or declared with the
+    `exclusive` key) are exclusive: they are never run at the same time,
+    whatever their dependencies.
+    """
+    names = yamlconfig["commands"]
+    stepsconfig = OrderedDict((name, yamlconfig.get(name) or {}) for name in names)
+    declared = any("depends_on" in conf for conf in stepsconfig.values())
+    steps = OrderedDict()
+    previous = None
+    for name, conf in stepsconfig.items():
+        if declared:
+            depends_on = conf.get("depends_on") or ()
+            if isinstance(depends_on, str):
+                depends_on = [depends_on]
+        else:
+            depends_on = [previous] if previous else []
+        for dependency in depends_on:
+            if dependency not in stepsconfig:
+                raise ValueError("step {} depends on unknown step {}".format(name, dependency))
+        cmd_line = build_cmd(name)
+        exclusive = bool(conf.get("exclusive")) or cmd_line[0] in MASSIVE_STORE_COMMANDS
+        steps[name] = ImportStep(name, cmd_line, depends_on, conf.get("slots", 1), exclusive)
+        previous = name
+    check_cycles(steps)
+    return steps
+
+
+def check_cycles(steps):
+    """raise ValueError if dependencies of `steps` are cyclic"""
+    resolved = set()
+    remaining = list(steps.values())
+    while remaining:
+        ready = [step for step in remaining if resolved.issuperset(step.depends_on)]
+        if not ready:
+            raise ValueError(
+                "cyclic dependencies between steps {}".format(
+                    ", ".join(step.name for step in remaining)
+                )
+            )
+        resolved.update(step.name for step in ready)
+        remaining = [step for step in remaining if step.name not in resolved]
+
+
+class StepsJournal(object):
+    """checkpoints of the steps, stored in the `import_all_steps` table
+    through a dedicated connection (`sqlcnx`) so that they are committed
+    whatever the steps do"""
+
+    def __init__(self, sqlcnx):
+        self.sqlcnx = sqlcnx
+
+    def _execute(self, query, args=None):
+        with self.sqlcnx.cursor() as cursor:
+            cursor.execute(query, args)
+            rows = cursor.fetchall() if cursor.description else None
+        self.sqlcnx.commit()
+        return rows
+
+    def reset(self):
+        self._execute("DELETE FROM import_all_steps")
+
+    def done_steps(self):
+        return {
+            step
+            for step, in self._execute("SELECT step FROM import_all_steps WHERE status='done'")
+        }
+
+    def started(self, name):
+        self._execute(
+            """
+            INSERT INTO import_all_steps (step, status, start)
+            VALUES (%(step)s, 'running', current_timestamp)
+            ON CONFLICT (step) DO UPDATE SET
+              status='running', start=current_timestamp, stop=NULL
+            """,
+            {"step": name},
+        )
+
+    def finished(self, name, success):
+        self._execute(
+            "UPDATE import_all_steps SET status=%(status)s, stop=current_timestamp "
+            "WHERE step=%(step)s",
+            {"step": name, "status": "done" if success else "failed"},
+        )
+
+    def timings(self):
+        """return {step: (status, start, stop)}"""
+        return {
+            step: (status, start, stop)
+            for step, status, start, stop in self._execute(
+                "SELECT step, status, start, stop FROM import_all_steps"
+            )
+        }
+
+
+def run_steps(steps, budget, journal, done=(), spawn=spawn_step, poll_interval=1):
+    """Run `steps` (an ordered dict of ImportStep) as soon as their
+    dependencies are done, using at most `budget` slots at the same time.
+
+    Steps in `done` (already done or skipped) are not run. Exclusive steps
+    are run one at a time. When a step fails, the steps depending on it are
+    not run but the other ones are. Return the names of the failed steps.
+    """
+    done = set(done)
+    pending = [step for name, step in steps.items() if name not in done]
+    running = {}  # step -> process
+    failed = []
+    used = 0
+    while True:
+        for step in list(pending):
+            slots = min(step.slots, budget)
+            if used + slots > budget or not done.issuperset(step.depends_on):
+                continue
+            if step.exclusive and any(other.exclusive for other in running):
+                continue
+            pending.remove(step)
+            LOGGER.info("[import-all] start %s", step.name)
+            journal.started(step.name)
+            running[step] = spawn(step)
+            used += slots
+        if not running:
+            break
+        time.sleep(poll_interval)
+        for step, process in list(running.items()):
+            returncode = process.poll()
+            if returncode is None:
+                continue
+            del running[step]
+            used -= min(step.slots, budget)
+            journal.finished(step.name, returncode == 0)
+            if returncode == 0:
+                LOGGER.info("[import-all] %s done", step.name)
+                done.add(step.name)
+            else:
+                LOGGER.error("[import-all] %s failed (exit code %s)", step.name, returncode)
+                failed.append(step.name)
+    for step in pending:
+        LOGGER.warning("[import-all] %s not run as one of its dependencies failed", step.name)
+    return failed
+
+
+def timings_report(steps, journal):
+    """yield a line per step with its status and duration"""
+    timings = journal.timings()
+    for name in steps:
+        if name not in timings:
+            yield "{}: not run".format(name)
+            continue
+        status, start, stop = timings[name]
+        if start and stop:
+            yield "{}: {} in {}".format(name, status, stop - start)
+        else:
+            yield "{}: {}".format(name, status)
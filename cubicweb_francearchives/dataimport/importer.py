@@ -43,7 +43,6 @@ from cubicweb.dataimport.stores import RQLObjectStore
 from cubicweb_francearchives import admincnx, init_bfss
 from cubicweb_francearchives.dataimport import (
     capture_exception,
-    es_bulk_index,
     FakeQueue,
     init_sentry_client,
     load_services_map,
@@ -53,8 +52,21 @@ from cubicweb_francearchives.dataimport import (
     sqlutil,
 )
 from cubicweb_francearchives.dataimport.ead import Reader
+from cubicweb_francearchives.dataimport.esbulk import ESBulkSink
+from cubicweb_francearchives.dataimport.importstats import (
+    STATS,
+    file_stats,
+    log_summary,
+    stats_run_dir,
+)
 from cubicweb_francearchives.dataimport.oai_dc import import_oai_dc_filepath
+from cubicweb_francearchives.dataimport.pdf import (
+    PDFTOTEXT_TIMEOUT,
+    PdfTextPrefetcher,
+    pdf_text_cache,
+)
 from cubicweb_francearchives.dataimport.stores import create_massive_store
+from cubicweb_francearchives.geomap import update_geomap
 
 
 LOGGER = logging.getLogger()
@@ -87,29 +99,54 @@ def _findingaid_importer(cnx, filepath_queue, config):
         filepath = next_job
         if isinstance(filepath, bytes):
             filepath = filepath.decode("utf-8")
-        try:
-            service_infos = service_infos_from_filepath(filepath, services_map)
-            if OAIPMH_DC_PATH in filepath:
-                es_docs = import_oai_dc_filepath(store, filepath, service_infos, config)
-            else:
-                es_docs = r.import_filepath(filepath, service_infos)
-        except Exception as exc:
-            import traceback
-
-            traceback.print_exc()
-            print("failed to import", repr(filepath))
-            LOGGER.exception("failed to import %r", filepath)
-            capture_exception(exc, filepath)
-            continue
-        if not config["esonly"]:
-            store.flush()
-            store.commit()
-        if es_docs and not config["noes"]:
-            es_bulk_index(es, es_docs)
+        with file_stats(config, filepath):
+            try:
+                service_infos = service_infos_from_filepath(filepath, services_map)
+                if OAIPMH_DC_PATH in filepath:
+                    es_docs = import_oai_dc_filepath(store, filepath, service_infos, config)
+                else:
+                    es_docs = r.import_filepath(filepath, service_infos)
+            except Exception as exc:
+                import traceback
+
+                traceback.print_exc()
+                print("failed to import", repr(filepath))
+                LOGGER.exception("failed to import %r", filepath)
+                capture_exception(exc, filepath)
+                STATS.incr("failed_files")
+                continue
+            if not config["esonly"]:
+                with STATS.timer("store_commit"):
+                    store.flush()
+                    store.commit()
+            if es_docs and not config["noes"]:
+                STATS.incr("es_documents", len(es_docs))
+                with STATS.timer("es_bulk"):
+                    ESBulkSink(es, cnx, source=filepath).send(es_docs)
     if not config["esonly"]:
         cnx.commit()
 
 
+def start_pdf_prefetch(filepaths, config):
+    """extract the text of the pdf files to import in a pool of pdftotext
+    processes, while the workers do database work
+
+    Return None if no pdf text cache is configured: extracted texts are handed
+    to the workers through the cache, so that without it the texts are
+    extracted by the workers themselves.
+    """
+    cache = pdf_text_cache(config)
+    if cache is None:
+        return None
+    prefetcher = PdfTextPrefetcher(
+        cache,
+        nb_workers=config.get("pdftotext-processes", 2),
+        timeout=config.get("pdftotext-timeout", PDFTOTEXT_TIMEOUT),
+    )
+    prefetcher.prefetch(filepaths)
+    return prefetcher
+
+
 def _import_filepaths(cnx, filepaths, config):
     indexer = cnx.vreg["es"].select("indexer", cnx)
     indexer.create_index(index_name="{}_all".format(indexer._cw.vreg.config["index-name"]))
@@ -119,8 +156,11 @@ def _import_filepaths(cnx, filepaths, config):
         fake_queue = FakeQueue([None] + filepaths)
         _findingaid_importer(cnx, fake_queue, config)
     elif nb_processes == 1:
+        prefetcher = start_pdf_prefetch(filepaths, config)
         fake_queue = FakeQueue([None] + filepaths)
         findingaid_importer(config["appid"], fake_queue, config)
+        if prefetcher is not None:
+            prefetcher.shutdown()
     else:
         queue = mp.Queue(2 * nb_processes)
         workers = []
@@ -131,6 +171,8 @@ def _import_filepaths(cnx, filepaths, config):
             )
         for w in workers:
             w.start()
+        # start threads once the workers are forked
+        prefetcher = start_pdf_prefetch(filepaths, config)
         nb_files = len(filepaths)
         for idx, job in enumerate(chain(filepaths, (None,) * nb_processes)):
             if job is not None:
@@ -141,11 +183,16 @@ def _import_filepaths(cnx, filepaths, config):
             queue.put(job)
         for w in workers:
             w.join()
+        if prefetcher is not None:
+            prefetcher.shutdown()
 
 
 @log_in_db
 def import_filepaths(cnx, filepaths, config, store=None):
     foreign_key_tables = sqlutil.ead_foreign_key_tables(cnx.vreg.schema)
+    if config.get("stats_dir"):
+        # statistics of this import are written in their own directory
+        config = dict(config, stats_dir=stats_run_dir(config["stats_dir"]))
     if not config["esonly"]:
         store = store or create_massive_store(cnx, nodrop=config["nodrop"])
         store.master_init()
@@ -155,8 +202,12 @@ def import_filepaths(cnx, filepaths, config, store=None):
         cnx.commit()
     _import_filepaths(cnx, filepaths, config)
     if not config["esonly"]:
+        # the suggest statistics are refreshed by the store
         store.finish()
+        update_geomap(cnx, store.updated_authorities)
         store.commit()
     if config["nodrop"]:
         with sqlutil.sudocnx(cnx, interactive=False) as su_cnx:
             sqlutil.enable_triggers(su_cnx, foreign_key_tables)
+    if config.get("stats_dir"):
+        log_summary(config["stats_dir"], LOGGER)
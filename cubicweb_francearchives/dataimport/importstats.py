@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © LOGILAB S.A. (Paris, FRANCE) 2016-2023
+# Contact http://www.logilab.fr -- mailto:contact@logilab.fr
+#
+# This software is governed by the CeCILL-C license under French law and
+# abiding by the rules of distribution of free software. You can use,
+# modify and/ or redistribute the software under the terms of the CeCILL-C
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# "http://www.cecill.info".
+#
+# As a counterpart to the access to the source code and rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty and the software's author, the holder of the
+# economic rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated
+# with loading, using, modifying and/or developing or reproducing the
+# software by the user in light of its specific status of free software,
+# that may mean that it is complicated to manipulate, and that also
+# therefore means that it is reserved for developers and experienced
+# professionals having in-depth computer knowledge. Users are therefore
+# encouraged to load and test the software's suitability as regards their
+# requirements in conditions enabling the security of their systemsand/or
+# data to be ensured and, more generally, to use and operate it in the
+# same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+#
+"""timers and counters of the import stages
+
+Stages are timed with `STATS.timer` (or the `STATS.timed` decorator), which
+do nothing unless statistics are enabled for the current file by
+`file_stats`. Timings are inclusive: nested stages are also counted in
+their parents. Statistics are dumped as JSON lines, one line per imported
+file, in one file per worker process and summarized by `log_summary`.
+"""
+
+# standard library imports
+import cProfile
+import json
+import logging
+import os
+import os.path as osp
+import re
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from glob import glob
+
+LOGGER = logging.getLogger("francearchives.dataimport.stats")
+
+
+class ImportStats(object):
+    """per-process statistics of the file being imported"""
+
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+
+    @contextmanager
+    def timer(self, stage):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[stage] += time.perf_counter() - start
+            self.calls[stage] += 1
+
+    def timed(self, stage):
+        """decorator timing each call of the decorated function as `stage`"""
+
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.timer(stage):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def timed_iter(self, stage, iterable):
+        """yield items of `iterable`, only the time spent to produce them is
+        counted in `stage`"""
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        while True:
+            with self.timer(stage):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def incr(self, counter, value=1):
+        if self.enabled:
+            self.counters[counter] += value
+
+    def snapshot(self):
+        return {
+            "stages": {
+                stage: {"seconds": round(seconds, 6), "calls": self.calls[stage]}
+                for stage, seconds in self.seconds.items()
+            },
+            "counters": dict(self.counters),
+        }
+
+
+STATS = ImportStats()
+
+
+def stats_run_dir(stats_dir):
+    """return a new directory of `stats_dir` for the statistics of an import"""
+    run_dir = osp.join(stats_dir, datetime.now().strftime("%Y%m%d-%H%M%S-{}".format(os.getpid())))
+    os.makedirs(run_dir, exist_ok=True)
+    return run_dir
+
+
+@contextmanager
+def file_stats(config, filepath):
+    """collect the statistics of the import of `filepath` if `stats_dir` is
+    set in `config` and append them to the JSON lines file of the worker.
+
+    If `profile` is set in `config`, the import of the file is also profiled
+    with cProfile, in a `.prof` file per imported file.
+    """
+    stats_dir = config.get("stats_dir")
+    if not stats_dir:
+        yield
+        return
+    STATS.reset()
+    STATS.enabled = True
+    profile = cProfile.Profile() if config.get("profile") else None
+    start = time.perf_counter()
+    if profile is not None:
+        profile.enable()
+    try:
+        yield
+    finally:
+        if profile is not None:
+            profile.disable()
+            profile.dump_stats(
+                osp.join(stats_dir, "{}.prof".format(re.sub(r"\W", "_", osp.basename(filepath))))
+            )
+        STATS.enabled = False
+        record = STATS.snapshot()
+        record.update(
+            {
+                "file": filepath,
+                "worker": os.getpid(),
+                "seconds": round(time.perf_counter() - start, 6),
+            }
+        )
+        with open(osp.join(stats_dir, "worker-{}.jsonl".format(os.getpid())), "a") as stream:
+            stream.write(json.dumps(record) + "\n")
+
+
+def iter_records(stats_dir):
+    for filepath in sorted(glob(osp.join(stats_dir, "worker-*.jsonl"))):
+        with open(filepath) as stream:
+            for line in stream:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def summarize(records, slowest=10):
+    """aggregate the per-file `records` per stage and per worker"""
+    stages = defaultdict(lambda: {"seconds": 0.0, "calls": 0})
+    counters = defaultdict(int)
+    workers = defaultdict(lambda: {"files": 0, "seconds": 0.0})
+    files = []
+    for record in records:
+        for stage, stats in record["stages"].items():
+            stages[stage]["seconds"] += stats["seconds"]
+            stages[stage]["calls"] += stats["calls"]
+        for counter, value in record["counters"].items():
+            counters[counter] += value
+        worker = workers[record["worker"]]
+        worker["files"] += 1
+        worker["seconds"] += record["seconds"]
+        files.append((record["seconds"], record["file"]))
+    files.sort(reverse=True)
+    return {
+        "files": len(files),
+        "stages": dict(stages),
+        "counters": dict(counters),
+        "workers": dict(workers),
+        "slowest": [
+            {"file": filepath, "seconds": seconds} for seconds, filepath in files[:slowest]
+        ],
+    }
+
+
+def log_summary(stats_dir, logger=LOGGER):
+    """summarize statistics dumped in `stats_dir`, log them and write them
+    in `summary.json`"""
+    summary = summarize(iter_records(stats_dir))
+    with open(osp.join(stats_dir, "summary.json"), "w") as stream:
+        json.dump(summary, stream, indent=2)
+    logger.info("[import stats] %s file(s) imported, details in %s", summary["files"], stats_dir)
+    for stage, stats in sorted(summary["stages"].items(), key=lambda item: -item[1]["seconds"]):
+        logger.info("[import stats] %s: %.2fs (%s calls)", stage, stats["seconds"], stats["calls"])
+    for counter, value in sorted(summary["counters"].items()):
+        logger.info("[import stats] %s: %s", counter, value)
+    for worker, stats in sorted(summary["workers"].items()):
+        logger.info(
+            "[import stats] worker %s: %s file(s) in %.2fs",
+            worker,
+            stats["files"],
+            stats["seconds"],
+        )
+    return summary
@@ -41,8 +41,8 @@ from cubicweb_francearchives.dataimport import (
     log_in_db,
     load_services_map,
     service_infos_from_service_code,
-    es_bulk_index,
 )
+from cubicweb_francearchives.dataimport.esbulk import ESBulkSink
 from cubicweb_francearchives.dataimport.sqlutil import (
     no_trigger,
     ead_foreign_key_tables,
@@ -61,7 +61,6 @@ from cubicweb_francearchives.dataimport.scripts.generate_ape_ead import (
 def check_missing_service_infos(cnx, service_infos, base_url):
     missing = {"level", "code", "eid", "title"}.difference(service_infos.keys())
     if missing:
-        services_map = load_services_map(cnx)
         if "code" not in service_infos:
             return service_infos
         services_map = load_services_map(cnx)
@@ -220,7 +219,7 @@ def import_oai(
     if es_docs:
         log.info("%s IRs have been imported into Postgres.", len(es_docs))
         log.info("Start Es indexing.")
-        es_bulk_index(importer.es, es_docs)
+        ESBulkSink(importer.es, cnx, source="harvest-oai").send(es_docs)
         log.info("End Es indexing.")
     else:
         log.info("No valid harvested IR found. No IR has been imported.")
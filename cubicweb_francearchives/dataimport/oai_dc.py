@@ -61,7 +61,11 @@ from cubicweb_francearchives.dataimport import (
 
 from cubicweb_francearchives.dataimport.dc import CSVReader
 
-from cubicweb_francearchives.dataimport.ead import readerconfig, service_infos_for_es_doc
+from cubicweb_francearchives.dataimport.ead import (
+    illustration_infos_for_es_doc,
+    readerconfig,
+    service_infos_for_es_doc,
+)
 from cubicweb_francearchives.storage import S3BfssStorageMixIn
 from cubicweb_francearchives.dataimport.sqlutil import delete_from_filename
 
@@ -582,6 +586,9 @@ class OAIDCReader(CSVReader):
             publisher=findingaid_data["publisher"],
             index_entries=indexes,
             digitized=bool(daodefs),
+            **illustration_infos_for_es_doc(
+                daodefs, findingaid_data.get("eadid") or "", service_infos
+            ),
             **service_infos_for_es_doc(self.store._cnx, service_infos),
         )
         self.create_entity("EsDocument", {"doc": json_dumps(es_doc["_source"]), "entity": comp_eid})
@@ -29,31 +29,203 @@
 # knowledge of the CeCILL-C license and that you accept its terms.
 #
 
-
-import subprocess as S
-import os.path as osp
 import logging
+import os
+import os.path as osp
+import subprocess as S
+import tempfile
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
 
 from cubicweb_francearchives.dataimport import default_service_name
 from cubicweb_francearchives.storage import S3BfssStorageMixIn
 
+LOGGER = logging.getLogger("francearchives.pdf")
 
-def pdf_infos(filepath):
-    with S3BfssStorageMixIn().storage_handle_tmpfile_from_file(filepath) as fpath:
-        pipe = S.Popen(["/usr/bin/pdftotext", fpath, "-"], stdout=S.PIPE)
-        basepath = osp.basename(filepath)
+# default number of seconds after which a pdftotext process is killed
+PDFTOTEXT_TIMEOUT = 120
+
+
+def pdftotext(fpath, timeout=PDFTOTEXT_TIMEOUT):
+    """return the text of the local pdf file `fpath` (None if extraction failed)"""
+    try:
+        proc = S.run(
+            ["/usr/bin/pdftotext", fpath, "-"], stdout=S.PIPE, timeout=timeout or None, check=False
+        )
+    except S.TimeoutExpired:
+        LOGGER.error("pdftotext timed out after %ss on %s", timeout, fpath)
+        return None
+    except Exception:
+        LOGGER.exception("failed to extract text from %s", fpath)
+        return None
+    if proc.returncode:
+        # the output may be truncated
+        LOGGER.error("pdftotext failed with status %s on %s", proc.returncode, fpath)
+        return None
+    try:
+        return proc.stdout.decode("utf-8")
+    except UnicodeDecodeError:
+        LOGGER.exception("failed to decode text extracted from %s", fpath)
+        return None
+
+
+class PdfTextCache(object):
+    """on disk cache of extracted pdf texts, keyed by the sha1 of the pdf content
+
+    Least recently used texts are removed when the cache grows over `max_size`
+    bytes (0 means no limit).
+    """
+
+    def __init__(self, directory, max_size=0):
+        self.directory = directory
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._size = None
+
+    def path(self, sha1):
+        return osp.join(self.directory, sha1[:2], "{}.txt".format(sha1))
+
+    def get(self, sha1):
+        path = self.path(sha1)
         try:
-            text = pipe.stdout.read().decode("utf-8")
-        except Exception:
-            logging.exception("failed to extract text from %s", filepath)
-            text = ""
+            with open(path, "rb") as f:
+                text = f.read().decode("utf-8")
+        except (IOError, OSError):
+            return None
+        try:
+            # mark the entry as recently used
+            os.utime(path, None)
+        except OSError:
+            pass
+        return text
+
+    def set(self, sha1, text):
+        path = self.path(sha1)
+        content = text.encode("utf-8")
+        try:
+            os.makedirs(osp.dirname(path), exist_ok=True)
+            fd, tmppath = tempfile.mkstemp(dir=osp.dirname(path), suffix=".part")
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            # atomic, concurrent importers never read a partial text
+            os.replace(tmppath, path)
+        except (IOError, OSError):
+            LOGGER.exception("failed to write pdf text cache entry %s", path)
+            return
+        if self.max_size:
+            with self._lock:
+                if self._size is None:
+                    self._size = self.disk_size()
+                else:
+                    self._size += len(content)
+                if self._size > self.max_size:
+                    self._size = self.prune()
+
+    def entries(self):
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if filename.endswith(".txt"):
+                    path = osp.join(dirpath, filename)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, path
+
+    def disk_size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def prune(self):
+        """remove least recently used entries until the cache holds in 90% of
+        `max_size`, return the new cache size"""
+        entries = sorted(self.entries())
+        size = sum(entry[1] for entry in entries)
+        target = self.max_size * 0.9
+        for _, entry_size, path in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= entry_size
+        return size
+
+
+def pdf_text_cache(config):
+    """return the PdfTextCache configured in the import `config` or None"""
+    directory = config.get("pdf-text-cache-dir")
+    if not directory:
+        return None
+    return PdfTextCache(directory, (config.get("pdf-text-cache-size") or 0) * 1024 * 1024)
+
+
+def pdf_text(filepath, sha1=None, cache=None, timeout=PDFTOTEXT_TIMEOUT):
+    """return the text of the pdf `filepath` ("" if extraction failed),
+    extracted text is read from and written to `cache` when the `sha1` of the
+    file is known"""
+    if cache is not None and sha1:
+        text = cache.get(sha1)
+        if text is not None:
+            return text
+    with S3BfssStorageMixIn().storage_handle_tmpfile_from_file(filepath) as fpath:
+        text = pdftotext(fpath, timeout)
+    if text is None:
+        # do not cache failures, the extraction will be tried again
+        return ""
+    if cache is not None and sha1:
+        cache.set(sha1, text)
+    return text
+
+
+def pdf_infos(filepath, sha1=None, cache=None, timeout=PDFTOTEXT_TIMEOUT):
+    basepath = osp.basename(filepath)
     return {
         "publisher": default_service_name(basepath),
         "title": basepath,
-        "text": text,
+        "text": pdf_text(filepath, sha1=sha1, cache=cache, timeout=timeout),
     }
 
 
+class PdfTextPrefetcher(object):
+    """fill a PdfTextCache from a bounded pool of pdftotext processes
+
+    The import master starts it on the pdf files to import so that their text
+    is extracted while the import workers do database work. Workers read the
+    cache and only extract the texts which are not there yet.
+    """
+
+    def __init__(self, cache, nb_workers=2, timeout=PDFTOTEXT_TIMEOUT):
+        self.cache = cache
+        self.timeout = timeout
+        self.storage = S3BfssStorageMixIn(log=LOGGER)
+        self.executor = ThreadPoolExecutor(max_workers=max(nb_workers, 1))
+        self.futures = []
+
+    def prefetch(self, filepaths):
+        for filepath in filepaths:
+            if osp.splitext(filepath)[1].lower() == ".pdf":
+                self.futures.append(self.executor.submit(self._extract, filepath))
+
+    def _extract(self, filepath):
+        try:
+            sha1 = self.storage.get_file_sha1(filepath)
+        except Exception:
+            LOGGER.warning("ignoring unreadable pdf %r", filepath)
+            return
+        # the text may have been cached by an import worker in the meantime
+        if sha1 is not None and self.cache.get(sha1) is None:
+            pdf_text(filepath, sha1=sha1, cache=self.cache, timeout=self.timeout)
+
+    def shutdown(self):
+        """stop extracting pending files (extractions in progress are kept)"""
+        for future in self.futures:
+            future.cancel()
+        self.executor.shutdown(wait=True)
+        self.futures = []
+
+
 if __name__ == "__main__":
     import sys
 
@@ -36,7 +36,9 @@ import os.path as osp
 from cubicweb.server.serverctl import system_source_cnx
 
 from cubicweb_francearchives import S3_ACTIVE, POSTGRESQL_SUPERUSER
-from cubicweb_francearchives.dataimport import es_bulk_index
+from cubicweb_francearchives.dataimport.esbulk import ESBulkSink
+from cubicweb_francearchives import suggest
+from cubicweb_francearchives.geomap import update_geomap
 
 LOGGER = logging.getLogger()
 
@@ -295,18 +297,17 @@ def delete_from_es(cnx, stable_ids):
     )
     for indexer in indexers:
         es = indexer.get_connection()
-        es_docs = []
-        for doc_type, ids in list(stable_ids.items()):
-            for id in ids:
-                es_docs.append(
-                    {
-                        "_op_type": "delete",
-                        "_index": indexer.index_name,
-                        "_type": "_doc",
-                        "_id": id,
-                    }
-                )
-        es_bulk_index(es, es_docs, raise_on_error=False)
+        es_docs = (
+            {
+                "_op_type": "delete",
+                "_index": indexer.index_name,
+                "_type": "_doc",
+                "_id": id,
+            }
+            for ids in stable_ids.values()
+            for id in ids
+        )
+        ESBulkSink(es, cnx, source="delete-from-es").send(es_docs)
 
 
 def delete_from_filename(cnx, filename, **kwargs):
@@ -385,6 +386,14 @@ def delete_finding_aid(cnx, eid_map, stable_ids, esonly=True, interactive=True,
                     build_descr=False,
                 )
             )
+    # authorities whose suggest statistics must be recomputed once index
+    # entities are deleted
+    authorities = set()
+    if suggest.suggest_stats_enabled(cnx):
+        index_eids = set()
+        for etypetable in ("cw_geogname", "cw_agentname", "cw_subject"):
+            index_eids.update(eid_map.get(etypetable, ()))
+        authorities = suggest.authorities_of_indexes(cnx, index_eids)
     with no_trigger(cnx, interactive=interactive):
         deffer_foreign_key_constraints(cnx)
         cursor = cnx.cnxset.cu
@@ -427,6 +436,10 @@ def delete_finding_aid(cnx, eid_map, stable_ids, esonly=True, interactive=True,
                     )
             cursor.execute("SELECT delete_entities('%s', '%s')" % (etypetable, "tmp_eid_to_remove"))
         cnx.commit()
+        if authorities:
+            suggest.refresh_suggest_stats(cnx, authorities)
+            update_geomap(cnx, authorities)
+            cnx.commit()
         # remove S3 published or unpublished files
         if files_to_remove:
             if S3_ACTIVE:
@@ -449,17 +462,16 @@ def delete_nomina_records_from_es(cnx, stable_ids):
     # there is only one index for NominaRecords in edition and consultation
     indexer = cnx.vreg["es"].select("nomina-indexer", cnx)
     es = indexer.get_connection()
-    es_docs = []
-    for stable_id in list(stable_ids):
-        es_docs.append(
-            {
-                "_op_type": "delete",
-                "_index": indexer.index_name,
-                "_type": "_doc",
-                "_id": stable_id,
-            }
-        )
-    es_bulk_index(es, es_docs, raise_on_error=False)
+    es_docs = (
+        {
+            "_op_type": "delete",
+            "_index": indexer.index_name,
+            "_type": "_doc",
+            "_id": stable_id,
+        }
+        for stable_id in stable_ids
+    )
+    ESBulkSink(es, cnx, source="delete-nomina-records").send(es_docs)
 
 
 def delete_nomina_records(cnx, stable_ids, esonly=False, interactive=True):
@@ -28,11 +28,19 @@
 # The fact that you are presently reading this means that you have had
 # knowledge of the CeCILL-C license and that you accept its terms.
 #
+import io
 from collections import defaultdict
 
 from cubicweb.dataimport.stores import MetadataGenerator
 from cubicweb.dataimport.massive_store import MassiveObjectStore, PGHelper, eschema_sql_def
 
+from cubicweb_francearchives.suggest import (
+    authorities_of_indexes,
+    last_eid,
+    refresh_suggest_stats,
+    suggest_stats_enabled,
+)
+from cubicweb_francearchives.dataimport.importstats import STATS
 from cubicweb_francearchives.dataimport.sqlutil import deffer_foreign_key_constraints
 
 
@@ -76,7 +84,76 @@ class NoDropPGHelper(PGHelper):
         pass
 
 
+class CopyBuffer(io.TextIOBase):
+    """read-only file-like object built from an iterator of lines, used to
+    COPY rows without building the whole buffer in memory"""
+
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self._buf = ""
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        chunks, length = [self._buf], len(self._buf)
+        while size < 0 or length < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            chunks.append(line)
+            length += len(line)
+        data = "".join(chunks)
+        if size < 0:
+            self._buf = ""
+            return data
+        self._buf = data[size:]
+        return data[:size]
+
+
+def estimate_row_size(data):
+    """rough estimation of the memory used by an entity row"""
+    size = 0
+    for value in data.values():
+        if isinstance(value, (str, bytes)):
+            size += len(value)
+        elif isinstance(value, io.BytesIO):
+            # Binary
+            size += value.getbuffer().nbytes
+        else:
+            size += 16
+    return size
+
+
+# estimation of the memory used by a buffered relation (tuple + set entry)
+RELATION_ROW_SIZE = 160
+
+
 class DeferredMassiveObjectStore(MassiveObjectStore):
+    """MassiveObjectStore which automatically flushes its buffers to the
+    temporary tables once `autoflush_rows` rows or about `autoflush_bytes`
+    bytes are buffered (``None`` disables the corresponding limit).
+
+    Relations are buffered as (eid_from, eid_to) tuples and deduplicated
+    until the next explicit call to `flush`.
+
+    As the index entities and relations it inserts bypass the hooks, the
+    master store refreshes the suggest statistics of their authorities in
+    `finish`, and records them in `updated_authorities`.
+    """
+
+    def __init__(self, cnx, autoflush_rows=100000, autoflush_bytes=64 * 1024 * 1024, **kwargs):
+        super().__init__(cnx, **kwargs)
+        self.autoflush_rows = autoflush_rows
+        self.autoflush_bytes = autoflush_bytes
+        self._buffered_rows = 0
+        self._buffered_bytes = 0
+        self._seen_relations = defaultdict(set)
+        self.updated_authorities = set()
+        self._suggest_last_eid = None
+        if not self.slave_mode and suggest_stats_enabled(cnx):
+            self._suggest_last_eid = last_eid(cnx)
+
     def master_init(self, commit=True):
         super().master_init(commit=commit)
         if not self._dbh.table_exists("cwmassive_initialized"):
@@ -107,7 +184,12 @@ class DeferredMassiveObjectStore(MassiveObjectStore):
             # start FA
             self.sql("ALTER TABLE %s ADD PRIMARY KEY (eid_from, eid_to);" % tmp_tablename)
             # stop FA
-        self._data_relations[rtype].append({"eid_from": eid_from, "eid_to": eid_to})
+        seen = self._seen_relations[rtype]
+        if (eid_from, eid_to) in seen:
+            return
+        seen.add((eid_from, eid_to))
+        self._data_relations[rtype].append((eid_from, eid_to))
+        self._buffered(RELATION_ROW_SIZE)
 
     def prepare_insert_entity(self, etype, **data):
         """Given an entity type, attributes and inlined relations, returns the inserted entity's
@@ -140,25 +222,77 @@ class DeferredMassiveObjectStore(MassiveObjectStore):
             eid = self.get_next_eid()
             data["eid"] = eid
         self._data_entities[etype].append(data)
+        self._buffered(estimate_row_size(data))
         return data["eid"]
 
+    def _buffered(self, size):
+        self._buffered_rows += 1
+        self._buffered_bytes += size
+        if (self.autoflush_rows is not None and self._buffered_rows >= self.autoflush_rows) or (
+            self.autoflush_bytes is not None and self._buffered_bytes >= self.autoflush_bytes
+        ):
+            self.logger.debug(
+                "auto flush %s rows (~%s bytes)", self._buffered_rows, self._buffered_bytes
+            )
+            self._flush_buffers()
+
+    def _flush_buffers(self):
+        with STATS.timer("store_flush"):
+            super().flush()
+        self._buffered_rows = 0
+        self._buffered_bytes = 0
+
+    def flush(self):
+        """Flush the data"""
+        self._flush_buffers()
+        self._seen_relations.clear()
+
     def finish(self):
         """differ all differable constraints (foreign keys) to allow delete/insert/update
         in any order in the massive import with no superuser"""
         deffer_foreign_key_constraints(self._cnx)
+        index_eids = None
+        if self._suggest_last_eid is not None:
+            self.flush()
+            index_eids = self.imported_index_eids()
         super().finish()
+        if index_eids is not None:
+            # existing index entities may be related to imported documents
+            self.updated_authorities = authorities_of_indexes(
+                self._cnx, index_eids=index_eids
+            ) | authorities_of_indexes(self._cnx, min_eid=self._suggest_last_eid)
+            refresh_suggest_stats(self._cnx, self.updated_authorities)
+            # `MassiveObjectStore.finish` has already committed
+            self._cnx.commit()
+
+    def imported_index_eids(self):
+        """Return the eids of index entities of the `index` relations inserted
+        by this store and its slaves (read from the temporary tables, hence
+        before `finish`)"""
+        if not self._dbh.table_exists("cwmassive_initialized"):
+            return set()
+        cu = self.sql(
+            "SELECT uuid FROM cwmassive_initialized WHERE retype='index' AND type='rtype'"
+        )
+        index_eids = set()
+        for (uuid,) in cu.fetchall():
+            cu = self.sql("SELECT DISTINCT eid_from FROM index_relation_%s" % uuid)
+            index_eids.update(eid for eid, in cu.fetchall())
+        return index_eids
 
     def flush_relations(self):
         """Flush the relations data from in-memory structures to a temporary table."""
+        cursor = self._cnx.cnxset.cu
         for rtype, data in self._data_relations.items():
             if not data:
                 # There is no data for these etype for this flush round.
                 continue
-            # remove duplicated values
-            self._data_relations[rtype] = [
-                dict(x) for x in set(tuple(y.items()) for y in self._data_relations[rtype])
-            ]
-        super().flush_relations()
+            tmp_tablename = "%s_relation_%s" % (rtype.lower(), self.uuid)
+            # relations are already deduplicated by `prepare_insert_relation`
+            buf = CopyBuffer("%d\t%d\n" % row for row in data)
+            cursor.copy_from(buf, tmp_tablename, null="NULL", columns=("eid_from", "eid_to"))
+            # Clear data cache
+            self._data_relations[rtype] = []
 
 
 def create_massive_store(cnx, nodrop=False, **kwargs):
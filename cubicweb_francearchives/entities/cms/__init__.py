@@ -58,7 +58,7 @@ from cubicweb_francearchives.entities.es import (
 from cubicweb_francearchives.entities.ead import IndexableMixin
 from cubicweb_francearchives.dataimport.pdf import pdf_infos
 from cubicweb_francearchives.dataimport.eadreader import unique_indices
-from cubicweb_francearchives.utils import safe_cut, remove_html_tags
+from cubicweb_francearchives.utils import safe_cut, remove_html_tags, ServiceLabelsMixin
 
 from cubicweb_francearchives.xmlutils import process_html_as_xml, add_title_on_external_links
 
@@ -381,7 +381,7 @@ class Circular(AnyEntity):
         return json.loads(self.json_values)
 
 
-class Service(ImageMixIn, HTMLMixIn, AnyEntity):
+class Service(ServiceLabelsMixin, ImageMixIn, HTMLMixIn, AnyEntity):
     fetch_attrs, cw_fetch_order = fetch_config(
         [
             "category",
@@ -427,13 +427,6 @@ class Service(ImageMixIn, HTMLMixIn, AnyEntity):
         # XXX url to be validated
         return self._cw.build_url("basedenoms/{}".format(code))
 
-    def dc_title(self):
-        if self.level == "level-D":
-            return self.name2 or self.name
-        else:
-            terms = [self.name, self.name2]
-            return " - ".join(t for t in terms if t)
-
     def bounce_url(self, attrs):
         if self.search_form_url:
             terms = re.search(r"\{(\w+)\}", self.search_form_url)
@@ -458,12 +451,6 @@ class Service(ImageMixIn, HTMLMixIn, AnyEntity):
         terms = [self.address, self.zip_code, self.city]
         return ", ".join(str(t) for t in terms if t)
 
-    def publisher(self):
-        publisher = self.short_name or self.name2 or self.name
-        if not publisher and self.code:
-            return self.code.upper()
-        return publisher
-
 
 # XXX duplicated from cubes.frarchives_edition.views.primary
 def get_ancestors(entity, result=None):
@@ -30,13 +30,10 @@
 #
 
 """cubicweb-pnia-ead entity's classes"""
-import os.path as osp
 import json
 from collections import defaultdict
 import requests
 
-from urllib.parse import urlparse
-
 from logilab.common.decorators import cachedproperty
 
 from cubicweb.predicates import is_instance
@@ -48,7 +45,13 @@ from cubicweb_elasticsearch.entities import IFullTextIndexSerializable
 from cubicweb_francearchives import FEATURE_IIIF, get_user_agent
 from cubicweb_francearchives.utils import is_absolute_url
 from cubicweb_francearchives.entities import systemsource_entity
-from cubicweb_francearchives.dataimport.ead import dates_for_es_doc, service_infos_for_es_doc
+from cubicweb_francearchives.dataimport.ead import (
+    dates_for_es_doc,
+    resolve_digitized_urls,
+    resolve_illustration_url,
+    service_infos_for_es_doc,
+    unprocessed_illustration_url,
+)
 
 
 class FAComponentIFTIAdapter(IFullTextIndexSerializable):
@@ -227,42 +230,21 @@ class FindingAidBaseMixin(object):
             attrs = {"unittitle": did.unittitle, "unitid": did.unitid, "eadid": eadid}
             return self.related_service.bounce_url(attrs)
 
+    @cachedproperty
+    def daos(self):
+        """dao definitions of related DigitizedVersions"""
+        return [
+            {"url": dv.url, "illustration_url": dv.illustration_url, "role": dv.role}
+            for dv in self.digitized_versions
+        ]
+
     @cachedproperty
     def digitized_urls(self):
         """List of URLs of related dao tags whose role is neither 'image' or 'thumbnail'."""
-        urls = []
-        for dv in self.digitized_versions:
-            if dv.url:
-                has_scheme = urlparse(dv.url).scheme
-                if has_scheme:
-                    urls.append(dv.url)
-                else:
-                    fa = self.finding_aid[0]
-                    if fa.eadid.startswith("FRAD015"):
-                        path = dv.url.replace("\\", "/")
-                        urls.append(
-                            "http://archives.cantal.fr/accounts/mnesys_ad15/datas/medias/{}".format(
-                                path
-                            )
-                        )
-        # try to sort urls especially for the case of viewer links such as
-        # http://www.archinoe.fr/ark:/77293/c2mzpfn3jmb4ootg/1,
-        # http://www.archinoe.fr/ark:/77293/c2mzpfn3jmb4ootg/N
-        return sorted(urls)
+        return resolve_digitized_urls(self.daos, self.finding_aid[0].eadid)
 
     def unprocessed_illustration_url(self):
-        dvs = self.digitized_versions
-        if not dvs:
-            return None
-        # take first url with role 'thumbnail' or 'image'. Otherwise, take
-        # any non null illustration url
-        url = None
-        for dv in dvs:
-            if dv.illustration_url:
-                url = dv.illustration_url
-                if dv.role in {"thumbnail", "image"}:
-                    break
-        return url
+        return unprocessed_illustration_url(self.daos)
 
     @property
     def thumbnail_dest(self):
@@ -290,54 +272,14 @@ class FindingAidBaseMixin(object):
         is any, or illustration_url is not set.
         If thumbnail_url is defined on the service, the URL will be formatted
         accordingly.
+
+        The same URL is precomputed in es documents at import time (see
+        `illustration_infos_for_es_doc`).
         """
-        url = self.unprocessed_illustration_url()
-        if url and is_absolute_url(url):
-            return url
-        service_code = self.related_service.code if self.related_service else None
-        if not url and service_code == "FRBNF":
-            # special case for BnF
-            urls = [d.url for d in self.digitized_versions if d.url]
-            url = urls[0] if urls else None
-        if not url:
-            return None
-        # not service and not url is a relative URL (root or path unknown)
-        if not urlparse(url).netloc and not self.related_service:
-            return None
-        if url.startswith("/"):
-            url = url[1:]
-        if service_code == "FRAD001":
-            return (
-                "http://hatch3.vtech.fr/cgi-bin/iipsrv.fcgi?"
-                "FIF=/home/httpd/ad01/data/files/images"
-                "/{eadid}/{url}&HEI=375&QLT=80&CVT=JPG&SIZE=1045163".format(
-                    eadid=self.finding_aid[0].eadid.upper(), url=url
-                )
-            )
-        elif service_code == "FRAD015":
-            basepath, ext = osp.splitext(url)
-            return (
-                "http://archives.cantal.fr/accounts/mnesys_ad15/datas/medias/{}_{}_/0_0{}".format(
-                    basepath.replace("\\", "/"), ext[1:], ext
-                )
-            )
-        elif service_code == "QUAIBR75":
-            basepath, ext = osp.splitext(url)
-            return (
-                "http://archives.quaibranly.fr:8990/accounts/"
-                "mnesys_quaibranly/datas/{}_{}_/0_0{}".format(
-                    basepath.replace("\\", "/"), ext[1:], ext
-                )
-            )
-        else:
-            if service_code == "FRAD085" and not url.isdigit():
-                url = url.replace("\\", "/")
-            if self.related_service and self.related_service.thumbnail_url:
-                url = self.related_service.thumbnail_url.format(url=url)
-        # relative URL (root or path unknown)
-        if not url.startswith("http"):
-            return None
-        return url
+        service = self.related_service
+        if service:
+            service = {"code": service.code, "thumbnail_url": service.thumbnail_url}
+        return resolve_illustration_url(self.daos, self.finding_aid[0].eadid, service)
 
     @cachedproperty
     def iiif_manifest(self):
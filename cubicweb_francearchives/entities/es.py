@@ -153,6 +153,9 @@ class PniaIndexer(Indexer):
                 "dates": {"type": "integer_range"},
                 "startyear": {"type": "date", "format": "yyyy"},
                 "stopyear": {"type": "date", "format": "yyyy"},
+                # precomputed at import time, only used for display
+                "illustration_url": {"type": "keyword", "index": False},
+                "digitized_urls": {"type": "keyword", "index": False},
                 "service": {
                     "properties": {
                         "eid": {"type": "integer"},
@@ -470,6 +473,11 @@ class PniaNominaIndexer(Indexer):
             "acte_type": {"type": "keyword", "copy_to": "alltext"},
             "dates": {"type": "integer_range"},
             "authority": {"type": "keyword"},
+            # not searchable, only displayed in search results
+            "persons": {"type": "keyword", "index": False},
+            "doctype": {"type": "keyword", "index": False},
+            "acte_year": {"type": "keyword", "index": False},
+            "source_url": {"type": "keyword", "index": False},
         }
     }
 
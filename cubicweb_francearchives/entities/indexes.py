@@ -37,19 +37,13 @@ from logilab.common.decorators import cachedproperty
 from cubicweb import _
 from cubicweb.predicates import is_instance
 from cubicweb.entities import AnyEntity, fetch_config
-from cubicweb_francearchives.dataimport import es_bulk_index
+from cubicweb_francearchives.dataimport.esbulk import ESBulkSink
 from cubicweb_francearchives.views import format_agent_date, STRING_SEP, internurl_link
 from cubicweb_francearchives.entities.adapters import EntityMainPropsAdapter
-from cubicweb_francearchives.utils import es_start_letter
+from cubicweb_francearchives.utils import es_start_letter, iter_rql_entities
 from cubicweb_francearchives.views import format_date
 
 
-def iter_entities(cnx, eid, rql, nb_entities, chunksize=100000):
-    for offset in range(0, nb_entities, chunksize):
-        for index_eid in cnx.execute(rql.format(offset=offset, limit=chunksize, eid=eid)):
-            yield cnx.entity_from_eid(index_eid[0])
-
-
 class ExternalUri(AnyEntity):
     __regid__ = "ExternalUri"
     fetch_attrs, cw_fetch_order = fetch_config(["label", "uri", "source", "extid"])
@@ -88,17 +82,14 @@ class AbstractIndex(AnyEntity):
         self.cw_set(authority=auth)
         return auth
 
-    def iter_docs(self):
-        nb_entities = self._cw.execute(
-            """
-        Any COUNT(FA) WHERE E index FA, E eid %(e)s
-        """,
+    def iter_docs(self, chunksize=100000):
+        return iter_rql_entities(
+            self._cw,
+            "Any FA WHERE E index FA, E eid %(e)s",
             {"e": self.eid},
-        )[0][0]
-        rql = """Any FA LIMIT {limit} OFFSET {offset}
-                  WHERE E index FA, E eid {eid}"""
-        for entity in iter_entities(self._cw, self.eid, rql, nb_entities):
-            yield entity
+            chunksize=chunksize,
+            var="FA",
+        )
 
     def update_es_docs(self, oldauth, newauth):
         # update esdocument related to FAComponent,FindingAid linked to current index
@@ -143,25 +134,29 @@ WHERE
     def index_related_irdocs(self):
         """reindex all related FindingAid and FAComponents in ES"""
         indexer = self._cw.vreg["es"].select("indexer", self._cw)
-        index_name = indexer.index_name
         es = indexer.get_connection()
+        ESBulkSink(es, self._cw, source="index-related-irdocs").send(
+            self.related_irdocs_es_actions(indexer)
+        )
+        # commit here as the update (sql) may be carried on a very big
+        # number of documents, mainly FAComponents and FindingAids
+        self._cw.commit()
+
+    def related_irdocs_es_actions(self, indexer):
+        index_name = indexer.index_name
         published_indexer = self._cw.vreg["es"].select("indexer", self._cw, published=True)
-        docs = []
-        published_docs = []
         for fa in self.iter_docs():
             serializable = fa.cw_adapt_to("IFullTextIndexSerializable")
             json = serializable.serialize()
             if not json:
                 continue
-            docs.append(
-                {
-                    "_op_type": "index",
-                    "_index": index_name,
-                    "_type": "_doc",
-                    "_id": serializable.es_id,
-                    "_source": json,
-                }
-            )
+            yield {
+                "_op_type": "index",
+                "_index": index_name,
+                "_type": "_doc",
+                "_id": serializable.es_id,
+                "_source": json,
+            }
             if published_indexer:
                 is_published = True
                 if fa.cw_etype in ("FindingAid", "FAComponent"):
@@ -171,28 +166,14 @@ WHERE
                         wf = fa.finding_aid[0].cw_adapt_to("IWorkflowable")
                     is_published = wf and wf.state == "wfs_cmsobject_published"
                 if is_published:
-                    published_docs.append(
-                        {
-                            "_op_type": "index",
-                            "_index": published_indexer.index_name,
-                            "_type": "_doc",
-                            "_id": serializable.es_id,
-                            "_source": json,
-                        }
-                    )
+                    yield {
+                        "_op_type": "index",
+                        "_index": published_indexer.index_name,
+                        "_type": "_doc",
+                        "_id": serializable.es_id,
+                        "_source": json,
+                    }
             fa.cw_clear_all_caches()
-            if len(docs) > 30:
-                es_bulk_index(es, docs)
-                if published_docs:
-                    es_bulk_index(es, published_docs)
-                docs = []
-                published_docs = []
-        es_bulk_index(es, docs)
-        if published_docs:
-            es_bulk_index(es, published_docs)
-        # commit here as the update (sql) may be carried on a very big
-        # number of documents, mainly FAComponents and FindingAids
-        self._cw.commit()
 
     def remove_from_es_docs(self, autheid):
         # remove authority and index data from  esdocument related to FAComponent,FindingAid
@@ -323,16 +304,14 @@ class AbstractAuthority(AnyEntity):
             {"e": self.eid},
         )
 
-    def iter_indexes(self):
-        nb_entities = self._cw.execute(
-            """
-        Any COUNT(I) WHERE I authority E, E eid %(e)s
-        """,
+    def iter_indexes(self, chunksize=100000):
+        return iter_rql_entities(
+            self._cw,
+            "Any I WHERE I authority E, E eid %(e)s",
             {"e": self.eid},
-        )[0][0]
-        rql = """Any I WHERE I authority E, E eid {eid}"""
-        for entity in iter_entities(self._cw, self.eid, rql, nb_entities):
-            yield entity
+            chunksize=chunksize,
+            var="I",
+        )
 
     def group(self, other_auth_eids):
         req = self._cw
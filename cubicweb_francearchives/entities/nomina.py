@@ -121,12 +121,20 @@ def normalized_doctype_code(code):
     return unormalize(code).upper()
 
 
+# process-level cache of translated act codes: (lang, raw code) -> label
+NOMINA_CODETYPE_LABELS = {}
+
+
 def nomina_translate_codetype(cnx, code):
     """use this function for translate document code"""
-    if not code:
-        code = UnknownNominaActCode
-    code = normalized_doctype_code(code)
-    return cnx._(NominaActCodeTypes.get(code, code))
+    key = (getattr(cnx, "lang", None), code)
+    try:
+        return NOMINA_CODETYPE_LABELS[key]
+    except KeyError:
+        pass
+    normalized = normalized_doctype_code(code or UnknownNominaActCode)
+    label = NOMINA_CODETYPE_LABELS[key] = cnx._(NominaActCodeTypes.get(normalized, normalized))
+    return label
 
 
 NominaComplementCodes = OrderedDict(
@@ -622,6 +630,11 @@ class NominaIndexJsonDataSerializable(NominaAttributesMixIn):
             "alltext": text,
             "acte_type": self.es_acte_type_code,
             "dates": self.process_dates,
+            # display fields, used to render search results without the database
+            "persons": self.persons_data,
+            "doctype": self.doctype_code,
+            "acte_year": self.acte_year,
+            "source_url": self.source_url,
         }
         if self.persons:
             data.update(self.process_persons)
@@ -671,3 +684,53 @@ class INominaIndexSerializable(IFullTextIndexSerializable):
             attributes["alltext"] += " " + " ".join(e[1] for e in agents)
         data.update(attributes)
         return data
+
+
+def serialize_nomina_records(cnx, eids):
+    """Serialize a chunk of NominaRecord for the nomina index.
+
+    Produce the same documents as `INominaIndexSerializable.serialize` but
+    fetch the records (with their service) and their agent authorities for
+    the whole chunk in one query each instead of a few queries per record.
+
+    :param Connection cnx: CubicWeb database connection
+    :param list eids: NominaRecord eids
+
+    :returns: list of ES documents, ordered by eid
+    """
+    if not eids:
+        return []
+    eids_rql = ", ".join(str(int(eid)) for eid in eids)
+    agents = defaultdict(list)
+    for eid, agent, label in cnx.execute(
+        f"""DISTINCT Any X, A, L ORDERBY L WHERE X eid IN ({eids_rql}),
+        X same_as A, A is AgentAuthority, A label L"""
+    ):
+        agents[eid].append((agent, label))
+    docs = []
+    for eid, service, stable_id, creation_date, modification_date, json_data in cnx.execute(
+        f"""Any X, S, SI, CD, MD, J ORDERBY X WHERE X eid IN ({eids_rql}),
+        X is NominaRecord, X service S, X stable_id SI, X json_data J,
+        X creation_date CD, X modification_date MD"""
+    ):
+        if isinstance(json_data, str):
+            # sqlite return unicode instead of dict
+            json_data = json.loads(json_data)
+        record_agents = agents.get(eid, ())
+        data = {
+            "cw_etype": "NominaRecord",
+            "eid": eid,
+            "cwuri": cnx.build_url(f"basedenoms/{stable_id}"),
+            "service": service,
+            "stable_id": stable_id,
+            "authority": [agent for agent, _label in record_agents],
+            "creation_date": creation_date,
+            "modification_date": modification_date,
+        }
+        data.update(
+            NominaIndexJsonDataSerializable(cnx, json_data).process_json_data(
+                alltext=" ".join(label for _agent, label in record_agents)
+            )
+        )
+        docs.append(data)
+    return docs
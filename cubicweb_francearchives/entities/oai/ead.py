@@ -40,6 +40,7 @@ from cubicweb_eac.entities import AbstractXmlAdapter
 
 from cubicweb_francearchives.entities.oai import AbstractOAIDownloadView
 from cubicweb_francearchives.dataimport.eadreader import cleanup_ns
+from cubicweb_francearchives.facomponents import facomponent_rows
 from cubicweb_francearchives.utils import is_absolute_url, remove_html_tags
 
 OAI_IDENTIFIER_SCHEMA_LOCATION = "urn:isbn:1-931666-22-9"
@@ -92,34 +93,11 @@ class FindingAidOAIEADXmlAdapter(AbstractXmlAdapter):
         dates = (did.startyear, did.startyear)
         return "-".join([str(d) for d in dates if d])
 
-    @cachedproperty
-    def digitized_versions(self):
-        query = (
-            "Any FA, DAUL WHERE X stable_id %(st)s, "
-            "FA finding_aid X, FA digitized_versions DA, "
-            "DA illustration_url DAUL, NOT DA illustration_url NULL"
-        )
-        rset = self._cw.execute(query, {"st": self.findingaid.stable_id})
-        dao = defaultdict(list)
-        for fa, illustration_url in rset:
-            dao[fa].append(illustration_url)
-        return dao
-
     @cachedproperty
     def facomponents(self):
-        query = (
-            "Any FA, FH, D, DU, DUT, DUD, DPH, DRP, DLG, "
-            "DOR, DEX, FTP, FSP, FAR, FUR, FAD, XD, XDF "
-            "WHERE X stable_id %(st)s, FA finding_aid X, FA did D, "
-            "D unittitle DUT, D unitid DU, D unitdate DUD, "
-            "D physdesc DPH, D repository DRP, D lang_description DLG, "
-            "D origination DOR, D extptr DEX, "
-            "X fa_header FH, FH titleproper FTP, FA scopecontent FSP, "
-            "FA accessrestrict FAR, FA userestrict FUR, FA description FAD, "
-            "X description_format XDF, X description XD"
-        )
-        rset = self._cw.execute(query, {"st": self.findingaid.stable_id})
-        return rset.entities()
+        """components of the finding aid in document order, as
+        `FAComponentRow` holding their did, digitized versions and indexes"""
+        return facomponent_rows(self._cw, self.findingaid.eid)
 
     @property
     def indexes(self):
@@ -128,40 +106,23 @@ class FindingAidOAIEADXmlAdapter(AbstractXmlAdapter):
         return self._indexes
 
     def init_indexes(self):
+        """fetch the indexes of the FindingAid, indexes of the components are
+        fetched along with `facomponents`"""
         indexes = defaultdict(list)
         fa_eid = self.findingaid.eid
-        # fetch all agent indexes on the FindingAid and its components
         rset = self._cw.execute(
-            " (DISTINCT Any L, T, X WHERE A is AgentName, "
-            "  A label L, A type T, A index X, X eid %(x)s) "
+            " (DISTINCT Any L, T WHERE A is AgentName, A label L, A type T, A index X, X eid %(x)s)"
             " UNION "
-            " (DISTINCT Any L, T, FC WHERE A is AgentName, "
-            "  A label L, A type T, A index FC, FC finding_aid X, X eid %(x)s) ",
+            " (DISTINCT Any L, T WHERE A is Subject, A label L, A type T, A index X, X eid %(x)s)",
             {"x": fa_eid},
         )
-        for label, itype, eid in rset:
-            indexes[eid].append((itype, label))
-        # fetch all subject indexes on the FindingAid and its components
+        for label, itype in rset:
+            indexes[fa_eid].append((itype, label))
         rset = self._cw.execute(
-            " (DISTINCT Any L, T, X WHERE A is Subject, A label L, A type T, "
-            " A index X, X eid %(x)s) "
-            " UNION "
-            " (DISTINCT Any L, T, FC WHERE A is Subject, A label L, A type T,"
-            "  A index FC, FC finding_aid X, X eid %(x)s)",
-            {"x": fa_eid},
-        )
-        for label, itype, eid in rset:
-            indexes[eid].append((itype, label))
-        # fetch all gegonames indexes on the FindingAid and its components
-        rset = self._cw.execute(
-            " (DISTINCT Any L, X WHERE A is Geogname, A label L, A index X, X eid %(x)s) "
-            " UNION "
-            " (DISTINCT Any L, FC WHERE A is Geogname, A label L, "
-            "  A index FC, FC finding_aid X, X eid %(x)s)",
-            {"x": fa_eid},
+            "DISTINCT Any L WHERE A is Geogname, A label L, A index X, X eid %(x)s", {"x": fa_eid}
         )
-        for label, eid in rset:
-            indexes[eid].append(("geogname", label))
+        for (label,) in rset:
+            indexes[fa_eid].append(("geogname", label))
         return indexes
 
     def dump(self, as_xml=False):
@@ -269,7 +230,7 @@ class FindingAidOAIEADXmlAdapter(AbstractXmlAdapter):
             dao = ()
         self.did_element(archdesc, self.findingaid, did, dao)
         self.scopecontent(archdesc, self.findingaid)
-        self.controlaccess(archdesc, self.findingaid)
+        self.controlaccess(archdesc, self.indexes[self.findingaid.eid])
         self.relatedmaterial(archdesc, self.findingaid)
         self.accessrestrict(archdesc, self.findingaid)
         self.userestrict(archdesc, self.findingaid)
@@ -339,9 +300,9 @@ class FindingAidOAIEADXmlAdapter(AbstractXmlAdapter):
                 "p", parent=self.element("userestrict", parent=parent_element), text=userestrict
             )
 
-    def controlaccess(self, parent_element, entity):
+    def controlaccess(self, parent_element, indexes):
         controlaccess = self.element("controlaccess", parent=parent_element)
-        for itype, label in sorted(self.indexes[entity.eid]):
+        for itype, label in sorted(indexes):
             self.element(itype, parent=controlaccess, text=label)
 
     def origination(self, parent_element, did):
@@ -352,18 +313,16 @@ class FindingAidOAIEADXmlAdapter(AbstractXmlAdapter):
     def components(self, parent_element):
         fa_components = self.facomponents
         if fa_components:
-            doas = self.digitized_versions
             dsc = self.element("dsc", parent=parent_element)
             for fa_component in fa_components:
-                did = fa_component.did[0]
                 c = self.element("c", parent=dsc)
-                dao = [u for u in doas.get(fa_component.eid, []) if u]
-                self.did_element(c, fa_component, did, dao)
+                dao = [u for u in fa_component.dao if u]
+                # rows hold both the component and its did attributes
+                self.did_element(c, fa_component, fa_component, dao)
                 self.scopecontent(c, fa_component)
-                self.controlaccess(c, fa_component)
+                self.controlaccess(c, fa_component.indexes)
                 self.accessrestrict(c, fa_component)
                 self.userestrict(c, fa_component)
-                fa_component.cw_clear_all_caches()
 
 
 class OAIEADDownloadView(AbstractOAIDownloadView):
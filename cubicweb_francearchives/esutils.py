@@ -32,7 +32,7 @@
 """small es utility functions"""
 import logging
 
-from cubicweb_francearchives.dataimport import es_bulk_index
+from cubicweb_francearchives.dataimport.esbulk import ESBulkSink
 
 from cubicweb_elasticsearch.es import get_connection
 
@@ -81,7 +81,7 @@ def delete_autority_from_es(cnx, eids, log=None):
         if not es:
             return
         es_docs = docs_to_delete(es, eids, index_name)
-        es_bulk_index(es, es_docs, raise_on_error=False)
+        ESBulkSink(es, cnx, source="delete-authorities").send(es_docs)
 
 
 def update_index_mapping(cnx, index_name, mapping, log=None):
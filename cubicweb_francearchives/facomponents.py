@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © LOGILAB S.A. (Paris, FRANCE) 2016-2023
+# Contact http://www.logilab.fr -- mailto:contact@logilab.fr
+#
+# This software is governed by the CeCILL-C license under French law and
+# abiding by the rules of distribution of free software. You can use,
+# modify and/ or redistribute the software under the terms of the CeCILL-C
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# "http://www.cecill.info".
+#
+# As a counterpart to the access to the source code and rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty and the software's author, the holder of the
+# economic rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated
+# with loading, using, modifying and/or developing or reproducing the
+# software by the user in light of its specific status of free software,
+# that may mean that it is complicated to manipulate, and that also
+# therefore means that it is reserved for developers and experienced
+# professionals having in-depth computer knowledge. Users are therefore
+# encouraged to load and test the software's suitability as regards their
+# requirements in conditions enabling the security of their systemsand/or
+# data to be ensured and, more generally, to use and operate it in the
+# same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+#
+"""columnar loading of the FAComponents of a finding aid.
+
+Components are fetched with their did, digitized versions and indexes in a
+few queries and returned as lightweight rows instead of entities, which
+avoids one ORM fetch per component in exports.
+"""
+
+# standard library imports
+from collections import defaultdict, namedtuple
+
+# third party imports
+# CubicWeb specific imports
+# library specific imports
+
+COMPONENT_ATTRIBUTES = (
+    "eid",
+    "stable_id",
+    "parent",
+    "component_order",
+    "description",
+    "scopecontent",
+    "accessrestrict",
+    "userestrict",
+    "additional_resources",
+)
+
+DID_ATTRIBUTES = (
+    "unitid",
+    "unittitle",
+    "unitdate",
+    "startyear",
+    "stopyear",
+    "physdesc",
+    "repository",
+    "lang_description",
+    "origination",
+    "extptr",
+)
+
+# a component and its did attributes, `dao` is the tuple of its
+# illustration urls and `indexes` the list of its (type, label) indexes
+FAComponentRow = namedtuple(
+    "FAComponentRow", COMPONENT_ATTRIBUTES + DID_ATTRIBUTES + ("dao", "indexes")
+)
+
+COMPONENTS_RQL = (
+    "Any FAC, SI, P, CO, DE, SC, AR, UR, AD, "
+    "DU, DUT, DUD, DSY, DEY, DPH, DRP, DLG, DOR, DEX "
+    "WHERE FAC finding_aid X, X eid %(x)s, FAC stable_id SI, "
+    "FAC parent_component P?, FAC component_order CO, "
+    "FAC description DE, FAC scopecontent SC, FAC accessrestrict AR, "
+    "FAC userestrict UR, FAC additional_resources AD, FAC did D, "
+    "D unitid DU, D unittitle DUT, D unitdate DUD, D startyear DSY, "
+    "D stopyear DEY, D physdesc DPH, D repository DRP, "
+    "D lang_description DLG, D origination DOR, D extptr DEX"
+)
+
+DAO_RQL = (
+    "Any FAC, DAUL ORDERBY DAUL WHERE FAC finding_aid X, X eid %(x)s, "
+    "FAC digitized_versions DA, DA illustration_url DAUL, "
+    "NOT DA illustration_url NULL"
+)
+
+INDEXES_RQL = (
+    "(DISTINCT Any FAC, T, L WHERE A is AgentName, A label L, A type T, "
+    " A index FAC, FAC finding_aid X, X eid %(x)s) "
+    "UNION "
+    "(DISTINCT Any FAC, T, L WHERE A is Subject, A label L, A type T, "
+    " A index FAC, FAC finding_aid X, X eid %(x)s)"
+)
+
+GEOGNAMES_RQL = (
+    "DISTINCT Any FAC, L WHERE A is Geogname, A label L, "
+    "A index FAC, FAC finding_aid X, X eid %(x)s"
+)
+
+
+def hierarchical_order(rows):
+    """return `rows` in document order: depth first, siblings sorted by
+    `component_order`. Components whose parent is unknown are handled as
+    top-level components"""
+    eids = {row.eid for row in rows}
+    children = defaultdict(list)
+    for row in rows:
+        parent = row.parent if row.parent in eids else None
+        children[parent].append(row)
+    for siblings in children.values():
+        siblings.sort(key=lambda row: (row.component_order is None, row.component_order, row.eid))
+    ordered = []
+    stack = list(reversed(children[None]))
+    while stack:
+        row = stack.pop()
+        ordered.append(row)
+        stack.extend(reversed(children[row.eid]))
+    return ordered
+
+
+def facomponent_rows(cnx, fa_eid, with_dao=True, with_indexes=True):
+    """return the `FAComponentRow` of the components of the finding aid
+    `fa_eid` in document order"""
+    dao = defaultdict(list)
+    if with_dao:
+        for eid, url in cnx.execute(DAO_RQL, {"x": fa_eid}):
+            dao[eid].append(url)
+    indexes = defaultdict(list)
+    if with_indexes:
+        for eid, itype, label in cnx.execute(INDEXES_RQL, {"x": fa_eid}):
+            indexes[eid].append((itype, label))
+        for eid, label in cnx.execute(GEOGNAMES_RQL, {"x": fa_eid}):
+            indexes[eid].append(("geogname", label))
+    rows = [
+        FAComponentRow(*row, dao=tuple(dao.get(row[0], ())), indexes=indexes.get(row[0], []))
+        for row in cnx.execute(COMPONENTS_RQL, {"x": fa_eid})
+    ]
+    return hierarchical_order(rows)
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © LOGILAB S.A. (Paris, FRANCE) 2016-2023
+# Contact http://www.logilab.fr -- mailto:contact@logilab.fr
+#
+# This software is governed by the CeCILL-C license under French law and
+# abiding by the rules of distribution of free software. You can use,
+# modify and/ or redistribute the software under the terms of the CeCILL-C
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# "http://www.cecill.info".
+#
+# As a counterpart to the access to the source code and rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty and the software's author, the holder of the
+# economic rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated
+# with loading, using, modifying and/or developing or reproducing the
+# software by the user in light of its specific status of free software,
+# that may mean that it is complicated to manipulate, and that also
+# therefore means that it is reserved for developers and experienced
+# professionals having in-depth computer knowledge. Users are therefore
+# encouraged to load and test the software's suitability as regards their
+# requirements in conditions enabling the security of their systemsand/or
+# data to be ensured and, more generally, to use and operate it in the
+# same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+#
+"""pre-computed data of the finding aids map (`fa-map.json`)"""
+
+# standard library imports
+import gzip
+import hashlib
+import json
+
+# third party imports
+# CubicWeb specific imports
+# library specific imports
+from cubicweb_francearchives.utils import LRUCache, is_absolute_url
+
+GEOMAP_CACHE_NAME = "geomap"
+
+GEOMAP_INSTANCE_TYPES = ("cms", "consultation")
+
+# serialized and gzipped payloads of the geomap, keyed by ETag
+GEOMAP_PAYLOADS = LRUCache(
+    32 * 1024 * 1024, sizeof=lambda payload: len(payload[0]) + len(payload[1])
+)
+
+
+def geomap_enabled(cnx):
+    """geomap queries are only available on postgres"""
+    return cnx.repo.system_source.dbdriver == "postgres"
+
+
+def geomap_query(eids=None):
+    """Build the query computing the number of documents indexed by each
+    geolocated LocationAuthority in a single pass"""
+    restriction = "AND la.cw_eid = ANY(%(eids)s)" if eids is not None else ""
+    return """
+    SELECT la.cw_eid, la.cw_label, la.cw_latitude, la.cw_longitude,
+           COUNT(DISTINCT rel_index.eid_to)
+    FROM cw_locationauthority AS la
+      JOIN cw_geogname AS it ON (it.cw_authority=la.cw_eid)
+      JOIN index_relation AS rel_index ON (rel_index.eid_from=it.cw_eid)
+    WHERE la.cw_latitude IS NOT NULL AND la.cw_longitude IS NOT NULL
+      AND NOT EXISTS (
+        SELECT 1 FROM grouped_with_relation AS rel_group WHERE rel_group.eid_from=la.cw_eid
+      )
+      {restriction}
+    GROUP BY la.cw_eid, la.cw_label, la.cw_latitude, la.cw_longitude
+    """.format(
+        restriction=restriction
+    )
+
+
+def geomap_markers(cnx, eids=None):
+    """Return the markers of LocationAuthorities `eids` (all geolocated
+    LocationAuthorities if `eids` is None)"""
+    if eids is not None:
+        eids = list(eids)
+        if not eids:
+            return []
+    markers = []
+    for eid, label, latitude, longitude, count in cnx.system_sql(
+        geomap_query(eids), {"eids": eids}
+    ).fetchall():
+        label = label or ""
+        markers.append(
+            {
+                "eid": eid,
+                "label": label,
+                "lat": latitude,
+                "lng": longitude,
+                "count": count,
+                # the same markers are stored for all instances, the
+                # absolute url is built when serving them
+                "url": "location/{}".format(eid),
+                # sub-locations (e.g. "Paris -- Notre-Dame") have their own icon
+                "dashLabel": "--" in label,
+            }
+        )
+    markers.sort(key=lambda marker: marker["eid"])
+    return markers
+
+
+def geomap_caches(cnx):
+    """Return the `Caches` entities holding the geomap of each instance type,
+    create them if needed.
+
+    Markers only depend on the tables shared by the cms and consultation
+    instances, so that both geomaps are updated by the cms instance.
+    """
+    caches = []
+    for instance_type in GEOMAP_INSTANCE_TYPES:
+        rset = cnx.find("Caches", name=GEOMAP_CACHE_NAME, instance_type=instance_type)
+        if rset:
+            caches.append(rset.one())
+        else:
+            caches.append(
+                cnx.create_entity(
+                    "Caches", name=GEOMAP_CACHE_NAME, values=[], instance_type=instance_type
+                )
+            )
+    return caches
+
+
+def lock_geomap(cnx):
+    """lock the geomap `Caches` rows until the end of the transaction, so
+    that concurrent incremental updates do not overwrite each other"""
+    cnx.system_sql(
+        "SELECT cw_eid FROM cw_caches WHERE cw_name=%(name)s FOR UPDATE",
+        {"name": GEOMAP_CACHE_NAME},
+    )
+
+
+def compute_geomap(cnx):
+    """(Re)compute the whole geomap of all instances"""
+    markers = geomap_markers(cnx)
+    with cnx.security_enabled(write=False):
+        for cache in geomap_caches(cnx):
+            cache.cw_set(values=markers)
+    return markers
+
+
+def update_geomap(cnx, eids):
+    """Update the geomap markers of LocationAuthorities `eids` in the geomap
+    of all instances, other markers are kept as is. Non LocationAuthority
+    eids are ignored."""
+    eids = set(eids)
+    if not eids or not geomap_enabled(cnx):
+        return
+    lock_geomap(cnx)
+    new_markers = geomap_markers(cnx, eids)
+    with cnx.security_enabled(write=False):
+        for cache in geomap_caches(cnx):
+            old_markers = cache.values or []
+            markers = [marker for marker in old_markers if marker["eid"] not in eids]
+            markers.extend(new_markers)
+            markers.sort(key=lambda marker: marker["eid"])
+            if markers != old_markers:
+                cache.cw_set(values=markers)
+
+
+def served_markers(cnx, markers):
+    """Return `markers` with absolute urls built with the base url of the
+    current instance"""
+    return [
+        marker if is_absolute_url(marker["url"]) else dict(marker, url=cnx.build_url(marker["url"]))
+        for marker in markers
+    ]
+
+
+def geomap_etag(eid, modification_date):
+    return hashlib.sha1("{}-{}".format(eid, modification_date.isoformat()).encode()).hexdigest()
+
+
+def geomap_payload(etag, get_markers):
+    """Return the JSON serialization of the markers returned by `get_markers`
+    and its gzipped version. Markers are only fetched if the payload of
+    `etag` is not already known."""
+
+    def compute():
+        data = json.dumps(get_markers(), separators=(",", ":")).encode("utf-8")
+        return data, gzip.compress(data)
+
+    return GEOMAP_PAYLOADS.get(etag, compute)
@@ -32,6 +32,7 @@
 
 import logging
 import os
+from functools import partial
 from uuid import uuid4
 from rql import BadRQLQuery
 
@@ -49,11 +50,27 @@ from cubicweb_francearchives import (
     FranceArchivesS3Storage,
     S3_ACTIVE,
 )
-from cubicweb_francearchives.cssimages import HERO_SIZES
-
-from cubicweb_francearchives.cssimages import generate_thumbnails
+from cubicweb_francearchives.cssimages import generate_css_thumbnails
+from cubicweb_francearchives.geomap import update_geomap
+from cubicweb_francearchives.dataimport.ead import reindex_illustration_infos_task
 from cubicweb_francearchives.htmlutils import soup2xhtml
-from cubicweb_francearchives.utils import populate_terms_cache
+from cubicweb_francearchives.suggest import (
+    CIRCULAR_CONCEPT_RTYPES,
+    authorities_of_concepts,
+    delete_suggest_stats,
+    refresh_suggest_stats,
+    suggest_stats_enabled,
+    touch_suggest_stats,
+)
+from cubicweb_francearchives.entities.varnish import homepages
+from cubicweb_francearchives.utils import (
+    CHROME_CACHE,
+    HP_ARTICLES_CACHE,
+    HP_ARTICLES_IMAGE_RTYPES,
+    SERVICES_CACHE,
+    SERVICES_MAP_CACHE,
+    populate_terms_cache,
+)
 from cubicweb_francearchives.xmlutils import enhance_accessibility, handle_subtitles
 
 from cubicweb_varnish.hooks import PurgeUrlsOnUpdate, InvalidateVarnishCacheOp
@@ -183,6 +200,142 @@ class RegisterAuthHistoryOp(hook.DataOperationMixIn, hook.Operation):
             register_auth_history(cnx, key, auth.eid)
 
 
+class SuggestStatsAuthorityHook(hook.Hook):
+    """maintain `authority_suggest_stats` on authority creation, edition and deletion"""
+
+    __regid__ = "francearchives.suggest-stats-authority"
+    __select__ = hook.Hook.__select__ & is_instance(
+        "AgentAuthority", "LocationAuthority", "SubjectAuthority"
+    )
+    events = ("after_add_entity", "after_update_entity", "before_delete_entity")
+    category = "suggest"
+
+    def __call__(self):
+        if not suggest_stats_enabled(self._cw):
+            return
+        op = UpdateSuggestStatsOp.get_instance(self._cw)
+        if self.event == "after_update_entity":
+            edited = self.entity.cw_edited
+            if "label" in edited or "quality" in edited:
+                op.add_data(("touch", self.entity.eid))
+        else:
+            op.add_data(("authority", self.entity.eid))
+
+
+class SuggestStatsRelationHook(hook.Hook):
+    """maintain `authority_suggest_stats` when relations counted in
+    authorities statistics are added or deleted"""
+
+    __regid__ = "francearchives.suggest-stats-relation"
+    __select__ = hook.Hook.__select__ & hook.match_rtype(
+        "index", "authority", "related_authority", "grouped_with", "same_as",
+        *CIRCULAR_CONCEPT_RTYPES
+    )
+    events = ("after_add_relation", "after_delete_relation")
+    category = "suggest"
+
+    def __call__(self):
+        cnx = self._cw
+        if not suggest_stats_enabled(cnx):
+            return
+        op = UpdateSuggestStatsOp.get_instance(cnx)
+        if self.rtype == "index":
+            # the index entity may be deleted at precommit time, fetch its
+            # authority now
+            for autheid, in cnx.execute(
+                "Any A WHERE I authority A, I eid %(i)s", {"i": self.eidfrom}
+            ):
+                op.add_data(("authority", autheid))
+        elif self.rtype in CIRCULAR_CONCEPT_RTYPES:
+            op.add_data(("concept", self.eidto))
+        elif self.rtype in ("grouped_with", "same_as"):
+            op.add_data(("authority", self.eidfrom))
+        else:
+            op.add_data(("authority", self.eidto))
+
+
+class UpdateSuggestStatsOp(hook.DataOperationMixIn, hook.Operation):
+    def precommit_event(self):
+        cnx = self.cnx
+        autheids, concepts, touched = set(), set(), set()
+        for kind, eid in self.get_data():
+            if kind == "concept":
+                concepts.add(eid)
+            elif kind == "touch":
+                touched.add(eid)
+            else:
+                autheids.add(eid)
+        autheids |= authorities_of_concepts(cnx, concepts)
+        deleted = {eid for eid in autheids if cnx.deleted_in_transaction(eid)}
+        delete_suggest_stats(cnx, deleted)
+        refresh_suggest_stats(cnx, autheids - deleted)
+        touch_suggest_stats(cnx, touched - deleted)
+
+
+class GeomapAuthorityHook(hook.Hook):
+    """update the pre-computed geomap when a LocationAuthority is moved,
+    renamed or deleted"""
+
+    __regid__ = "francearchives.geomap-authority"
+    __select__ = hook.Hook.__select__ & is_instance("LocationAuthority")
+    events = ("after_update_entity", "before_delete_entity")
+    category = "geomap"
+
+    def __call__(self):
+        if self.event == "after_update_entity" and not set(
+            ("label", "latitude", "longitude")
+        ).intersection(self.entity.cw_edited):
+            return
+        UpdateGeomapOp.get_instance(self._cw).add_data(self.entity.eid)
+
+
+class GeomapRelationHook(hook.Hook):
+    __regid__ = "francearchives.geomap-relation"
+    __select__ = hook.Hook.__select__ & hook.match_rtype(
+        "authority", toetypes=("LocationAuthority",)
+    )
+    events = ("after_add_relation", "after_delete_relation")
+    category = "geomap"
+
+    def __call__(self):
+        UpdateGeomapOp.get_instance(self._cw).add_data(self.eidto)
+
+
+class UpdateGeomapOp(hook.DataOperationMixIn, hook.Operation):
+    """update the geomap of all instances once the transaction is committed,
+    so that edition transactions do not rewrite (and lock) it"""
+
+    def postcommit_event(self):
+        with self.cnx.repo.internal_cnx() as cnx:
+            update_geomap(cnx, self.get_data())
+            cnx.commit()
+
+
+class ServiceThumbnailUrlHook(hook.Hook):
+    """recompute illustration urls precomputed in EsDocuments when the
+    service `thumbnail_url` is modified"""
+
+    __regid__ = "francearchives.service-thumbnail-url"
+    __select__ = hook.Hook.__select__ & is_instance("Service")
+    events = ("after_update_entity",)
+
+    def __call__(self):
+        if "thumbnail_url" in self.entity.cw_edited or "code" in self.entity.cw_edited:
+            UpdateIllustrationInfosOp.get_instance(self._cw).add_data(self.entity.eid)
+
+
+class UpdateIllustrationInfosOp(hook.DataOperationMixIn, hook.Operation):
+    """recompute illustration urls in a thread once the transaction is
+    committed, as a service may have a huge number of digitized documents"""
+
+    def postcommit_event(self):
+        service_eids = [eid for eid in self.get_data() if not self.cnx.deleted_in_transaction(eid)]
+        if service_eids:
+            self.cnx.repo.threaded_task(
+                partial(reindex_illustration_infos_task, self.cnx.repo, service_eids)
+            )
+
+
 class NewCssImageFile(hook.Hook):
     __regid__ = "francearchives.file-css-image"
     __select__ = hook.Hook.__select__ & hook.match_rtype("image_file")
@@ -195,13 +348,186 @@ class NewCssImageFile(hook.Hook):
 
 
 class GenerateImageThumbnailsOp(hook.DataOperationMixIn, hook.Operation):
-    def precommit_event(self):
-        cnx = self.cnx
-        for eid, cssid in self.get_data():
-            if cnx.deleted_in_transaction(eid):
-                continue
-            entity = cnx.entity_from_eid(eid)
-            generate_thumbnails(cnx, entity, "%s.jpg" % cssid, HERO_SIZES)
+    """generate the hero thumbnails in a thread once the transaction is
+    committed, so that resizing the images does not hold the transaction"""
+
+    def postcommit_event(self):
+        files = [
+            (eid, cssid)
+            for eid, cssid in self.get_data()
+            if not self.cnx.deleted_in_transaction(eid)
+        ]
+        if files:
+            self.cnx.repo.threaded_task(partial(generate_css_thumbnails, self.cnx.repo, files))
+
+
+class ChromeCacheEntityHook(hook.Hook):
+    """invalidate the cache of the main template menus, footer and hero
+    images"""
+
+    __regid__ = "francearchives.chrome-cache-entity"
+    __select__ = hook.Hook.__select__ & is_instance(
+        "SiteLink", "Section", "SectionTranslation", "CssImage", "Card", "GlossaryTerm"
+    )
+    events = ("after_add_entity", "after_update_entity", "before_delete_entity")
+    category = "chrome-cache"
+
+    def __call__(self):
+        InvalidateChromeCacheOp.get_instance(self._cw).add_data(self.entity.eid)
+
+
+class ChromeCacheRelationHook(hook.Hook):
+    __regid__ = "francearchives.chrome-cache-relation"
+    __select__ = hook.Hook.__select__ & hook.match_rtype(
+        "children", "translation_of", "cssimage_of"
+    )
+    events = ("after_add_relation", "after_delete_relation")
+    category = "chrome-cache"
+
+    def __call__(self):
+        InvalidateChromeCacheOp.get_instance(self._cw).add_data(self.eidfrom)
+
+
+class InvalidateChromeCacheOp(hook.DataOperationMixIn, hook.Operation):
+    def postcommit_event(self):
+        CHROME_CACHE.bump()
+
+
+class HomepageArticlesCacheHook(hook.Hook):
+    """invalidate the cache of the homepage articles when the same urls as
+    the varnish hooks would be purged"""
+
+    __regid__ = "francearchives.hp-articles-cache"
+    __select__ = hook.Hook.__select__ & is_instance(
+        "BaseContent", "NewsContent", "ExternRef", "CommemorationItem", "Section"
+    )
+    events = ("after_add_entity", "after_update_entity", "before_delete_entity")
+    category = "chrome-cache"
+
+    def __call__(self):
+        if self.event == "before_delete_entity":
+            on_homepage = self.entity.on_homepage
+        else:
+            on_homepage = homepages(self.entity)
+        if on_homepage:
+            InvalidateHomepageArticlesCacheOp.get_instance(self._cw).add_data(self.entity.eid)
+
+
+class HomepageArticlesImageCacheHook(hook.Hook):
+    """images and translations of the homepage articles"""
+
+    __regid__ = "francearchives.hp-articles-cache-image"
+    __select__ = hook.Hook.__select__ & is_instance(
+        "Image",
+        "CssImage",
+        "BaseContentTranslation",
+        "CommemorationItemTranslation",
+        "SectionTranslation",
+    )
+    events = ("after_update_entity", "before_delete_entity")
+    category = "chrome-cache"
+
+    def __call__(self):
+        InvalidateHomepageArticlesCacheOp.get_instance(self._cw).add_data(self.entity.eid)
+
+
+class HomepageArticlesRelationCacheHook(hook.Hook):
+    __regid__ = "francearchives.hp-articles-cache-relation"
+    __select__ = hook.Hook.__select__ & hook.match_rtype(
+        "cssimage_of", "translation_of", *HP_ARTICLES_IMAGE_RTYPES
+    )
+    events = ("after_add_relation", "after_delete_relation")
+    category = "chrome-cache"
+
+    def __call__(self):
+        InvalidateHomepageArticlesCacheOp.get_instance(self._cw).add_data(self.eidfrom)
+
+
+class InvalidateHomepageArticlesCacheOp(hook.DataOperationMixIn, hook.Operation):
+    def postcommit_event(self):
+        HP_ARTICLES_CACHE.bump()
+
+
+class ServicesCacheHook(hook.Hook):
+    """invalidate the registry of services used by importers and search
+    views"""
+
+    __regid__ = "francearchives.services-cache"
+    __select__ = hook.Hook.__select__ & is_instance("Service")
+    events = ("after_add_entity", "after_update_entity", "before_delete_entity")
+    category = "services-cache"
+
+    def __call__(self):
+        InvalidateServicesCacheOp.get_instance(self._cw).add_data(self.entity.eid)
+
+
+class ServicesImageCacheHook(hook.Hook):
+    """service images, whose url is kept in the registry of services"""
+
+    __regid__ = "francearchives.services-cache-image"
+    __select__ = hook.Hook.__select__ & hook.match_rtype("service_image", "image_file")
+    events = ("after_add_relation", "after_delete_relation")
+    category = "services-cache"
+
+    def __call__(self):
+        InvalidateServicesCacheOp.get_instance(self._cw).add_data(self.eidfrom)
+
+
+class InvalidateServicesCacheOp(hook.DataOperationMixIn, hook.Operation):
+    def postcommit_event(self):
+        SERVICES_CACHE.bump()
+
+
+class ServicesMapCacheHook(hook.Hook):
+    """invalidate the services map of the annuaire pages"""
+
+    __regid__ = "francearchives.services-map-cache"
+    __select__ = hook.Hook.__select__ & is_instance("Service", "SocialNetwork")
+    events = ("after_add_entity", "after_update_entity", "before_delete_entity")
+    category = "services-cache"
+
+    def __call__(self):
+        InvalidateServicesMapCacheOp.get_instance(self._cw).add_data(self.entity.eid)
+
+
+class ServicesMapCacheRelationHook(hook.Hook):
+    """services contributing FindingAid or NominaRecord are flagged as
+    partners on the map"""
+
+    __regid__ = "francearchives.services-map-cache-relation"
+    __select__ = hook.Hook.__select__ & hook.match_rtype(
+        "service", frometypes=("FindingAid", "NominaRecord")
+    )
+    events = ("after_add_relation", "after_delete_relation")
+    category = "services-cache"
+
+    def __call__(self):
+        InvalidateServicesMapCacheOp.get_instance(self._cw).add_data(self.eidto)
+
+
+class ServicesMapSocialNetworkCacheHook(hook.Hook):
+    __regid__ = "francearchives.services-map-cache-social-network"
+    __select__ = hook.Hook.__select__ & hook.match_rtype("service_social_network")
+    events = ("after_add_relation", "after_delete_relation")
+    category = "services-cache"
+
+    def __call__(self):
+        InvalidateServicesMapCacheOp.get_instance(self._cw).add_data(self.eidfrom)
+
+
+class ServicesMapContributionsCacheHook(hook.Hook):
+    __regid__ = "francearchives.services-map-cache-contributions"
+    __select__ = hook.Hook.__select__ & is_instance("FindingAid", "NominaRecord")
+    events = ("before_delete_entity",)
+    category = "services-cache"
+
+    def __call__(self):
+        InvalidateServicesMapCacheOp.get_instance(self._cw).add_data(self.entity.eid)
+
+
+class InvalidateServicesMapCacheOp(hook.DataOperationMixIn, hook.Operation):
+    def postcommit_event(self):
+        SERVICES_MAP_CACHE.bump()
 
 
 class UUIDHook(hook.Hook):
@@ -38,6 +38,9 @@ import os.path as osp
 
 from cubicweb_francearchives import SUPPORTED_LANGS
 from cubicweb_francearchives import workflows, create_homepage_metadata
+from cubicweb_francearchives.suggest import create_suggest_stats_table
+from cubicweb_francearchives.dataimport.esbulk import create_es_failures_table
+from cubicweb_francearchives.dataimport.importall import create_import_steps_table
 from cubicweb_francearchives.dataimport.sqlutil import (
     ead_foreign_key_tables,
     nomina_foreign_key_tables,
@@ -79,6 +82,13 @@ cnx.system_sql(
 )
 
 if cnx.vreg.config.system_source_config["db-driver"].lower() == "postgres":
+    # statistics used by the suggest elasticsearch index
+    create_suggest_stats_table(cnx.system_sql)
+    # documents which could not be indexed in elasticsearch
+    create_es_failures_table(cnx.system_sql)
+    # checkpoints of the import-all steps
+    create_import_steps_table(cnx.system_sql)
+
     cnx.system_sql(
         """
     CREATE OR REPLACE FUNCTION create_entities(etype varchar,
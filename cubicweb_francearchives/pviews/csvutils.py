@@ -28,10 +28,12 @@
 # The fact that you are presently reading this means that you have had
 # knowledge of the CeCILL-C license and that you accept its terms.
 #
-from collections import defaultdict
+from itertools import groupby
 
 from cubicweb import _
 
+from cubicweb_francearchives.utils import iter_sql_rows
+
 
 def alignment_csv(req):
     headers = (_("index_entry"), _("index_url"), _("aligned_url"))
@@ -95,55 +97,76 @@ def alignment_csv(req):
     return {"rows": rows, "headers": headers}
 
 
-def all_indices(req, auth_type, etype):
-    if etype == "AgentAuthority":
-        query = (
-            "(Any A,AL,ANT,T WHERE A is AgentAuthority, A label AL, "
-            " AN authority A, AN type ANT, AN index T)"
-            " UNION "
-            '(Any A,AL,"persname",T WHERE A is AgentAuthority, A label AL, '
-            " T related_authority A)"
-        )
-    elif etype == "SubjectAuthority":
-        query = (
-            '(Any A,AL,"subject",T WHERE A is SubjectAuthority, A label AL, '
-            " AN authority A, AN index T) "
-            " UNION "
-            '(Any A,AL,"subject",T WHERE A is SubjectAuthority, A label AL, '
-            " T related_authority A)"
-        )
-    else:
-        query = (
-            '(Any A,AL,"geogname",T WHERE A is LocationAuthority, A label AL, '
-            " AN authority A, AN index T) "
-            " UNION "
-            '(Any A,AL,"geogname",T WHERE A is LocationAuthority, A label AL, '
-            " T related_authority A)"
-        )
-    return req.execute(query)
+# rest path of documents which may be indexed by an authority, either from
+# their rest attribute (see `rest_attr`) or from their eid
+INDEXED_DOCUMENT_PATHS = {
+    "FindingAid": "findingaid/{}",
+    "FAComponent": "facomponent/{}",
+    "ExternRef": "externref/{}",
+    "BaseContent": "article/{}",
+    "CommemorationItem": "pages_histoire/{}",
+}
+
+INDICES_AUTHORITIES = {
+    "agent": ("cw_agentauthority", "cw_agentname", "n.cw_type", "'persname'"),
+    "subject": ("cw_subjectauthority", "cw_subject", "'subject'", "'subject'"),
+    "location": ("cw_locationauthority", "cw_geogname", "'geogname'", "'geogname'"),
+}
+
+
+def indices_query(auth_type):
+    """SQL query returning (authority eid, label, index type, document eid,
+    document etype, document rest id) of documents indexed by `auth_type` authorities,
+    ordered by authority"""
+    authtable, indextable, index_type, related_type = INDICES_AUTHORITIES[auth_type]
+    return """
+    SELECT a.cw_eid, a.cw_label, idx.index_type, idx.doc, e.type,
+           COALESCE(fa.cw_stable_id, fac.cw_stable_id, er.cw_uuid)
+    FROM (
+        SELECT n.cw_authority AS autheid, {index_type} AS index_type, i.eid_to AS doc
+        FROM {indextable} AS n JOIN index_relation AS i ON (i.eid_from=n.cw_eid)
+        UNION
+        SELECT r.eid_to, {related_type}, r.eid_from FROM related_authority_relation AS r
+    ) AS idx
+    JOIN {authtable} AS a ON (a.cw_eid=idx.autheid)
+    JOIN entities AS e ON (e.eid=idx.doc)
+    LEFT OUTER JOIN cw_findingaid AS fa ON (fa.cw_eid=idx.doc)
+    LEFT OUTER JOIN cw_facomponent AS fac ON (fac.cw_eid=idx.doc)
+    LEFT OUTER JOIN cw_externref AS er ON (er.cw_eid=idx.doc)
+    ORDER BY a.cw_eid
+    """.format(
+        authtable=authtable,
+        indextable=indextable,
+        index_type=index_type,
+        related_type=related_type,
+    )
+
+
+def document_url(req, etype, eid, rest_id):
+    """build the url of an indexed document without instantiating it"""
+    if etype in ("BaseContent", "CommemorationItem") or rest_id is None:
+        rest_id = eid
+    return req.build_url(INDEXED_DOCUMENT_PATHS[etype].format(req.url_quote(str(rest_id))))
+
+
+def iter_indices_rows(req, auth_type):
+    """Generate CSV rows of `auth_type` authorities and the urls of the
+    documents they index.
+
+    Rows are read with a server-side cursor from a connection opened by the
+    generator itself, so that it may be consumed once the request connection
+    has been released (see `csv_response`).
+    """
+    with req.cnx.repo.internal_cnx() as cnx:
+        rows = iter_sql_rows(cnx, indices_query(auth_type), name=f"indices_{auth_type}")
+        for autheid, authrows in groupby(rows, key=lambda row: row[0]):
+            docs = []
+            for autheid, preflabel, index_type, doc_eid, etype, rest_id in authrows:
+                if etype in INDEXED_DOCUMENT_PATHS:
+                    docs.append(document_url(req, etype, doc_eid, rest_id))
+            yield [preflabel or "", index_type or "", "$$$".join(docs)]
 
 
 def indices_csv(req, auth_type):
-    types = {
-        "agent": "AgentAuthority",
-        "subject": "SubjectAuthority",
-        "location": "LocationAuthority",
-    }
-    data = defaultdict(dict)
-    for eid, preflabel, index_type, target_eid in all_indices(
-        req, auth_type, types[auth_type]
-    ).rows:
-        target = req.entity_from_eid(target_eid)
-        docs = data[eid].get("docs", [])
-        docs.append(target.absolute_url())
-        data[eid].update({"preflabel": preflabel, "index_type": index_type, "docs": docs})
     headers = (_("index_entry"), _("index_type"), _("documents"))
-    rows = []
-    for eid, values in data.items():
-        props = {
-            "index_entry": values["preflabel"],
-            "index_type": values["index_type"],
-            "documents": "$$$".join(values["docs"]),
-        }
-        rows.append([(props[h] or "") for h in headers])
-    return {"rows": rows, "headers": headers}
+    return {"rows": iter_indices_rows(req, auth_type), "headers": headers}
@@ -35,7 +35,7 @@ import logging
 
 from pyramid.view import view_config
 from pyramid.response import Response
-from pyramid.httpexceptions import HTTPNotFound, HTTPFound
+from pyramid.httpexceptions import HTTPNotFound, HTTPFound, HTTPNotModified
 from rdflib.graph import ConjunctiveGraph
 
 from rql import TypeResolverException
@@ -43,12 +43,19 @@ from rql import TypeResolverException
 
 from cubicweb import crypto, NoResultError
 
+from cubicweb_francearchives.geomap import (
+    GEOMAP_CACHE_NAME,
+    geomap_etag,
+    geomap_payload,
+    served_markers,
+)
 from cubicweb_francearchives.xy import add_statements_to_graph
 from cubicweb_francearchives.utils import find_card
 from cubicweb_francearchives.entities.cms import Service
 
 from .cwroutes import startup_view_factory
 from .csvutils import alignment_csv, indices_csv
+from .renderer import csv_response
 
 
 LOG = logging.getLogger(__name__)
@@ -160,7 +167,9 @@ def glossary_view(request):
 @view_config(route_name="indices-csv", request_method=("GET", "HEAD"), renderer="csv")
 def indices_csv_view(request):
     auth_type = request.matchdict["type"]
-    return indices_csv(request.cw_request, auth_type)
+    if auth_type not in ("agent", "subject", "location"):
+        raise HTTPNotFound()
+    return csv_response(request, **indices_csv(request.cw_request, auth_type))
 
 
 def card_view(request):
@@ -278,8 +287,9 @@ def findingaid_csv_view(request):
     adapter = entity.cw_adapt_to("entity.main_props")
     data = adapter.properties(export=True, vid="text", text_format="text/plain")
     filename = "%s.csv" % entity.rest_path()
-    request.response.content_disposition = "attachment;filename=" + filename
-    return {"headers": [d[0] for d in data], "rows": [[d[1] for d in data]]}
+    return csv_response(
+        request, [[d[1] for d in data]], headers=[d[0] for d in data], filename=filename
+    )
 
 
 @view_config(route_name="circulars-csv", request_method=("GET", "HEAD"), renderer="csv")
@@ -305,8 +315,9 @@ def authorityrecord_csv_view(request):
     adapter = entity.cw_adapt_to("entity.main_props")
     data = adapter.properties(export=True, vid="text", text_format="text/plain")
     filename = "%s.csv" % entity.record_id
-    request.response.content_disposition = "attachment;filename=" + filename
-    return {"headers": [d[0] for d in data], "rows": [[d[1] for d in data]]}
+    return csv_response(
+        request, [[d[1] for d in data]], headers=[d[0] for d in data], filename=filename
+    )
 
 
 REWRITE_RULES = [
@@ -407,21 +418,38 @@ def famap_view(request):
     return Response(viewsreg.main_template(cwreq, "main-template", rset=None, view=view))
 
 
-@view_config(
-    route_name="fa-map-json", renderer="json", http_cache=600, request_method=("GET", "HEAD")
-)
+@view_config(route_name="fa-map-json", http_cache=600, request_method=("GET", "HEAD"))
 def famap_data(request):
+    """serve the pre-computed geomap (see `fa-compute-geomap` command)
+
+    The ETag is derived from the `Caches` modification date, so that
+    conditional requests do not need to load the markers.
+    """
     cnx = request.cw_request
     res = cnx.execute(
         """
-        Any V WHERE X is Caches, X name "geomap",
+        Any X, MD WHERE X is Caches, X name %(name)s,
         X instance_type %(instance_type)s,
-        X values V""",
-        {"instance_type": cnx.vreg.config.get("instance-type")},
+        X modification_date MD""",
+        {"name": GEOMAP_CACHE_NAME, "instance_type": cnx.vreg.config.get("instance-type")},
+    )
+    if not res:
+        return Response(body=b"[]", content_type="application/json")
+    eid, modification_date = res[0]
+    etag = geomap_etag(eid, modification_date)
+    if etag in request.if_none_match:
+        return HTTPNotModified(etag=etag)
+    data, gzipped = geomap_payload(
+        etag, lambda: served_markers(cnx, res.get_entity(0, 0).values or [])
     )
-    if res:
-        return res[0][0]
-    return []
+    response = Response(content_type="application/json", etag=etag)
+    response.vary = ("Accept-Encoding",)
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        response.body = gzipped
+        response.content_encoding = "gzip"
+    else:
+        response.body = data
+    return response
 
 
 @view_config(context=NoResultError)
@@ -29,13 +29,17 @@
 # knowledge of the CeCILL-C license and that you accept its terms.
 #
 from collections import defaultdict
+import hashlib
+import json
 import logging
 
-from pyramid.httpexceptions import HTTPNotFound
+from pyramid.httpexceptions import HTTPNotFound, HTTPNotModified
 from pyramid.response import Response
 from pyramid.view import view_config
 from geojson import Feature, FeatureCollection, Point
 
+from cubicweb_francearchives.utils import SERVICES_MAP_CACHE, chrome_cache_ttl
+
 LOG = logging.getLogger(__name__)
 
 
@@ -47,7 +51,14 @@ def services_maps_view(request):
     service_eid = cnx.form.get("srv")
     if service_eid:
         return service_data(cnx, service_eid)
-    return services_data(cnx, cnx.form.get("dpt"))
+    dpt = cnx.form.get("dpt")
+    if not isinstance(dpt, str):
+        # dpt must by a string, not a list
+        dpt = ""
+    etag, body = services_map_payload(cnx, dpt.upper())
+    if etag in request.if_none_match:
+        return HTTPNotModified(etag=etag)
+    return Response(body=body, content_type="application/json", etag=etag)
 
 
 def service_data(cnx, service_eid):
@@ -70,8 +81,56 @@ def service_data(cnx, service_eid):
     return []
 
 
+def services_map_payload(cnx, dpt=""):
+    """return the ``(etag, json body)`` of the services map of department
+    `dpt` (all services if empty) in the language of `cnx`
+
+    The payload is cached until a Service, its social networks or its
+    FindingAid / NominaRecord contributions change (see
+    `ServicesMapCacheHook`).
+    """
+
+    def compute():
+        body = json.dumps(services_data(cnx, dpt), separators=(",", ":")).encode("utf-8")
+        return hashlib.sha1(body).hexdigest(), body
+
+    if dpt and dpt not in services_dpt_codes(cnx):
+        # `dpt` comes from the query string, do not let clients fill the cache
+        return compute()
+    return SERVICES_MAP_CACHE.get((cnx.lang, dpt), compute, ttl=chrome_cache_ttl(cnx.vreg.config))
+
+
+def services_dpt_codes(cnx):
+    """return the department codes of the services"""
+
+    def compute():
+        cursor = cnx.system_sql(
+            "SELECT DISTINCT cw_dpt_code FROM cw_service WHERE cw_dpt_code IS NOT NULL"
+        )
+        return frozenset(code for code, in cursor.fetchall())
+
+    return SERVICES_MAP_CACHE.get("dpt-codes", compute, ttl=chrome_cache_ttl(cnx.vreg.config))
+
+
+# geolocated services, with their contributions and social networks
+SERVICES_MAP_QUERY = """
+SELECT s.cw_eid, s.cw_name, s.cw_name2, s.cw_phone_number, s.cw_code_insee_commune,
+       s.cw_email, s.cw_address, s.cw_zip_code, s.cw_city, s.cw_contact_name,
+       s.cw_opening_period, s.cw_annual_closure, s.cw_code, s.cw_website_url,
+       s.cw_level, s.cw_dpt_code, s.cw_mailing_address, s.cw_latitude, s.cw_longitude,
+       EXISTS (SELECT 1 FROM cw_findingaid AS fa WHERE fa.cw_service=s.cw_eid),
+       EXISTS (SELECT 1 FROM cw_nominarecord AS nr WHERE nr.cw_service=s.cw_eid),
+       (SELECT json_agg(json_build_array(sn.cw_name, sn.cw_url) ORDER BY sn.cw_eid)
+        FROM service_social_network_relation AS rel_sn
+          JOIN cw_socialnetwork AS sn ON (sn.cw_eid=rel_sn.eid_to)
+        WHERE rel_sn.eid_from=s.cw_eid)
+FROM cw_service AS s
+WHERE s.cw_latitude IS NOT NULL AND s.cw_longitude IS NOT NULL {restriction}
+ORDER BY s.cw_level, s.cw_name
+"""
+
+
 def services_data(cnx, dpt=None):
-    kwargs = {}
     _ = cnx.__
     overlays = {
         _("level-N"): "N",
@@ -97,47 +156,15 @@ def services_data(cnx, dpt=None):
         },
         "markerInfo": _("services_marker_info"),
     }
-
-    query = (
-        "Any S,SN,SN2,SSN,SPN,SINSEE,SE,SA,SZ,SC,SCC,SU,SOP,SAC,SCODE,"
-        "SWU,SL,SDC,SML,LAT,LONG "
-        "ORDERBY SL,SN "
-        "WHERE S is Service, S name SN, S name2 SN2, S short_name SSN, "
-        "S mailing_address SML, S dpt_code SDC, "
-        "S phone_number SPN, S code_insee_commune SINSEE, S email SE, S address SA, "
-        "S zip_code SZ, S city SC, S contact_name SCC, "
-        "S uuid SU, S opening_period SOP, S annual_closure SAC, S code SCODE, "
-        "S website_url SWU, S level SL, "
-        "S latitude LAT, S longitude LONG, "
-        "NOT S latitude NULL, NOT S longitude NULL"
+    restriction = "AND s.cw_dpt_code=%(dpt)s" if dpt else ""
+    cursor = cnx.system_sql(
+        SERVICES_MAP_QUERY.format(restriction=restriction), {"dpt": dpt.upper() if dpt else None}
     )
-    if dpt:
-        if not isinstance(dpt, str):
-            # dpt must by a string, not a list
-            dpt = ""
-        kwargs = {"dpt": dpt.upper()}
-        query += ", S dpt_code %(dpt)s"
-    rset = cnx.execute(query, kwargs)
-    features = []
-    partner_services = [
-        e[0] for e in cnx.execute("Any X WHERE X is Service, EXISTS(F service X, F is FindingAid)")
-    ]
-    nomina_services = [
-        e[0]
-        for e in cnx.execute("Any X WHERE X is Service, EXISTS(F service X, F is NominaRecord)")
-    ]
-
-    networks = defaultdict(list)
     data = defaultdict(list)
-    for eid, name, url in cnx.execute(
-        """Any S, N, U WHERE S service_social_network SN, SN name N, SN url U"""
-    ):
-        networks[eid].append((name, url))
     for (
         eid,
         SN,
         SN2,
-        SSN,
         SPN,
         SINSEE,
         SE,
@@ -145,7 +172,6 @@ def services_data(cnx, dpt=None):
         SZ,
         SC,
         SCC,
-        SU,
         SOP,
         SAC,
         SCODE,
@@ -155,15 +181,16 @@ def services_data(cnx, dpt=None):
         SML,
         LAT,
         LONG,
-    ) in rset:
+        ead,
+        nomina,
+        networks,
+    ) in cursor.fetchall():
         level = SL.split("level-")[1] if SL else "XX"
         if level == "D":
             name = SN2 or SN
         else:
             name = SN or SN2
         address = " ".join([e for e in (SA, SZ, SC) if e])
-        nomina = eid in nomina_services
-        ead = eid in partner_services
         props = {
             "eid": str(eid),
             "name": name,
@@ -182,7 +209,7 @@ def services_data(cnx, dpt=None):
             "website": SWU,
             "latitude": LAT,
             "longitude": LONG,
-            "service_social_network": networks.get(eid, []),
+            "service_social_network": networks or [],
             "partner": str(int(ead or nomina)),
             "nomina": str(int(nomina)),
             "ead": str(int(ead)),
@@ -33,9 +33,47 @@ import datetime
 from io import StringIO
 
 from pyramid.renderers import JSON
+from pyramid.response import Response
 from cubicweb.uilib import UnicodeCSVWriter
 
 
+CSV_OPTIONS = {"delimiter": ",", "quotechar": '"', "lineterminator": "\n"}
+
+
+def iter_csv(rows, headers=None, encoding="utf-8", csv_options=None, batch_size=1000):
+    """Generate the CSV-encoded `rows`, `batch_size` rows at a time, so that
+    `rows` may be a generator which is never fully loaded in memory"""
+    chunks = []
+    writer = UnicodeCSVWriter(chunks.append, encoding=encoding, **(csv_options or CSV_OPTIONS))
+    if headers:
+        writer.writerow(headers)
+    for idx, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if idx % batch_size == 0:
+            yield "".join(chunks).encode(encoding)
+            chunks.clear()
+    if chunks:
+        yield "".join(chunks).encode(encoding)
+
+
+def csv_response(request, rows, headers=None, filename=None):
+    """Build a response streaming `rows` as CSV with the same content-type
+    as the ``csv`` renderer.
+
+    `rows` is consumed while the response body is sent, i.e. after the
+    request connection has been released.
+    """
+    encoding = request.cw_request.encoding
+    response = Response(
+        app_iter=iter_csv(rows, headers, encoding),
+        content_type="text/comma-separated-values",
+        charset=encoding,
+    )
+    if filename is not None:
+        response.content_disposition = "attachment;filename=" + filename
+    return response
+
+
 class CSVRenderer(object):
     def __init__(self, csv_options=None, encoding=None, **kw):
         self.kw = kw
@@ -43,7 +81,7 @@ class CSVRenderer(object):
         if csv_options:
             self.csv_options = csv_options
         else:
-            self.csv_options = {"delimiter": ",", "quotechar": '"', "lineterminator": "\n"}
+            self.csv_options = CSV_OPTIONS
 
     def __call__(self, info):
         def _render(value, system):
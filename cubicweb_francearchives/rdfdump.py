@@ -47,6 +47,7 @@ from rdflib.graph import ConjunctiveGraph
 from cubicweb.entity import Relation
 
 from cubicweb_francearchives import admincnx
+from cubicweb_francearchives.utils import keyset_rql, rql_chunk_boundaries
 from cubicweb_francearchives.xy import add_statements_to_graph
 from cubicweb_francearchives.storage import S3BfssStorageMixIn
 
@@ -198,18 +199,13 @@ class BaseRDFCacher:
     etype = None
     fetch_all_rql = None
 
-    def build_query(self, query=None):
+    def build_query(self, chunksize, query=None):
+        """return the query fetching `chunksize` entities following the eid
+        given in the `keyset_last` substitution"""
         query = query or self.fetch_all_rql
         if query is None:
             raise NotImplementedError()
-        selection, restrictions = query.split("WHERE")
-        query = query or self.fetch_all_rql
-        selection, restrictions = query.split("WHERE")
-        query = "%s ORDERBY X LIMIT %%s OFFSET %%s WHERE %s" % (
-            selection,
-            restrictions,
-        )
-        return query
+        return keyset_rql(query, chunksize)
 
     def setup_iteration_cache(self, cnx, rset):
         pass
@@ -565,11 +561,11 @@ def add_entity_to_graph(graph, entity):
         add_statements_to_graph(graph, adapter)
 
 
-def _add_etype_to_graph(cnx, graph, etype, limit, offset, logger):
+def _add_etype_to_graph(cnx, graph, etype, limit, last_eid, logger):
     # create
     cacher = CACHER_CLASSES[etype.lower()]()
-    query = cacher.build_query()
-    rset = cnx.execute(query % (limit, offset), build_descr=True)
+    query = cacher.build_query(limit)
+    rset = cnx.execute(query, {"keyset_last": last_eid}, build_descr=True)
     logger.info(f"Write {rset.rowcount} {etype}")
     cacher.setup_iteration_cache(cnx, rset)
     # Construct graph
@@ -578,7 +574,9 @@ def _add_etype_to_graph(cnx, graph, etype, limit, offset, logger):
     cnx.drop_entity_cache()
 
 
-def write_graph(appid, schema, s3, output_dir, formats, etype, limit, offset, chunksize, logger):
+def write_graph(
+    appid, schema, s3, output_dir, formats, etype, limit, offset, last_eid, chunksize, logger
+):
     filenames = []
     with admincnx(appid) as cnx:
         if schema == "published":
@@ -589,7 +587,7 @@ def write_graph(appid, schema, s3, output_dir, formats, etype, limit, offset, ch
             st = FSRDFStorge(output_dir, logger)
         graph = ConjunctiveGraph()
         limit = limit if limit and limit < chunksize else chunksize
-        _add_etype_to_graph(cnx, graph, etype, limit, offset, logger)
+        _add_etype_to_graph(cnx, graph, etype, limit, last_eid, logger)
         for _format in formats:
             filepath = st.get_filepath(etype, offset, _format)
             st.storage.storage_write_file(
@@ -625,6 +623,7 @@ class RDFDumper:
     @timed
     def dump_entities(self, appid, nb_processes, options):
         limit = options.get("limit")
+        chunksize = options.get("chunksize")
         with admincnx(appid) as cnx:
             if self.schema == "published":
                 self.logger.info("Search in published schema")
@@ -638,12 +637,17 @@ class RDFDumper:
                     nb_entities = cnx.execute(f"Any COUNT(X) WHERE X is {self.etype}")[0][0]
             else:
                 nb_entities = int(limit)
+            # each process starts after a given eid instead of an OFFSET
+            # which would make the database scan all previous rows
+            cacher = CACHER_CLASSES[self.etype.lower()]()
+            boundaries = rql_chunk_boundaries(
+                cnx, cacher.fetch_all_rql, chunksize=chunksize, max_rows=nb_entities
+            )
         self.logger.info
         (f"[dump_entities]: Process {nb_entities} {self.etype} with {nb_processes} process")
         filenames = []
         pool = mp.Pool(nb_processes)
         s3storage = options.get("s3")
-        chunksize = options.get("chunksize")
         results = pool.starmap(
             write_graph,
             [
@@ -655,11 +659,12 @@ class RDFDumper:
                     self.formats,
                     self.etype,
                     limit,
-                    offset,
+                    idx * chunksize,
+                    last_eid,
                     chunksize,
                     self.logger,
                 )
-                for offset in range(0, nb_entities, chunksize)
+                for idx, last_eid in enumerate(boundaries)
             ],
         )
         for res in results:
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © LOGILAB S.A. (Paris, FRANCE) 2016-2023
+# Contact http://www.logilab.fr -- mailto:contact@logilab.fr
+#
+# This software is governed by the CeCILL-C license under French law and
+# abiding by the rules of distribution of free software. You can use,
+# modify and/ or redistribute the software under the terms of the CeCILL-C
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# "http://www.cecill.info".
+#
+# As a counterpart to the access to the source code and rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty and the software's author, the holder of the
+# economic rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated
+# with loading, using, modifying and/or developing or reproducing the
+# software by the user in light of its specific status of free software,
+# that may mean that it is complicated to manipulate, and that also
+# therefore means that it is reserved for developers and experienced
+# professionals having in-depth computer knowledge. Users are therefore
+# encouraged to load and test the software's suitability as regards their
+# requirements in conditions enabling the security of their systemsand/or
+# data to be ensured and, more generally, to use and operate it in the
+# same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+#
+"""batch application of the RGAA rules on CMS HTML content (`rgaa` command)"""
+
+# standard library imports
+import difflib
+import multiprocessing as mp
+from collections import defaultdict
+
+# third party imports
+# CubicWeb specific imports
+from cubicweb_elasticsearch import es as cwes
+from cubicweb_varnish.hooks import InvalidateVarnishCacheOp
+
+# library specific imports
+from cubicweb_francearchives import CMS_OBJECTS
+from cubicweb_francearchives.dataimport.esbulk import ESBulkSink
+from cubicweb_francearchives.xmlutils import enhance_accessibility
+
+
+def rgaa_targets(schema):
+    """return the (etype, attribute) couples holding HTML content"""
+    targets = []
+    for etype in CMS_OBJECTS:
+        if "content" in schema.eschema(etype).subjrels:
+            targets.append((etype, "content"))
+    targets.extend(
+        [
+            ("Map", "top_content"),
+            ("Map", "bottom_content"),
+            ("Service", "other"),
+        ]
+    )
+    return targets
+
+
+def rgaa_rows(cnx, targets):
+    """yield (etype, eid, attribute, html) for each non-empty HTML value"""
+    for etype, attr in targets:
+        cu = cnx.system_sql(
+            f"SELECT cw_eid, cw_{attr} FROM cw_{etype} "
+            f"WHERE cw_{attr}_format = 'text/html' AND cw_{attr} IS NOT NULL"
+        )
+        for eid, html in cu.fetchall():
+            yield etype, eid, attr, html
+
+
+def enhance_row(row):
+    """apply RGAA rules on a row built by `rgaa_rows`, extended with the
+    instance base url. Run in worker processes: no connection is available.
+    """
+    etype, eid, attr, html, base_url = row
+    return etype, eid, attr, html, enhance_accessibility(html, None, eid=eid, base_url=base_url)
+
+
+def rgaa_changes(cnx, processes=1, replace_all=False, chunksize=50):
+    """yield (etype, eid, attribute, old html, new html) for each value
+    modified by the RGAA rules (or for each value if `replace_all` is True).
+
+    HTML rewriting is distributed over `processes` worker processes.
+    """
+    base_url = cnx.base_url()
+    rows = (row + (base_url,) for row in rgaa_rows(cnx, rgaa_targets(cnx.vreg.schema)))
+    if processes > 1:
+        pool = mp.Pool(processes)
+        results = pool.imap_unordered(enhance_row, rows, chunksize=chunksize)
+    else:
+        pool = None
+        results = map(enhance_row, rows)
+    try:
+        for etype, eid, attr, old, new in results:
+            if new is None:
+                continue
+            if replace_all or new != old:
+                yield etype, eid, attr, old, new
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+def write_rgaa_batch(cnx, batch):
+    """write `batch` changes with one UPDATE statement per etype and attribute,
+    also bumping the modification date of the entities and scheduling their
+    full text reindexation at commit"""
+    updates = defaultdict(list)
+    for etype, eid, attr, old, new in batch:
+        updates[(etype, attr)].append((new, eid))
+    for (etype, attr), params in updates.items():
+        cnx.cnxset.cu.executemany(
+            f"UPDATE cw_{etype} SET cw_{attr}=%s, cw_modification_date=NOW() WHERE cw_eid=%s",
+            params,
+        )
+    source = cnx.repo.system_source
+    for eid in sorted({change[1] for change in batch}):
+        # cached entities hold the old content
+        cnx.drop_entity_cache(eid)
+        source.index_entity(cnx, cnx.entity_from_eid(eid))
+
+
+def write_rgaa_changes(cnx, changes, batch_size=500):
+    """write `changes` committing every `batch_size` entities.
+
+    Hooks are bypassed (only the modification date and the full text index
+    are updated): call `invalidate_rgaa_changes` with the returned eids once
+    everything is written.
+    """
+    eids = set()
+    batch = []
+    for change in changes:
+        batch.append(change)
+        eids.add(change[1])
+        if len(batch) >= batch_size:
+            write_rgaa_batch(cnx, batch)
+            cnx.commit()
+            batch = []
+    if batch:
+        write_rgaa_batch(cnx, batch)
+        cnx.commit()
+    return eids
+
+
+def rgaa_diff(change):
+    """return the unified diff of a change as a list of lines"""
+    etype, eid, attr, old, new = change
+    # split after each tag to get readable diffs of single line contents
+    old_lines = old.replace(">", ">\n").splitlines()
+    new_lines = new.replace(">", ">\n").splitlines()
+    name = f"{etype} #{eid} {attr}"
+    return list(difflib.unified_diff(old_lines, new_lines, name, name, lineterm=""))
+
+
+def rgaa_es_actions(cnx, eids, index_name):
+    for eid in sorted(eids):
+        entity = cnx.entity_from_eid(eid)
+        serializer = entity.cw_adapt_to("IFullTextIndexSerializable")
+        if serializer is None:
+            continue
+        try:
+            json = serializer.serialize()
+        except Exception:
+            cnx.error("[rgaa] failed to serialize entity %s", eid)
+            continue
+        if json:
+            yield {
+                "_op_type": "index",
+                "_index": index_name,
+                "_type": "_doc",
+                "_id": serializer.es_id,
+                "_source": json,
+            }
+
+
+def invalidate_rgaa_changes(cnx, eids, es_thread_count=1):
+    """purge varnish urls and reindex in elasticsearch the entities modified
+    by `write_rgaa_changes` in a single pass. Return the (indexed, failed)
+    number of elasticsearch documents.
+    """
+    cache_op = InvalidateVarnishCacheOp.get_instance(cnx)
+    indexable = set(cwes.indexable_types(cnx.vreg.schema))
+    es_eids = []
+    for eid in sorted(eids):
+        entity = cnx.entity_from_eid(eid)
+        ivarnish = entity.cw_adapt_to("IVarnish")
+        if ivarnish is not None:
+            for url in ivarnish.urls_to_purge():
+                cache_op.add_data(url)
+        if entity.cw_etype in indexable:
+            es_eids.append(eid)
+    # all urls are banned in a single varnish session
+    cnx.commit()
+    indexer = cnx.vreg["es"].select("indexer", cnx)
+    es = indexer.get_connection()
+    if not es_eids or not es:
+        return 0, 0
+    sink = ESBulkSink(es, cnx, source="rgaa", thread_count=es_thread_count)
+    return sink.send(rgaa_es_actions(cnx, es_eids, indexer.index_name))
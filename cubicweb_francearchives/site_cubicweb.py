@@ -50,6 +50,18 @@ options = (
             "level": 2,
         },
     ),
+    (
+        "chrome-cache-ttl",
+        {
+            "type": "int",
+            "default": 60,
+            "help": "number of seconds during which the menus, footer and hero images "
+            "of the pages (for anonymous users) and the homepage articles are cached "
+            "(0 disables the cache)",
+            "group": "pnia",
+            "level": 2,
+        },
+    ),
     (
         "sitemap-dir",
         {
@@ -70,6 +82,50 @@ options = (
             "level": 2,
         },
     ),
+    (
+        "pdf-text-cache-dir",
+        {
+            "type": "string",
+            "default": "",
+            "help": "directory where the texts extracted from imported pdf files are "
+            "cached (empty disables the cache)",
+            "group": "ir",
+            "level": 2,
+        },
+    ),
+    (
+        "pdf-text-cache-size",
+        {
+            "type": "int",
+            "default": 1024,
+            "help": "maximum size of the pdf text cache in MB (0 means no limit)",
+            "group": "ir",
+            "level": 2,
+        },
+    ),
+    (
+        "pdftotext-timeout",
+        {
+            "type": "int",
+            "default": 120,
+            "help": "number of seconds after which the text extraction of a pdf file "
+            "is aborted (0 means no timeout)",
+            "group": "ir",
+            "level": 2,
+        },
+    ),
+    (
+        "pdftotext-processes",
+        {
+            "type": "int",
+            "default": 2,
+            "help": "number of pdftotext processes extracting the text of the pdf files "
+            "to import while the import workers do database work (only used if "
+            "pdf-text-cache-dir is set)",
+            "group": "ir",
+            "level": 2,
+        },
+    ),
     (
         "ead-services-dir",
         {
@@ -193,6 +249,18 @@ options = (
             "level": 2,
         },
     ),
+    (
+        "es-aggs-cache-ttl",
+        {
+            "type": "int",
+            "default": 600,
+            "help": "number of seconds during which the facets of the searches "
+            "without query text are cached (0 disables the cache). They are also "
+            "invalidated when documents are indexed by the imports and reindex commands",
+            "group": "elasticsearch",
+            "level": 2,
+        },
+    ),
     (
         "sparql_endpoint",
         {
@@ -35,11 +35,11 @@
 import logging
 from io import StringIO
 from datetime import date
-from itertools import count
 
 # third party imports
 # CubicWeb specific imports
 # library specific imports
+from cubicweb_francearchives.utils import iter_rql_chunks
 
 
 SITEMAP_ENTRY = """ <url>
@@ -61,22 +61,12 @@ def iter_execute(req, query, chunksize=100000):
     NOTES: the function doesn't use rql syntax tree and therefore
     relies on ``X`` being the main entity variable.
     """
-    selection, restrictions = query.split(" WHERE ")
-    query = "{} ORDERBY X LIMIT {} WHERE {}, X eid > %(last)s".format(
-        selection, chunksize, restrictions
-    )
-    last_eid = 0
-    for loop_idx in count():
-        req.drop_entity_cache()
+    for loop_idx, rset in enumerate(iter_rql_chunks(req, query, chunksize=chunksize)):
         LOGGER.info(
             "executing %s [%s - %s]", query, loop_idx * chunksize, (loop_idx + 1) * chunksize
         )
-        rset = req.execute(query, {"last": last_eid})
-        if not rset:
-            return
         for entity in rset.entities():
             yield entity
-        last_eid = rset[-1][0]
 
 
 def iter_entities(req):
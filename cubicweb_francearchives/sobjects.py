@@ -143,6 +143,24 @@ class EACImportService(eac.EACImportService):
         source = self._cw.repo.system_source
         if extid2eid is None:
             extid2eid = eac.init_extid2eid_index(self._cw, source)
+        generator = self.external_entities_generator(stream, import_log)
+        generator.check_notice_validity(extid2eid)
+        created, updated, record = self.import_eac_extentities(
+            generator.external_entities(),
+            generator.record,
+            import_log,
+            store,
+            extid2eid,
+            **kwargs
+        )
+        return created, updated, record, generator.not_visited()
+
+    def import_eac_extentities(
+        self, extentities, authority_record, import_log, store, extid2eid, **kwargs
+    ):
+        """import `extentities` produced by an `EACCPFImporter` whose record
+        is `authority_record`, possibly parsed in another process (see
+        `dataimport.eac.parse_eac_file`)"""
         importer = EACOptimizedExtEntitiesImporter(
             self._cw.vreg.schema,
             store,
@@ -151,20 +169,18 @@ class EACImportService(eac.EACImportService):
             etypes_order_hint=dataimport.ETYPES_ORDER_HINT,
             **kwargs
         )
-        generator = self.external_entities_generator(stream, import_log)
-        generator.check_notice_validity(extid2eid)
-        extentities = self.external_entities_stream(generator.external_entities(), extid2eid)
+        extentities = self.external_entities_stream(extentities, extid2eid)
         importer.import_entities(extentities)
-        if generator.record is not None:
-            record_id = generator.record.values["record_id"]
+        if authority_record is not None:
+            record_id = authority_record.values["record_id"]
             store._cnx.execute("DELETE AuthorityRecord X WHERE X record_id %(r)s", {"r": record_id})
             # ES delete operation will be triggerd by cw hook
-            extid = generator.record.extid
+            extid = authority_record.extid
             record_eid = importer.extid2eid[extid]
         else:
             record_eid, record_id = None, None
         record = {"record_id": record_id, "eid": record_eid}
-        return importer.created, importer.updated, record, generator.not_visited()
+        return importer.created, importer.updated, record
 
 
 def registration_callback(vreg):
@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © LOGILAB S.A. (Paris, FRANCE) 2016-2023
+# Contact http://www.logilab.fr -- mailto:contact@logilab.fr
+#
+# This software is governed by the CeCILL-C license under French law and
+# abiding by the rules of distribution of free software. You can use,
+# modify and/ or redistribute the software under the terms of the CeCILL-C
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# "http://www.cecill.info".
+#
+# As a counterpart to the access to the source code and rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty and the software's author, the holder of the
+# economic rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated
+# with loading, using, modifying and/or developing or reproducing the
+# software by the user in light of its specific status of free software,
+# that may mean that it is complicated to manipulate, and that also
+# therefore means that it is reserved for developers and experienced
+# professionals having in-depth computer knowledge. Users are therefore
+# encouraged to load and test the software's suitability as regards their
+# requirements in conditions enabling the security of their systemsand/or
+# data to be ensured and, more generally, to use and operate it in the
+# same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+#
+
+"""statistics used to feed the suggest (autocomplete) elasticsearch index
+
+The `authority_suggest_stats` table stores, for each authority, the number
+of archives (FindingAid and FAComponent) and of site resources (CMS contents
+and Circulars) it is related to. The table is maintained incrementally by
+hooks and imports so that `index-es-suggest` only has to read it.
+
+Deleted authorities are recorded in `authority_suggest_deleted` until
+the next indexing of their type removes them from the index, and
+`authority_suggest_indexing` stores, for each authority type, the date from
+which the changes have not been seen by the last indexing (used by the
+`--delta` mode).
+"""
+
+from cubicweb_francearchives.utils import iter_sql_rows
+
+SUGGEST_AUTHORITIES = (
+    ("LocationAuthority", "cw_locationauthority", "cw_geogname"),
+    ("SubjectAuthority", "cw_subjectauthority", "cw_subject"),
+    ("AgentAuthority", "cw_agentauthority", "cw_agentname"),
+)
+
+# Circular relations targeting Concepts which are `same_as` SubjectAuthorities
+CIRCULAR_CONCEPT_RTYPES = ("business_field", "action", "document_type", "historical_context")
+
+
+def suggest_stats_enabled(cnx):
+    """statistics table is only available on postgres"""
+    return cnx.repo.system_source.dbdriver == "postgres"
+
+
+def create_suggest_stats_table(sql):
+    sql(
+        """
+    CREATE TABLE IF NOT EXISTS authority_suggest_stats (
+    autheid integer PRIMARY KEY NOT NULL,
+    etype varchar(32) NOT NULL,
+    archives integer NOT NULL DEFAULT 0,
+    siteres integer NOT NULL DEFAULT 0,
+    grouped boolean NOT NULL DEFAULT FALSE,
+    modification_date TIMESTAMP WITH TIME ZONE DEFAULT current_timestamp
+    );
+    """
+    )
+    sql(
+        "CREATE INDEX IF NOT EXISTS authority_suggest_stats_mdate_idx "
+        "ON authority_suggest_stats(modification_date)"
+    )
+    sql(
+        """
+    CREATE TABLE IF NOT EXISTS authority_suggest_deleted (
+    autheid integer PRIMARY KEY NOT NULL,
+    etype varchar(32) NOT NULL,
+    deletion_date TIMESTAMP WITH TIME ZONE DEFAULT current_timestamp
+    );
+    """
+    )
+    sql(
+        """
+    CREATE TABLE IF NOT EXISTS authority_suggest_indexing (
+    etype varchar(32) PRIMARY KEY NOT NULL,
+    watermark TIMESTAMP WITH TIME ZONE NOT NULL
+    );
+    """
+    )
+
+
+def _restriction(column, eids):
+    if eids is None:
+        return ""
+    return "WHERE {} = ANY(%(eids)s)".format(column)
+
+
+def suggest_stats_query(etype, authtable, indextable, eids=None):
+    """Build the query computing statistics of authorities of type `etype`.
+
+    Each counter is computed by its own aggregated subquery to avoid the
+    cartesian product of all LEFT OUTER JOINs.
+    """
+    circular_relations = " UNION ALL ".join(
+        "SELECT eid_from, eid_to FROM {}_relation".format(rtype)
+        for rtype in CIRCULAR_CONCEPT_RTYPES
+    )
+    return """
+    SELECT at.cw_eid AS autheid, '{etype}' AS etype,
+           COALESCE(idx.count, 0) AS archives,
+           COALESCE(rel.count, 0) + COALESCE(circ.count, 0) AS siteres,
+           grp.autheid IS NOT NULL AS grouped
+    FROM {authtable} AS at
+      LEFT OUTER JOIN (
+        SELECT it.cw_authority AS autheid, COUNT(DISTINCT rel_index.eid_to) AS count
+        FROM {indextable} AS it
+          JOIN index_relation AS rel_index ON (rel_index.eid_from=it.cw_eid)
+        {it_restriction}
+        GROUP BY it.cw_authority
+      ) AS idx ON (idx.autheid=at.cw_eid)
+      LEFT OUTER JOIN (
+        SELECT rel_auth.eid_to AS autheid, COUNT(DISTINCT rel_auth.eid_from) AS count
+        FROM related_authority_relation AS rel_auth
+        {rel_restriction}
+        GROUP BY rel_auth.eid_to
+      ) AS rel ON (rel.autheid=at.cw_eid)
+      LEFT OUTER JOIN (
+        SELECT sa.eid_from AS autheid, COUNT(DISTINCT circ_rel.eid_from) AS count
+        FROM same_as_relation AS sa
+          JOIN ({circular_relations}) AS circ_rel ON (circ_rel.eid_to=sa.eid_to)
+        {sa_restriction}
+        GROUP BY sa.eid_from
+      ) AS circ ON (circ.autheid=at.cw_eid)
+      LEFT OUTER JOIN (
+        SELECT DISTINCT rel_group.eid_from AS autheid
+        FROM grouped_with_relation AS rel_group
+        {group_restriction}
+      ) AS grp ON (grp.autheid=at.cw_eid)
+    {at_restriction}
+    """.format(
+        etype=etype,
+        authtable=authtable,
+        indextable=indextable,
+        circular_relations=circular_relations,
+        it_restriction=_restriction("it.cw_authority", eids),
+        rel_restriction=_restriction("rel_auth.eid_to", eids),
+        sa_restriction=_restriction("sa.eid_from", eids),
+        group_restriction=_restriction("rel_group.eid_from", eids),
+        at_restriction=_restriction("at.cw_eid", eids),
+    )
+
+
+def refresh_suggest_stats_query(etype, authtable, indextable, eids=None):
+    """Build the query upserting statistics of authorities of type `etype`.
+
+    Existing rows are only updated (and their `modification_date` bumped) if
+    a counter changed.
+    """
+    return """
+    INSERT INTO authority_suggest_stats (autheid, etype, archives, siteres, grouped)
+    {select}
+    ON CONFLICT (autheid) DO UPDATE SET
+      archives=EXCLUDED.archives,
+      siteres=EXCLUDED.siteres,
+      grouped=EXCLUDED.grouped,
+      modification_date=current_timestamp
+    WHERE (authority_suggest_stats.archives,
+           authority_suggest_stats.siteres,
+           authority_suggest_stats.grouped)
+          IS DISTINCT FROM (EXCLUDED.archives, EXCLUDED.siteres, EXCLUDED.grouped)
+    """.format(
+        select=suggest_stats_query(etype, authtable, indextable, eids=eids)
+    )
+
+
+def refresh_suggest_stats(cnx, eids=None, etypes=None):
+    """(Re)compute statistics of authorities `eids`.
+
+    If `eids` is None, statistics of all authorities are recomputed.
+    """
+    if eids is not None:
+        eids = list(eids)
+        if not eids:
+            return
+    for etype, authtable, indextable in SUGGEST_AUTHORITIES:
+        if etypes and etype not in etypes:
+            continue
+        cnx.system_sql(
+            refresh_suggest_stats_query(etype, authtable, indextable, eids=eids),
+            {"eids": eids},
+        )
+
+
+def touch_suggest_stats(cnx, eids):
+    """mark statistics of `eids` as modified (e.g. on authority label change)
+    so that they are pushed by the next delta indexing"""
+    eids = list(eids)
+    if eids:
+        cnx.system_sql(
+            "UPDATE authority_suggest_stats SET modification_date=current_timestamp "
+            "WHERE autheid = ANY(%(eids)s)",
+            {"eids": eids},
+        )
+
+
+def delete_suggest_stats(cnx, eids):
+    """delete statistics of `eids` and record them as deleted so that they
+    are removed from the index by the next indexing"""
+    eids = list(eids)
+    if eids:
+        cnx.system_sql(
+            """
+            WITH deleted AS (
+              DELETE FROM authority_suggest_stats WHERE autheid = ANY(%(eids)s)
+              RETURNING autheid, etype
+            )
+            INSERT INTO authority_suggest_deleted (autheid, etype)
+            SELECT autheid, etype FROM deleted
+            ON CONFLICT (autheid) DO UPDATE SET deletion_date=current_timestamp
+            """,
+            {"eids": eids},
+        )
+
+
+def deleted_authorities(cnx, etype, since=None):
+    """Return eids of authorities of type `etype` deleted since `since`"""
+    query = "SELECT autheid FROM authority_suggest_deleted WHERE etype=%(etype)s"
+    if since is not None:
+        query += " AND deletion_date >= %(since)s"
+    cu = cnx.system_sql(query, {"etype": etype, "since": since})
+    return [autheid for autheid, in cu.fetchall()]
+
+
+def authorities_of_indexes(cnx, index_eids=None, min_eid=None):
+    """Return authorities eids of index entities (Geogname, AgentName and
+    Subject) given by their eids or created after `min_eid`"""
+    if index_eids is not None:
+        index_eids = list(index_eids)
+        if not index_eids:
+            return set()
+        restriction = "cw_eid = ANY(%(eids)s)"
+    else:
+        restriction = "cw_eid > %(min_eid)s"
+    query = " UNION ".join(
+        "SELECT cw_authority FROM {} WHERE {}".format(indextable, restriction)
+        for _, _, indextable in SUGGEST_AUTHORITIES
+    )
+    cu = cnx.system_sql(query, {"eids": index_eids, "min_eid": min_eid})
+    return {autheid for autheid, in cu.fetchall() if autheid is not None}
+
+
+def authorities_of_concepts(cnx, concept_eids):
+    concept_eids = list(concept_eids)
+    if not concept_eids:
+        return set()
+    cu = cnx.system_sql(
+        "SELECT DISTINCT eid_from FROM same_as_relation WHERE eid_to = ANY(%(eids)s)",
+        {"eids": concept_eids},
+    )
+    return {autheid for autheid, in cu.fetchall()}
+
+
+def last_eid(cnx):
+    """Return the last allocated eid, used as a watermark to find entities
+    created by a massive import"""
+    return cnx.system_sql("SELECT last FROM entities_id_seq").fetchone()[0]
+
+
+def indexing_watermark(cnx):
+    """Return the date from which changes may not be seen by an indexing
+    starting now.
+
+    Changes are dated with the start of their transaction: the ones of
+    transactions which are still running will be committed with a date
+    older than now, hence the start of the oldest running transaction.
+    """
+    return cnx.system_sql(
+        "SELECT LEAST(clock_timestamp(), MIN(xact_start)) FROM pg_stat_activity "
+        "WHERE datname = current_database()"
+    ).fetchone()[0]
+
+
+def last_indexing_date(cnx, etype):
+    """Return the watermark of the last completed indexing of `etype`"""
+    cu = cnx.system_sql(
+        "SELECT watermark FROM authority_suggest_indexing WHERE etype=%(etype)s",
+        {"etype": etype},
+    )
+    row = cu.fetchone()
+    return row[0] if row else None
+
+
+def record_indexing(cnx, etypes, watermark):
+    """Record the completed indexing of `etypes` started at `watermark` (see
+    `indexing_watermark`) and forget the deleted authorities it removed"""
+    for etype in etypes:
+        cnx.system_sql(
+            "INSERT INTO authority_suggest_indexing (etype, watermark) "
+            "VALUES (%(etype)s, %(watermark)s) "
+            "ON CONFLICT (etype) DO UPDATE SET watermark=EXCLUDED.watermark",
+            {"etype": etype, "watermark": watermark},
+        )
+    cnx.system_sql(
+        "DELETE FROM authority_suggest_deleted AS d USING authority_suggest_indexing AS i "
+        "WHERE d.etype=i.etype AND d.deletion_date < i.watermark"
+    )
+
+
+def iter_suggest_stats(cnx, etype, authtable, indextable, since=None, itersize=10000):
+    """Yield (eid, label, quality, archives, siteres, grouped) for authorities
+    of type `etype`, using a server-side cursor to bound memory consumption.
+
+    If `since` is given, only authorities whose statistics changed from this
+    date are yielded. Without the statistics table (sqlite), statistics are
+    computed on the fly.
+    """
+    if suggest_stats_enabled(cnx):
+        stats = "SELECT * FROM authority_suggest_stats WHERE etype=%(etype)s"
+        if since is not None:
+            stats += " AND modification_date >= %(since)s"
+    else:
+        stats = suggest_stats_query(etype, authtable, indextable)
+    query = """
+    SELECT s.autheid, at.cw_label, at.cw_quality, s.archives, s.siteres, s.grouped
+    FROM ({stats}) AS s JOIN {authtable} AS at ON (at.cw_eid=s.autheid)
+    """.format(
+        stats=stats, authtable=authtable
+    )
+    return iter_sql_rows(
+        cnx,
+        query,
+        {"etype": etype, "since": since},
+        name="suggest_stats_{}".format(etype.lower()),
+        itersize=itersize,
+    )
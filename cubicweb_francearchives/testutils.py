@@ -314,6 +314,8 @@ class EADImportMixin(S3BfssStorageTestMixin):
         "appid": "data",
         "nodrop": False,
     }
+    # extra arguments given to the massive store
+    store_options = {}
 
     def setUp(self):
         super(EADImportMixin, self).setUp()
@@ -341,7 +343,7 @@ class EADImportMixin(S3BfssStorageTestMixin):
             fk_tables = ead_foreign_key_tables(cnx.vreg.schema)
             with sudocnx(cnx, interactive=False) as su_cnx:
                 disable_triggers(su_cnx, fk_tables)
-        store = create_massive_store(cnx, nodrop=self.readerconfig["nodrop"])
+        store = create_massive_store(cnx, nodrop=self.readerconfig["nodrop"], **self.store_options)
         settings = self.readerconfig.copy()
         settings["appfiles-dir"] = self.config["appfiles-dir"]
         settings.update(custom_settings)
@@ -32,11 +32,16 @@
 """small utility functions"""
 
 
+import logging
 import re
 import os.path as osp
 import string
+import threading
+import time
 import urllib.parse
 from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
 
 from elasticsearch.exceptions import NotFoundError
 from elasticsearch_dsl import Search, query as dsl_query
@@ -46,12 +51,16 @@ from logilab.mtconverter import xml_escape, html_unescape
 from logilab.database import get_db_helper
 from logilab.common.textutils import unormalize
 
+from rql import parse as rql_parse
+
 from cubicweb.uilib import remove_html_tags as cw_remove_html_tags
 
 from cubicweb_francearchives import GLOSSARY_CACHE, INDEX_ETYPE_2_URLSEGMENT
 
 from cubicweb_elasticsearch.es import get_connection
 
+LOGGER = logging.getLogger("francearchives.utils")
+
 
 def remove_html_tags(html):
     html = html.replace("<br>", " ").replace(r"<br\>", " ").replace(r"<br \>", " ")
@@ -469,6 +478,93 @@ def reveal_glossary(req, text, cached=False):
     return regexp.sub(replace_term, text)
 
 
+class VersionedCache(object):
+    """process-level cache stamped with a generation counter.
+
+    Bumping the generation (e.g. from a hook, once the transaction is
+    committed) invalidates all the entries. As other processes (other
+    workers, the consultation instance) are not notified, entries also
+    expire after `ttl` seconds.
+    """
+
+    def __init__(self):
+        self.generation = 0
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def bump(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def get(self, key, compute, ttl=60):
+        """return the value cached for ``key``, call ``compute`` to get it if
+        it is missing or stale. ``ttl=0`` disables the cache"""
+        if not ttl:
+            return compute()
+        now = time.monotonic()
+        entry = self._data.get(key)
+        if entry is not None:
+            generation, timestamp, value = entry
+            if generation == self.generation and now - timestamp < ttl:
+                return value
+        generation = self.generation
+        value = compute()
+        with self._lock:
+            # do not store a value computed while the cache was invalidated
+            if generation == self.generation:
+                self._data[key] = (generation, now, value)
+        return value
+
+
+# menus, footer and hero images of the main template
+CHROME_CACHE = VersionedCache()
+
+
+class LRUCache(object):
+    """thread-safe least recently used cache, bounded by the total size of
+    its values (as computed by `sizeof`)"""
+
+    def __init__(self, maxsize, sizeof=len):
+        self.maxsize = maxsize
+        self.sizeof = sizeof
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def get(self, key, compute):
+        """return the value cached for ``key``, call ``compute`` to get it if
+        it is missing"""
+        with self._lock:
+            try:
+                value, size = self._data[key]
+            except KeyError:
+                pass
+            else:
+                self._data.move_to_end(key)
+                return value
+        value = compute()
+        size = self.sizeof(value)
+        if size > self.maxsize:
+            return value
+        with self._lock:
+            if key not in self._data:
+                self._data[key] = (value, size)
+                self.size += size
+                while self.size > self.maxsize:
+                    _, (_, evicted_size) = self._data.popitem(last=False)
+                    self.size -= evicted_size
+        return value
+
+
 def build_faq_url(req, faq_category):
     return req.build_url("faq#{}".format(faq_category))
 
@@ -501,37 +597,293 @@ def number_of_qualified_authorities(req, auth_etype):
     return search.count()
 
 
+# images of the homepage articles, the first one wins (as in ``entity.image``)
+HP_ARTICLES_IMAGE_RTYPES = (
+    "basecontent_image",
+    "news_image",
+    "externref_image",
+    "commemoration_image",
+    "section_image",
+)
+
+# homepage articles, keyed by (homepage, lang, base url)
+HP_ARTICLES_CACHE = VersionedCache()
+
+
+def chrome_cache_ttl(cwconfig):
+    # the cache is not invalidated when the test database is restored
+    if cwconfig.mode == "test":
+        return 0
+    return cwconfig["chrome-cache-ttl"]
+
+
+# services of the instance, see `services_registry`
+SERVICES_CACHE = VersionedCache()
+
+# json payloads of the services map, keyed by (lang, dpt code) for known
+# department codes, and the department codes of the services
+SERVICES_MAP_CACHE = VersionedCache()
+
+# json aggregations of the searches without query text, see
+# `PniaCWFacetedSearch.execute`
+ES_AGGS_CACHE = LRUCache(16 * 1024 * 1024)
+
+# key of the index generation in the `_meta` of the mapping
+ES_GENERATION_META = "fa_generation"
+
+
+def es_aggs_cache_ttl(cwconfig):
+    # the test indexes are recreated without being reindexed
+    if cwconfig.mode == "test":
+        return 0
+    return cwconfig["es-aggs-cache-ttl"]
+
+
+# generations of the indexes, keyed by index names
+ES_GENERATIONS = VersionedCache()
+
+# number of seconds during which a process reuses the generation of an index
+ES_GENERATION_TTL = 5
+
+
+def index_metas(es, index, **kwargs):
+    """return the `_meta` of the mapping of each concrete index of ``index``"""
+    mappings = es.indices.get_mapping(index=index, ignore_unavailable=True, **kwargs)
+    return {
+        name: (mapping.get("mappings") or {}).get("_meta", {}) for name, mapping in mappings.items()
+    }
+
+
+def es_index_generation(es, index):
+    """return the generation of ``index`` (which may be an alias or a list
+    of indexes), i.e. the timestamp of the last import or reindexing which
+    called `bump_es_index_generation` on it"""
+
+    def compute():
+        # indexes without `_meta` are filtered out
+        metas = index_metas(es, index, filter_path="*.mappings._meta")
+        return tuple(
+            sorted((name, meta.get(ES_GENERATION_META, 0)) for name, meta in metas.items())
+        )
+
+    key = tuple(index) if isinstance(index, list) else index
+    return ES_GENERATIONS.get(key, compute, ttl=ES_GENERATION_TTL)
+
+
+def bump_es_index_generation(es, indexes):
+    """make the documents indexed in ``indexes`` searchable and change
+    their generation, which invalidates the facets cached for them.
+
+    As it refreshes the indexes and updates the cluster state, it must be
+    called once at the end of an import or a reindexing, not for each bulk
+    request."""
+    indexes = sorted(index for index in indexes if index)
+    if not es or not indexes:
+        return
+    generation = time.time_ns()
+    try:
+        es.indices.refresh(index=indexes, ignore_unavailable=True)
+        for name, meta in index_metas(es, indexes).items():
+            meta[ES_GENERATION_META] = generation
+            es.indices.put_mapping(index=name, body={"_meta": meta})
+    except Exception:
+        LOGGER.exception("failed to bump the generation of %s", ", ".join(indexes))
+    ES_GENERATIONS.bump()
+
+
+def search_indexes(cwconfig):
+    """return the names of the indexes queried by the faceted searches"""
+    return [f"{cwconfig['index-name']}_all", cwconfig["nomina-index-name"]]
+
+
+def bump_search_indexes_generation(cwconfig):
+    """call `bump_es_index_generation` on the indexes queried by the faceted
+    searches of the instance"""
+    bump_es_index_generation(get_connection(cwconfig), search_indexes(cwconfig))
+
+
+class ServiceLabelsMixin(object):
+    """labels of a Service, shared by the entity class and `ServiceRecord`"""
+
+    def dc_title(self):
+        if self.level == "level-D":
+            return self.name2 or self.name
+        else:
+            terms = [self.name, self.name2]
+            return " - ".join(t for t in terms if t)
+
+    def publisher(self):
+        publisher = self.short_name or self.name2 or self.name
+        if not publisher and self.code:
+            return self.code.upper()
+        return publisher
+
+
+class ServiceRecord(ServiceLabelsMixin):
+    """connection independent copy of the Service attributes used by the
+    importers and the search views"""
+
+    __slots__ = (
+        "eid",
+        "code",
+        "name",
+        "name2",
+        "short_name",
+        "level",
+        "thumbnail_url",
+        "zip_code",
+        "illustration_path",
+    )
+
+    def __init__(
+        self,
+        eid,
+        code,
+        name,
+        name2,
+        short_name,
+        level,
+        thumbnail_url,
+        zip_code=None,
+        illustration_path=None,
+    ):
+        self.eid = eid
+        self.code = code
+        self.name = name
+        self.name2 = name2
+        self.short_name = short_name
+        self.level = level
+        self.thumbnail_url = thumbnail_url
+        self.zip_code = zip_code
+        # relative download path of the service image, see `illustration_url`
+        self.illustration_path = illustration_path
+
+    def illustration_url(self, req):
+        """same url as the `illustration_url` of the Service entity"""
+        if self.illustration_path:
+            return req.build_url(self.illustration_path)
+
+
+def services_registry(cnx):
+    """return the process-wide registry of services as a
+    ``(services by upper-cased code, services by eid)`` tuple of dicts of
+    `ServiceRecord`.
+
+    It is built by a single query and invalidated by hooks when a Service is
+    modified (see `ServicesCacheHook`)
+    """
+    return SERVICES_CACHE.get(
+        "services", lambda: _services_registry(cnx), ttl=chrome_cache_ttl(cnx.vreg.config)
+    )
+
+
+def _services_registry(cnx):
+    by_code, by_eid = {}, {}
+    rset = cnx.execute(
+        """Any X, C, N, N2, SN, L, TU, Z, FH, FN WHERE X is Service,
+        X code C, X name N, X name2 N2, X short_name SN,
+        X level L, X thumbnail_url TU, X zip_code Z,
+        X service_image I?, I image_file F?, F data_hash FH, F data_name FN"""
+    )
+    for row in rset:
+        data_hash, data_name = row[-2:]
+        illustration_path = None
+        if data_hash and data_name:
+            illustration_path = "file/{}/{}".format(
+                cnx.url_quote(data_hash), cnx.url_quote(data_name)
+            )
+        service = ServiceRecord(*row[:-2], illustration_path=illustration_path)
+        code = service.code
+        if code is not None:
+            code = code.upper()
+        by_code[code] = service
+        by_eid[service.eid] = service
+    return by_code, by_eid
+
+
+def services_short_names(req, eids):
+    """return a dict mapping the given service eids to their short name"""
+    services = services_registry(req)[1]
+    names = {}
+    for eid in eids:
+        try:
+            eid = int(eid)
+        except (TypeError, ValueError):
+            continue
+        if eid in services:
+            names[eid] = services[eid].short_name
+    return names
+
+
+def format_hp_dates(req, etype, start_date, stop_date):
+    """format the dates of a homepage article as ``entity.dates`` does"""
+    if etype == "NewsContent":
+        from cubicweb_francearchives.views import format_date
+
+        dates = [
+            format_date(datetime.strptime(date, "%Y%m%d").date(), req, fmt="d MMMM y")
+            for date in (start_date, stop_date)
+            if date
+        ]
+        if len(dates) == 2 and dates[0] == dates[1]:
+            dates = dates[:1]
+        return "-".join(dates)
+    return " - ".join(date.strip() for date in (start_date, stop_date) if date)
+
+
 def get_hp_articles(req, hp_context):
     """Select articles for Home Page
 
-    We convert year and dates to string rather than in dates because of
+    The assembled articles only depend on the language: they are cached and
+    the cache is invalidated by hooks when an article is (un)published or
+    modified (see `HomepageArticlesCacheHook`)
+    """
+    return HP_ARTICLES_CACHE.get(
+        (hp_context, req.lang, req.base_url()),
+        lambda: _get_hp_articles(req, hp_context),
+        ttl=chrome_cache_ttl(req.vreg.config),
+    )
+
+
+def _get_hp_articles(req, hp_context):
+    """We convert year and dates to string rather than in dates because of
     problems with ExternRef B.C year conversions to dates
 
+    Image and rest path of the articles are fetched by the same query so that
+    no entity is built
     """
     entities = []
+    images_query = "\n       UNION ALL\n".join(
+        "       SELECT eid_to AS eid FROM {}_relation WHERE eid_from=T1.C0".format(rtype)
+        for rtype in HP_ARTICLES_IMAGE_RTYPES
+    )
     sql_query = """
-    SELECT T1.C0, T1.C1, T1.C2, T1.C4, T1.C5, T1.C6 FROM
+    SELECT T1.C0, T1.C1, T1.C2, T1.C4, T1.C5, T1.C6, T1.C7,
+           IMG.description, IMG.file_eid, IMG.data_hash, IMG.data_name FROM
     (SELECT DISTINCT _T0.C0 AS C0, _T0.C1 AS C1, _T0.C2 AS C2, _T0.C3 AS C3, _T0.C4 AS C4,
-     _T0.C5 AS C5, _T0.C6 AS C6
+     _T0.C5 AS C5, _T0.C6 AS C6, _T0.C7 AS C7
       FROM (
        (SELECT bc.cw_eid AS C0,
                TRANSLATE_ENTITY(bc.cw_eid, 'title', %(lang)s) AS C1,
                TRANSLATE_ENTITY(bc.cw_eid, 'header', %(lang)s) AS C2,
                bc.cw_on_homepage_order AS C3,
                bc.cw_content_type AS C4,
-               null AS C5, null AS C6
+               null AS C5, null AS C6,
+               'article/' || bc.cw_eid AS C7
         FROM cw_BaseContent AS bc
         WHERE bc.cw_on_homepage=%(hp_context)s AND NOT (bc.cw_on_homepage_order IS NULL)
       UNION ALL
        SELECT nc.cw_eid AS C0, nc.cw_title AS C1, nc.cw_header AS C2, nc.cw_on_homepage_order AS C3,
               'NewsContent'  AS C4,
-              to_char(cw_start_date, 'YYYYMMDD') AS C5, to_char(cw_stop_date, 'YYYYMMDD') AS C6
+              to_char(cw_start_date, 'YYYYMMDD') AS C5, to_char(cw_stop_date, 'YYYYMMDD') AS C6,
+              'actualite/' || nc.cw_eid AS C7
        FROM cw_NewsContent AS nc
         WHERE nc.cw_on_homepage=%(hp_context)s AND NOT (nc.cw_on_homepage_order IS NULL)
      UNION ALL
        SELECT er.cw_eid AS C0, er.cw_title AS C1, er.cw_header AS C2, er.cw_on_homepage_order AS C3,
               cw_reftype  AS C4,
-              to_char(cw_start_year, '9999') AS C5, to_char(cw_stop_year, '9999') AS C6
+              to_char(cw_start_year, '9999') AS C5, to_char(cw_stop_year, '9999') AS C6,
+              'externref/' || er.cw_uuid AS C7
        FROM cw_ExternRef AS er
         WHERE er.cw_on_homepage=%(hp_context)s AND NOT (er.cw_on_homepage_order IS NULL)
        UNION ALL
@@ -540,7 +892,8 @@ def get_hp_articles(req, hp_context):
               TRANSLATE_ENTITY(ci.cw_eid, 'header', %(lang)s) AS C2,
               ci.cw_on_homepage_order AS C3,
               'CommemorationItem'  AS C4,
-              null AS C5, null AS C6
+              null AS C5, null AS C6,
+              'pages_histoire/' || ci.cw_eid AS C7
        FROM cw_CommemorationItem AS ci
        WHERE ci.cw_on_homepage=%(hp_context)s AND NOT (ci.cw_on_homepage_order IS NULL))
      UNION ALL
@@ -549,35 +902,74 @@ def get_hp_articles(req, hp_context):
               TRANSLATE_ENTITY(sec.cw_eid, 'header', %(lang)s) AS C2,
               sec.cw_on_homepage_order AS C3,
               'Section'  AS C4,
-              null AS C5, null AS C6
+              null AS C5, null AS C6,
+              'section/' || sec.cw_eid AS C7
        FROM cw_Section AS sec
        WHERE sec.cw_on_homepage=%(hp_context)s AND NOT (sec.cw_on_homepage_order IS NULL))
       )
      AS _T0 ORDER BY 4)
-    AS T1 """
-    rset = req.cnx.system_sql(sql_query, {"hp_context": hp_context, "lang": req.lang}).fetchall()
-    for eid, title, header, etype, start_date, stop_date in rset:
-        entity = req.entity_from_eid(eid)
-        image = entity.image
-        default_picto_srcs = (
-            [
-                image.image_file[0].download_url(),
-                req.uiprops["DOCUMENT_IMG"],
-            ]
-            if image
-            else []
-        )
+    AS T1
+    LEFT JOIN LATERAL (
+      SELECT I.description, I.file_eid, F.cw_data_hash AS data_hash,
+             F.cw_data_name AS data_name
+      FROM (
+       SELECT 0 AS priority, i.cw_description AS description, i.cw_image_file AS file_eid
+       FROM cw_Image AS i JOIN (
+{images_query}
+       ) AS rel ON rel.eid=i.cw_eid
+       UNION ALL
+       SELECT 1 AS priority, ci.cw_description AS description, ci.cw_image_file AS file_eid
+       FROM cw_CssImage AS ci JOIN cssimage_of_relation AS rel ON rel.eid_from=ci.cw_eid
+       WHERE rel.eid_to=T1.C0
+      ) AS I JOIN cw_File AS F ON F.cw_eid=I.file_eid
+      ORDER BY I.priority LIMIT 1
+    ) AS IMG ON TRUE
+    ORDER BY T1.C3"""
+    rset = req.cnx.system_sql(
+        sql_query.replace("{images_query}", images_query),
+        {"hp_context": hp_context, "lang": req.lang},
+    ).fetchall()
+    for (
+        eid,
+        title,
+        header,
+        etype,
+        start_date,
+        stop_date,
+        rest_path,
+        image_description,
+        file_eid,
+        data_hash,
+        data_name,
+    ) in rset:
+        image_src = None
+        if file_eid is not None:
+            if data_hash:
+                image_src = req.build_url(
+                    "file/{}/{}".format(req.url_quote(data_hash), req.url_quote(data_name))
+                )
+            else:
+                image_src = (
+                    req.entity_from_eid(file_eid).cw_adapt_to("IDownloadable").download_url()
+                )
         entities.append(
             {
-                "url": entity.absolute_url(),
+                "url": req.build_url(rest_path),
                 "title": title,
                 "plain_title": remove_html_tags(title),
                 "header": header,
-                "dates": entity.dates if start_date or stop_date else None,
+                "dates": (
+                    format_hp_dates(req, etype, start_date, stop_date)
+                    if start_date or stop_date
+                    else None
+                ),
                 "link_title": title_for_link(req, title),
-                "image": image,
+                "image_src": image_src,
+                "image_alt": safe_cut(image_description, 77, remove_html=True),
                 "etype": req._(etype),
-                "default_picto_srcs": ";".join(default_picto_srcs),
+                "default_picto_srcs": (
+                    ";".join([image_src, req.uiprops["DOCUMENT_IMG"]]) if image_src else ""
+                ),
             }
         )
     return entities
@@ -729,3 +1121,138 @@ def delete_from_es_by_eid(cnx, eids, indexes):
                 doc_type="_doc",
                 body={"query": {"match": {"eid": eid}}},
             )
+
+
+# keyset pagination helpers
+#
+# Paging with LIMIT/OFFSET makes the database scan and discard all the rows of
+# the previous pages, so walking N rows costs O(N²). Paging on `eid > last`
+# uses the primary key index and each page costs the same.
+
+
+def keyset_rql(query, chunksize, var="X"):
+    """Rewrite ``query`` to fetch the ``chunksize`` rows following the eid
+    given in the ``keyset_last`` substitution, ordered by ``var`` eid.
+
+    ``var`` must be the first selected variable and ``query`` must not have
+    any ORDERBY or LIMIT clause.
+    """
+    select = _parse_keyset_select(query, var)
+    variable = select.defined_vars[var]
+    select.add_sort_var(variable)
+    select.set_limit(chunksize)
+    select.add_constant_restriction(variable, "eid", "keyset_last", "Substitute", ">")
+    return select.as_string()
+
+
+def _parse_keyset_select(query, var):
+    select = rql_parse(query).children[0]
+    assert (
+        getattr(select.selection[0], "name", None) == var
+    ), "{} must be the first selected term of {}".format(var, query)
+    assert not select.orderby and select.limit is None, "{} is already sorted or limited".format(
+        query
+    )
+    return select
+
+
+def iter_rql_chunks(cnx, query, kwargs=None, chunksize=10000, var="X", last_eid=0, **execute_kw):
+    """Generate result sets of at most ``chunksize`` rows of ``query``, paging
+    on ``var`` eid (see `keyset_rql`).
+
+    Entities of ``var`` are dropped from the entity cache between chunks to
+    limit memory consumption.
+    """
+    query = keyset_rql(query, chunksize, var=var)
+    kwargs = dict(kwargs or {})
+    while True:
+        kwargs["keyset_last"] = last_eid
+        rset = cnx.execute(query, kwargs, **execute_kw)
+        if not rset:
+            return
+        yield rset
+        if len(rset) < chunksize:
+            return
+        last_eid = rset[-1][0]
+        for row in rset.rows:
+            cnx.drop_entity_cache(row[0])
+
+
+def iter_rql_entities(cnx, query, kwargs=None, chunksize=10000, var="X"):
+    """Generate entities selected by ``query`` chunk by chunk.
+
+    Entities are built from the result set, attributes selected by ``query``
+    are thus fetched along with the entities.
+    """
+    for rset in iter_rql_chunks(cnx, query, kwargs, chunksize=chunksize, var=var):
+        yield from rset.entities()
+
+
+def rql_chunk_boundaries(cnx, query, kwargs=None, chunksize=10000, var="X", max_rows=None):
+    """Return the eids after which each chunk of ``chunksize`` rows of
+    ``query`` starts, so that chunks can be processed independently (e.g. by
+    several processes) with `iter_rql_chunks` or `keyset_rql`.
+    """
+    select = _parse_keyset_select(query, var)
+    for term in select.selection[1:]:
+        select.remove_selected(term)
+    query = select.as_string()
+    boundaries, nb_rows, last_eid = [0], 0, None
+    for rset in iter_rql_chunks(
+        cnx, query, kwargs, chunksize=chunksize, var=var, build_descr=False
+    ):
+        if last_eid is not None:
+            # a chunk only starts after `last_eid` if there are rows after it
+            boundaries.append(last_eid)
+        nb_rows += len(rset)
+        if len(rset) < chunksize or (max_rows is not None and nb_rows >= max_rows):
+            break
+        last_eid = rset[-1][0]
+    return boundaries
+
+
+def iter_sql_chunks(cnx, query, args=None, chunksize=10000, key="cw_eid"):
+    """Generate lists of at most ``chunksize`` rows of the SQL ``query``,
+    paging on its ``key`` column (which must be an integer column).
+    """
+    query = (
+        "SELECT * FROM ({query}) AS keyset WHERE keyset.{key} > %(keyset_last)s "
+        "ORDER BY keyset.{key} LIMIT {limit}".format(query=query, key=key, limit=chunksize)
+    )
+    args = dict(args or {})
+    args["keyset_last"] = 0
+    key_index = None
+    while True:
+        cursor = cnx.system_sql(query, args)
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunksize:
+            return
+        if key_index is None:
+            key_index = [column[0] for column in cursor.description].index(key)
+        args["keyset_last"] = rows[-1][key_index]
+
+
+@contextmanager
+def server_side_cursor(cnx, name, itersize=10000):
+    """Open a postgres named cursor fetching rows ``itersize`` at a time"""
+    crs = cnx.cnxset.cnx.cursor(name=name)
+    crs.itersize = itersize
+    try:
+        yield crs
+    finally:
+        crs.close()
+
+
+def iter_sql_rows(cnx, query, args=None, name="francearchives_cursor", itersize=10000):
+    """Generate rows of the SQL ``query`` without loading the whole result
+    in memory. Rows are fetched with a server-side cursor on postgres.
+    """
+    if cnx.repo.system_source.dbdriver != "postgres":
+        yield from cnx.system_sql(query, args).fetchall()
+        return
+    with server_side_cursor(cnx, name, itersize=itersize) as crs:
+        crs.execute(query, args)
+        yield from crs
@@ -60,7 +60,7 @@ from cubicweb_francearchives.views.search.facets import (
     PniaCWFacetedSearch,
     FACET_RENDERERS,
 )
-from cubicweb_francearchives.utils import reveal_glossary
+from cubicweb_francearchives.utils import es_aggs_cache_ttl, reveal_glossary, services_short_names
 
 ETYPES_MAP = {
     "Virtual_exhibit": "ExternRef",
@@ -297,16 +297,7 @@ class PniaElasticSearchView(FaqMixin, PaginationMixin, ElasticSearchView):
         value = self._cw.form.get(f"es_{self.service_facet_name}", None)
         if not isinstance(value, (list, tuple)):
             value = [value]
-        try:
-            return {
-                eid: name
-                for eid, name in self._cw.execute(
-                    """Any X, SN WHERE X is Service, X eid IN (%(s)s), X short_name SN"""
-                    % {"s": ", ".join([str(v) for v in value])},
-                )
-            }
-        except Exception:
-            return {}
+        return services_short_names(self._cw, value)
 
     @cachedproperty
     def xiti_chapters(self):
@@ -799,6 +790,7 @@ class PniaElasticSearchView(FaqMixin, PaginationMixin, ElasticSearchView):
         kwargs["producers"] = self._cw.form.get("producers")
         kwargs["producers_op"] = self._cw.form.get("producers_op")
         kwargs["producers_t"] = self._cw.form.get("producers_t")
+        kwargs["aggs_cache_ttl"] = es_aggs_cache_ttl(self._cw.vreg.config)
         return search_class(
             query_string,
             facet_selections,
@@ -1039,6 +1031,7 @@ class PniaConceptPrimaryView(PniaElasticSearchCirculaires):
         kwargs["fulltext_facet"] = req.form.get("fulltext_facet")
         kwargs["es_date_max"] = self._cw.form.get("es_date_max")
         kwargs["es_date_min"] = self._cw.form.get("es_date_min")
+        kwargs["aggs_cache_ttl"] = es_aggs_cache_ttl(req.vreg.config)
         req.form["restrict_to_single_etype"] = True
         title = entity.dc_title()
         for facet_searched in list(facet_selections.keys()):
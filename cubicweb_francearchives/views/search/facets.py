@@ -29,9 +29,13 @@
 # knowledge of the CeCILL-C license and that you accept its terms.
 #
 
+import hashlib
 import json
+import time
 
+from elasticsearch.exceptions import NotFoundError
 from elasticsearch_dsl import TermsFacet, HistogramFacet, Q, query as dsl_query
+from elasticsearch_dsl.connections import get_connection
 
 from logilab.common.textutils import unormalize
 
@@ -40,6 +44,7 @@ from cubicweb import _, UnknownEid
 from cubicweb_elasticsearch.views import CWFacetedSearch
 
 from cubicweb_francearchives.entities.nomina import nomina_translate_codetype
+from cubicweb_francearchives.utils import ES_AGGS_CACHE, es_index_generation, services_registry
 from cubicweb_francearchives.views import rebuild_url, format_number, get_template
 
 # FIXME - this might end up being configurable by facet
@@ -322,6 +327,54 @@ class PniaCWFacetedSearch(CWFacetedSearch):
             search.query = dsl_query.Bool(must=must_query)
         return search
 
+    def aggs_cache_key(self, es):
+        """return the key of the aggregations of this search in `ES_AGGS_CACHE`"""
+        ttl = self.extra_kwargs.get("aggs_cache_ttl")
+        request = self._s.to_dict()
+        # the hits do not change the aggregations
+        for key in ("from", "size", "sort", "highlight"):
+            request.pop(key, None)
+        digest = hashlib.sha1(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+        return (
+            es_index_generation(es, self._s._index),
+            # entries also expire after `ttl` seconds as the documents indexed
+            # from the web instance do not bump the generation
+            int(time.time() // ttl),
+            self.__class__.__name__,
+            digest,
+        )
+
+    def execute(self):
+        """execute the search. The aggregations of searches without query
+        text are cached in `ES_AGGS_CACHE` until the next indexing of the
+        index (see `bump_es_index_generation`), the hits are then fetched
+        without aggregations."""
+        if self._query or not self.extra_kwargs.get("aggs_cache_ttl"):
+            return super(PniaCWFacetedSearch, self).execute()
+        es = get_connection(self._s._using)
+        try:
+            key = self.aggs_cache_key(es)
+        except NotFoundError:
+            return super(PniaCWFacetedSearch, self).execute()
+        response = None
+
+        def compute_aggregations():
+            nonlocal response
+            response = super(PniaCWFacetedSearch, self).execute()
+            return json.dumps(response.to_dict().get("aggregations", {}))
+
+        aggregations = ES_AGGS_CACHE.get(key, compute_aggregations)
+        if response is not None:
+            return response
+        search = self._s._clone()
+        search.aggs._params = {"aggs": {}}
+        data = es.search(index=search._index, body=search.to_dict(), **search._params)
+        data["aggregations"] = json.loads(aggregations)
+        # the facets are built from the aggregations definitions of `self._s`
+        response = self._s._response_class(self._s, data)
+        response._faceted_search = self
+        return response
+
 
 class PniaFCFacetedSearch(PniaCWFacetedSearch):
     fields = [
@@ -723,17 +776,14 @@ class PniaNominaDocumentTypeRenderer(PniaDefaultFacetRenderer):
 
 class PniaServiceRenderer(PniaDefaultFacetRenderer):
     def render(self, bucket, facetlabel):
-        self.services = {
-            eid: name
-            for eid, name in self.req.execute(
-                """Any X, SN WHERE X is Service,
-                   X short_name SN"""
-            )
-        }
+        self.services = services_registry(self.req)[1]
         return super().render(bucket, facetlabel)
 
     def translate_label(self, tag):
-        return self.services.get(tag, tag)
+        service = self.services.get(tag)
+        if service is None:
+            return tag
+        return service.short_name
 
 
 class PniaAncestorsFacetRenderer(PniaDefaultFacetRenderer):
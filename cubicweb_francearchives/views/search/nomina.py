@@ -39,6 +39,7 @@ from cwtags import tag as T
 from cubicweb import _
 from cubicweb.predicates import match_form_params
 
+from cubicweb_francearchives.utils import es_aggs_cache_ttl
 from cubicweb_francearchives.views import rebuild_url
 
 from cubicweb_francearchives.entities.nomina import nomina_translate_codetype
@@ -65,22 +66,6 @@ class PniaNominaElasticSearchView(PniaElasticSearchView):
     def add_js(self):
         self._cw.add_js("cubes.pnia_search.js")
 
-    @cachedproperty
-    def get_selected_services_names(self):
-        value = self._cw.form.get("es_service", None)
-        if not isinstance(value, (list, tuple)):
-            value = [value]
-        try:
-            return {
-                eid: name
-                for eid, name in self._cw.execute(
-                    """Any X, SN WHERE X is Service, X eid IN (%(s)s), X short_name SN"""
-                    % {"s": ", ".join([str(v) for v in value])},
-                )
-            }
-        except Exception:
-            return {}
-
     def translate_acte_type(self, acte_type):
         return nomina_translate_codetype(self._cw, acte_type)
 
@@ -211,6 +196,7 @@ class PniaNominaElasticSearchView(PniaElasticSearchView):
         for facet in self.text_facets:
             kwargs[facet] = self._cw.form.get(facet)
         kwargs["authority"] = self._cw.form.get("authority")
+        kwargs["aggs_cache_ttl"] = es_aggs_cache_ttl(cwconfig)
         return NominaFacetedSearch(
             query_string, facet_selections, doc_type="_doc", index=index_name, **kwargs
         )[start:stop]
@@ -246,6 +232,15 @@ class PniaNominaElasticSearchView(PniaElasticSearchView):
         rset.req = req
         return rset
 
+    def build_results(self, response):
+        """render the results from the ES hits, without any database query,
+        unless some hits were indexed without the display fields"""
+        hit_view = self._cw.vreg["views"].select("pniasearch-nomina-hit", self._cw)
+        hits = [hit for hit in response if hit.eid]
+        if not all(hit_view.can_render(hit) for hit in hits):
+            return super().build_results(response)
+        return [hit_view.render(es_response=hit) for hit in hits]
+
     def call(self, context=None, **kwargs):
         self.add_js()
         self.add_css()
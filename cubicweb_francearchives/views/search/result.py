@@ -35,13 +35,15 @@ from logilab.mtconverter import xml_escape
 from cwtags import tag as T
 
 from cubicweb import _
-from cubicweb.view import EntityView
-from cubicweb.predicates import is_instance
+from cubicweb.view import EntityView, View
+from cubicweb.predicates import is_instance, none_rset
 from cubicweb.schema import display_name
 
 from cubicweb_francearchives.views import get_template, format_date, blank_link_title
+from cubicweb_francearchives.views.xiti import pagename_from_chapters
 from cubicweb_francearchives.entities import ETYPE_CATEGORIES
-from cubicweb_francearchives.utils import title_for_link, remove_html_tags
+from cubicweb_francearchives.entities.nomina import nomina_translate_codetype
+from cubicweb_francearchives.utils import title_for_link, remove_html_tags, services_registry
 
 
 def clean_properties(properties, entity, req):
@@ -54,11 +56,42 @@ def clean_properties(properties, entity, req):
     return cleaned
 
 
+def search_highlights(req, es_response, max_highlights=3):
+    """return the (highlighted values, label) to display for an ES hit"""
+    highlights = defaultdict(list)
+    highlights_label = None
+    if "highlight" in es_response.meta:
+        for key, values in list(es_response.meta.highlight.to_dict().items()):
+            if key not in ("index_entries.label", "text"):
+                if len(highlights["notice"]) > max_highlights:
+                    continue
+                highlights["notice"].extend(values)
+            else:
+                # there is no point to show the same index string several times
+                if len(highlights[key]) > 1:
+                    continue
+                highlights[key].extend(values)
+            if len(highlights["notice"]) > max_highlights:
+                break
+    highlights_values = []
+    if highlights["notice"]:
+        # only display index or text if no excerpts from other fields are found
+        highlights_values = highlights["notice"][:max_highlights]
+        highlights_label = req._("Notice excerpt:")
+    elif "index_entries.label" in highlights:
+        highlights_values = highlights["index_entries.label"][:max_highlights]
+        highlights_label = req._("Indexed authorities:")
+    elif "text" in highlights:
+        highlights_values = highlights["text"][:max_highlights]
+        highlights_label = req._("Excerpt from attachment:")
+    return highlights_values, highlights_label
+
+
 class PniaTextSearchResultView(EntityView):
     __regid__ = "pniasearch-item"
     template = get_template("searchitem.jinja2")
 
-    def img_src(self, entity):
+    def img_src(self, entity, es_response=None):
         return getattr(entity, "illustration_url", None)
 
     def img_alt(self, entity):
@@ -82,35 +115,12 @@ class PniaTextSearchResultView(EntityView):
         return default_srcs
 
     def template_context(self, entity, es_response, max_highlights=3):
-        highlights = defaultdict(list)
-        highlights_label = None
-        if "highlight" in es_response.meta:
-            for key, values in list(es_response.meta.highlight.to_dict().items()):
-                if key not in ("index_entries.label", "text"):
-                    if len(highlights["notice"]) > max_highlights:
-                        continue
-                    highlights["notice"].extend(values)
-                else:
-                    # there is no point to show the same index string several times
-                    if len(highlights[key]) > 1:
-                        continue
-                    highlights[key].extend(values)
-                if len(highlights["notice"]) > max_highlights:
-                    break
-        highlights_values = []
-        if highlights["notice"]:
-            # only display index or text if no excerpts from other fields are found
-            highlights_values = highlights["notice"][:max_highlights]
-            highlights_label = self._cw._("Notice excerpt:")
-        elif "index_entries.label" in highlights:
-            highlights_values = highlights["index_entries.label"][:max_highlights]
-            highlights_label = self._cw._("Indexed authorities:")
-        elif "text" in highlights:
-            highlights_values = highlights["text"][:max_highlights]
-            highlights_label = self._cw._("Excerpt from attachment:")
+        highlights_values, highlights_label = search_highlights(
+            self._cw, es_response, max_highlights
+        )
         properties = self.properties(entity)
         doc_image = self._cw.uiprops["DOCUMENT_IMG"]
-        illustration_url = self.img_src(entity)
+        illustration_url = self.img_src(entity, es_response)
         illustration = None
         if illustration_url:
             illustration_srcs = self.get_default_picto_srcs(entity, illustration_url, doc_image)
@@ -254,7 +264,7 @@ class FAComponentSearchResultView(PniaTextSearchResultView):
         template_context = super().template_context(
             entity, es_response, max_highlights=max_highlights
         )
-        if entity.iiif_manifest:
+        if self.has_digitized_urls(entity, es_response) and entity.iiif_manifest:
             iiif_logo = {
                 "alt": self._cw._("IIIF Icon"),
                 "src": xml_escape(self._cw.uiprops["IIIF_LOGO"]),
@@ -262,6 +272,27 @@ class FAComponentSearchResultView(PniaTextSearchResultView):
             template_context["iiif_logo"] = iiif_logo
         return template_context
 
+    def has_digitized_urls(self, entity, es_response=None):
+        # digitized urls are precomputed at import time for digitized
+        # documents, do not load the digitized versions of other ones
+        if es_response is not None:
+            if "digitized_urls" in es_response:
+                return bool(es_response.digitized_urls)
+            if getattr(es_response, "digitized", None) is False:
+                return False
+        # documents indexed before digitized urls were precomputed
+        return bool(entity.digitized_urls)
+
+    def img_src(self, entity, es_response=None):
+        # illustration url is precomputed at import time for digitized documents
+        if es_response is not None:
+            if "illustration_url" in es_response:
+                return es_response.illustration_url
+            if getattr(es_response, "digitized", None) is False:
+                return None
+        # documents indexed before illustration urls were precomputed
+        return super().img_src(entity, es_response)
+
     def get_service(self, entity):
         return entity.related_service
 
@@ -397,3 +428,86 @@ class NominaRecordSearchResultView(PniaTextSearchResultView):
             (_("Doctype_label"), _(entity.doctype_type)),
             (_("Document date label"), entity.acte_year),
         ]
+
+
+class NominaHitSearchResultView(View):
+    """render a NominaRecord search result from its Elasticsearch hit only,
+    as `NominaRecordSearchResultView` does from the entity
+
+    The hit must hold the display fields added by
+    `NominaIndexJsonDataSerializable.process_json_data`.
+    """
+
+    __regid__ = "pniasearch-nomina-hit"
+    __select__ = none_rset()
+    template = get_template("searchitem-nominarecord.jinja2")
+    display_fields = ("persons", "doctype", "acte_year")
+
+    @classmethod
+    def can_render(cls, es_response):
+        return all(field in es_response for field in cls.display_fields)
+
+    def publisher(self, service):
+        xiti_site = self._cw.vreg.config["xiti_site"]
+        if not xiti_site or service is None:
+            return {}
+        # same chapters as `ServiceXitiAdapter`
+        chapters = ["Service", service.code or service.zip_code or service.dc_title()]
+        return {
+            "xiti": {
+                "type": "S",
+                "n2": self._cw.vreg.config.get("xiti_n2", ""),
+                "access_site": pagename_from_chapters(chapters + ["site_access"]),
+            }
+        }
+
+    def template_context(self, es_response, max_highlights=0):
+        _ = self._cw._
+        highlights_values, highlights_label = search_highlights(
+            self._cw, es_response, max_highlights
+        )
+        title = _("; ").join(es_response.persons) or _("Unknown")
+        url = self._cw.build_url("basedenoms/{}".format(es_response.stable_id))
+        logo = None
+        service = None
+        if getattr(es_response, "service", None):
+            service = services_registry(self._cw)[1].get(int(es_response.service))
+        if service is not None:
+            logo_src = service.illustration_url(self._cw)
+            if logo_src:
+                logo = {
+                    "src": logo_src,
+                    "srcs": self._cw.uiprops["DOCUMENT_IMG"],
+                    "alt": service.dc_title(),
+                }
+        properties = [
+            (_("Doctype_label"), _(nomina_translate_codetype(self._cw, es_response.doctype))),
+            (_("Document date label"), es_response.acte_year),
+        ]
+        return {
+            "_": _,
+            "document_category": ETYPE_CATEGORIES.get("NominaRecord", "default"),
+            "entity": {
+                "url": xml_escape(url),
+                "link_title": title_for_link(self._cw, title),
+                "alink": '<a href="{}" title="">{}</a>'.format(xml_escape(url), xml_escape(title)),
+                "source_url": getattr(es_response, "source_url", None),
+                "title": title,
+            },
+            "illustration": None,
+            "logo": logo,
+            "response": es_response,
+            "highlights": highlights_values,
+            "highlights_label": highlights_label,
+            "item_properties": {
+                "top": [
+                    (display_name(self._cw, label, context="NominaRecord"), value)
+                    for label, value in properties
+                ],
+                "bottom": [],
+            },
+            "publisher": self.publisher(service),
+        }
+
+    def call(self, es_response=None, **kwargs):
+        self.w(self.template.render(self.template_context(es_response)))
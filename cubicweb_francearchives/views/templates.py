@@ -41,7 +41,13 @@ from cubicweb.utils import HTMLStream, json_dumps, HTMLHead
 from cubicweb.web.views import basetemplates
 
 from cubicweb_francearchives import FEATURE_ADVANCED_SEARCH
-from cubicweb_francearchives.utils import find_card, build_faq_url, reveal_glossary
+from cubicweb_francearchives.utils import (
+    CHROME_CACHE,
+    chrome_cache_ttl,
+    find_card,
+    build_faq_url,
+    reveal_glossary,
+)
 from cubicweb_francearchives.entities import entity2schemaorg, entity2meta, entity2opengraph
 from cubicweb_francearchives.views import (
     JinjaViewMixin,
@@ -114,8 +120,21 @@ class PniaMainTemplate(JinjaViewMixin, basetemplates.TheMainTemplate):
     def portal_config(self):
         return load_portal_config(self._cw.vreg.config)
 
+    def cached_chrome(self, name, compute):
+        """return the ``name`` part of the page chrome (menus, footer, hero
+        images), which is the same for all anonymous users of a language"""
+        req = self._cw
+        if req.session is None or not req.session.anonymous_session:
+            return compute()
+        return CHROME_CACHE.get(
+            (name, req.lang, req.base_url()), compute, ttl=chrome_cache_ttl(req.vreg.config)
+        )
+
     @cachedproperty
     def site_links(self):
+        return self.cached_chrome("site_links", self._site_links)
+
+    def _site_links(self):
         rset = self._cw.execute(
             """ Any X, C, U, LF, LE, LS, LD, O ORDERBY C, O WHERE
             X is SiteLink, X link U, X order O,
@@ -136,12 +155,15 @@ class PniaMainTemplate(JinjaViewMixin, basetemplates.TheMainTemplate):
             )
         return links
 
-    def heroimage_desc(self):
-        res = self._cw.execute(
+    def heroimages(self):
+        return self._cw.execute(
             "Any I, N WHERE  X is CssImage, "
             'X cssid LIKE "hero-%%", X cssid I, '
             "X cssimage_of S, S name N"
         ).rows
+
+    def heroimage_desc(self):
+        res = self.cached_chrome("heroimages", self.heroimages)
         build_url = self._cw.build_url
         if res:
             hcls, section_name = res[randint(0, len(res) - 1)]
@@ -157,11 +179,14 @@ class PniaMainTemplate(JinjaViewMixin, basetemplates.TheMainTemplate):
             "hero_class": hcls,
         }
 
-    def alert(self):
+    def _alert(self):
         alert = find_card(self._cw, "alert")
         if alert is not None and alert.content.strip():
             return alert.content
 
+    def alert(self):
+        return self.cached_chrome("alert", self._alert)
+
     def heroimage(self, view):
         if view and view.__regid__ == "index":
             return {
@@ -210,6 +235,9 @@ class PniaMainTemplate(JinjaViewMixin, basetemplates.TheMainTemplate):
         return True
 
     def top_sections_desc(self):
+        return self.cached_chrome("topsections", self._top_sections_desc)
+
+    def _top_sections_desc(self):
         cnx = self._cw
         topsections = top_sections_desc(self._cw)
         # add quick links
@@ -236,13 +264,17 @@ class PniaMainTemplate(JinjaViewMixin, basetemplates.TheMainTemplate):
             topsections.append((title.upper(), label, name, name, desc or "", children))
         return topsections
 
-    def template_context(self, view):
+    def search_labels(self):
         archives_label = self._cw._("###in archives###")
         siteres_label = self._cw._("###site resources###")
-        lang = self._cw.lang
-        if lang == "fr":
+        if self._cw.lang == "fr":
             archives_label = reveal_glossary(self._cw, archives_label)
             siteres_label = reveal_glossary(self._cw, siteres_label, cached=True)
+        return archives_label, siteres_label
+
+    def template_context(self, view):
+        archives_label, siteres_label = self.cached_chrome("search_labels", self.search_labels)
+        lang = self._cw.lang
         heroimage = self.heroimage(view)
         ctx = {
             "header_row": None,
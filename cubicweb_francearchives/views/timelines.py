@@ -135,7 +135,8 @@ class CommemorationTimelineJsonDataView(EntityView):
                 '<div><a href="%(href)s" target="_blank" title="%(title)s" '
                 'rel="nofollow noopener noreferrer">%(label)s</div>'
             ) % {
-                "href": self._cw.entity_from_eid(eid).absolute_url(),
+                # same url as CommemorationItem.absolute_url(), without loading the entity
+                "href": self._cw.build_url("pages_histoire/{}".format(eid)),
                 "title": self.title_for_link(label),
                 "label": label,
             }
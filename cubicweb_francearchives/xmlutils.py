@@ -39,7 +39,7 @@ import logging
 
 import re
 
-from cubicweb_francearchives.utils import remove_html_tags
+from cubicweb_francearchives.utils import LRUCache, remove_html_tags
 
 
 def to_unicode(el):
@@ -119,8 +119,10 @@ def fix_links(root, cnx, *args, **kwargs):
 
     also clean wrong internal urls
 
+    `base_url` may be given as keyword argument when no connection is
+    available (e.g. in worker processes of the `rgaa` command)
     """
-    base_url = cnx.base_url()
+    base_url = kwargs.get("base_url") or cnx.base_url()
     for node in root.xpath("//a"):
         attribs = node.attrib
         # remove empty title
@@ -298,14 +300,37 @@ def format_html(html, text_format="text/html"):
     return None
 
 
-def process_html(cnx, html, text_format="text/html", labels=None):
-    if html:
-        processed = fix_fa_external_links(html, cnx, labels)
-        if processed:
-            return format_html(processed, text_format)
+# results of `process_html`, bounded to about 32M characters
+PROCESS_HTML_CACHE = LRUCache(32 * 1024 * 1024, sizeof=lambda html: len(html or "") + 100)
+
+
+def _process_html(cnx, html, text_format="text/html", labels=None):
+    processed = fix_fa_external_links(html, cnx, labels)
+    if processed:
+        return format_html(processed, text_format)
     return html
 
 
+def process_html(cnx, html, text_format="text/html", labels=None):
+    """fix links and labels of a finding aid rich field.
+
+    Results are cached on a hash of the html, the language (labels are
+    translated) and the base url (used to detect external links).
+    """
+    if not html:
+        return html
+    key = (
+        hashlib.sha1(html.encode("utf-8")).hexdigest(),
+        text_format,
+        tuple(labels or ()),
+        cnx.lang,
+        cnx.base_url(),
+    )
+    return PROCESS_HTML_CACHE.get(
+        key, lambda: _process_html(cnx, html, text_format=text_format, labels=labels)
+    )
+
+
 def insert_link_to_text(root, cnx, *args, **kwargs):
     """Insert a@href before the a text
 
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © LOGILAB S.A. (Paris, FRANCE) 2016-2023
+# Contact http://www.logilab.fr -- mailto:contact@logilab.fr
+#
+# This software is governed by the CeCILL-C license under French law and
+# abiding by the rules of distribution of free software. You can use,
+# modify and/ or redistribute the software under the terms of the CeCILL-C
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# "http://www.cecill.info".
+#
+# As a counterpart to the access to the source code and rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty and the software's author, the holder of the
+# economic rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated
+# with loading, using, modifying and/or developing or reproducing the
+# software by the user in light of its specific status of free software,
+# that may mean that it is complicated to manipulate, and that also
+# therefore means that it is reserved for developers and experienced
+# professionals having in-depth computer knowledge. Users are therefore
+# encouraged to load and test the software's suitability as regards their
+# requirements in conditions enabling the security of their systemsand/or
+# data to be ensured and, more generally, to use and operate it in the
+# same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+"""Compare the cost of converting the rich fields of EAD files to html with
+the XSLT and with `cubicweb_francearchives.dataimport.eadreader.html_content`
+(which bypasses the XSLT for plain rich nodes).
+
+usage: python test/bench_ead_rich_fields.py [eadfile ...]
+
+The EAD files of test/data are used by default. Durations are given per
+field, for all the nodes of the files.
+"""
+import glob
+import os.path as osp
+import sys
+import time
+from collections import defaultdict
+
+from lxml import etree
+
+# importing devtools ensures CW's adjust_sys_path is called
+# before importing cube
+from cubicweb import devtools  # noqa
+
+from cubicweb_francearchives.dataimport import eadreader
+
+
+def rich_nodes(filepaths):
+    nodes = defaultdict(list)
+    for filepath in filepaths:
+        try:
+            tree = etree.parse(filepath)
+        except etree.XMLSyntaxError:
+            continue
+        for node in tree.iter(*eadreader.PLAIN_RICH_TAGS):
+            nodes[node.tag].append(node)
+    return nodes
+
+
+def timeit(func, nodes):
+    start = time.perf_counter()
+    for node in nodes:
+        func(node)
+    return time.perf_counter() - start
+
+
+def xslt_content(node):
+    return eadreader.raw_content(eadreader.html_formatter(node))
+
+
+def run(filepaths):
+    nodes = rich_nodes(filepaths)
+    print(
+        "{:>18} {:>8} {:>8} {:>10} {:>10} {:>8}".format(
+            "field", "nodes", "plain", "xslt (s)", "fast (s)", "speedup"
+        )
+    )
+    for tag, tag_nodes in sorted(nodes.items()):
+        xslt_duration = timeit(xslt_content, tag_nodes)
+        fast_duration = timeit(eadreader.html_content, tag_nodes)
+        print(
+            "{:>18} {:>8} {:>8} {:>10.3f} {:>10.3f} {:>8.1f}".format(
+                tag,
+                len(tag_nodes),
+                sum(1 for node in tag_nodes if eadreader.is_plain_rich_node(node)),
+                xslt_duration,
+                fast_duration,
+                xslt_duration / fast_duration if fast_duration else 0,
+            )
+        )
+
+
+if __name__ == "__main__":
+    filepaths = sys.argv[1:] or glob.glob(
+        osp.join(osp.dirname(__file__), "data", "**", "*.xml"), recursive=True
+    )
+    run(filepaths)
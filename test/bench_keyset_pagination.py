@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © LOGILAB S.A. (Paris, FRANCE) 2016-2023
+# Contact http://www.logilab.fr -- mailto:contact@logilab.fr
+#
+# This software is governed by the CeCILL-C license under French law and
+# abiding by the rules of distribution of free software. You can use,
+# modify and/ or redistribute the software under the terms of the CeCILL-C
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# "http://www.cecill.info".
+#
+# As a counterpart to the access to the source code and rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty and the software's author, the holder of the
+# economic rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated
+# with loading, using, modifying and/or developing or reproducing the
+# software by the user in light of its specific status of free software,
+# that may mean that it is complicated to manipulate, and that also
+# therefore means that it is reserved for developers and experienced
+# professionals having in-depth computer knowledge. Users are therefore
+# encouraged to load and test the software's suitability as regards their
+# requirements in conditions enabling the security of their systemsand/or
+# data to be ensured and, more generally, to use and operate it in the
+# same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+#
+"""Compare the cost of walking a table with LIMIT/OFFSET and with keyset
+pagination (see `cubicweb_francearchives.utils.iter_sql_chunks`).
+
+usage: python test/bench_keyset_pagination.py <appid> [rows] [chunksize]
+
+A temporary table of `rows`, `2 * rows` and `4 * rows` rows is walked with
+both methods: the OFFSET walk time grows quadratically with the number of
+rows whereas the keyset walk time grows linearly.
+"""
+import sys
+import time
+
+from cubicweb_francearchives import admincnx
+from cubicweb_francearchives.utils import iter_sql_chunks
+
+
+def offset_walk(cnx, nb_rows, chunksize):
+    for offset in range(0, nb_rows, chunksize):
+        cnx.system_sql(
+            "SELECT cw_eid FROM bench_keyset ORDER BY cw_eid LIMIT %(l)s OFFSET %(o)s",
+            {"l": chunksize, "o": offset},
+        ).fetchall()
+
+
+def keyset_walk(cnx, nb_rows, chunksize):
+    for _ in iter_sql_chunks(cnx, "SELECT cw_eid FROM bench_keyset", chunksize=chunksize):
+        pass
+
+
+def timeit(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def run(appid, rows=100000, chunksize=1000):
+    with admincnx(appid) as cnx:
+        print("{:>10} {:>12} {:>12}".format("rows", "offset (s)", "keyset (s)"))
+        for nb_rows in (rows, 2 * rows, 4 * rows):
+            cnx.system_sql("DROP TABLE IF EXISTS bench_keyset")
+            cnx.system_sql(
+                "CREATE TEMPORARY TABLE bench_keyset AS "
+                "SELECT i AS cw_eid FROM generate_series(1, %(n)s) AS i",
+                {"n": nb_rows},
+            )
+            cnx.system_sql("ALTER TABLE bench_keyset ADD PRIMARY KEY (cw_eid)")
+            cnx.system_sql("ANALYZE bench_keyset")
+            print(
+                "{:>10} {:>12.3f} {:>12.3f}".format(
+                    nb_rows,
+                    timeit(offset_walk, cnx, nb_rows, chunksize),
+                    timeit(keyset_walk, cnx, nb_rows, chunksize),
+                )
+            )
+        cnx.rollback()
+
+
+if __name__ == "__main__":
+    run(sys.argv[1], *(int(arg) for arg in sys.argv[2:4]))
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © LOGILAB S.A. (Paris, FRANCE) 2016-2023
+# Contact http://www.logilab.fr -- mailto:contact@logilab.fr
+#
+# This software is governed by the CeCILL-C license under French law and
+# abiding by the rules of distribution of free software. You can use,
+# modify and/ or redistribute the software under the terms of the CeCILL-C
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# "http://www.cecill.info".
+#
+# As a counterpart to the access to the source code and rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty and the software's author, the holder of the
+# economic rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated
+# with loading, using, modifying and/or developing or reproducing the
+# software by the user in light of its specific status of free software,
+# that may mean that it is complicated to manipulate, and that also
+# therefore means that it is reserved for developers and experienced
+# professionals having in-depth computer knowledge. Users are therefore
+# encouraged to load and test the software's suitability as regards their
+# requirements in conditions enabling the security of their systemsand/or
+# data to be ensured and, more generally, to use and operate it in the
+# same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+#
+"""Compare the cost of serializing NominaRecord for the nomina index one
+record at a time and by chunks (see
+`cubicweb_francearchives.entities.nomina.serialize_nomina_records`).
+
+usage: python test/bench_nomina_serialization.py <appid> [rows] [chunksize]
+
+`rows` synthetic records (100000 by default) are inserted in the database of
+the instance, serialized with `INominaIndexSerializable.serialize` and with
+`serialize_nomina_records`, then rolled back.
+"""
+import sys
+import time
+
+from cubicweb.dataimport.stores import NoHookRQLObjectStore
+
+from cubicweb_francearchives import admincnx
+from cubicweb_francearchives.entities import nomina
+
+ACTE_TYPES = ("RM", "N", "MA", "D", "Mort 14-18", "PER", None)
+
+
+def synthetic_json_data(idx):
+    return {
+        "c": {"c": f"1R {idx % 500}", "n": str(idx), "o": ["laboureur"]},
+        "e": {
+            "N": [{"d": {"y": str(1850 + idx % 50)}, "l": {"d": "Landes", "p": "Arue"}}],
+            "RM": [{"d": {"y": str(1870 + idx % 50)}, "l": {"c": "France", "d": "Landes"}}],
+        },
+        "p": [{"f": f"Jean{idx % 1000}", "n": f"Dupont{idx % 997}"}],
+        "t": ACTE_TYPES[idx % len(ACTE_TYPES)],
+        "u": f"http://www.example.org/ark:/00000/{idx}",
+    }
+
+
+def create_records(cnx, nb_rows):
+    store = NoHookRQLObjectStore(cnx)
+    service = store.prepare_insert_entity(
+        "Service", category="bench", name="Bench", short_name="Bench", code="FRBENCH"
+    )
+    agents = [
+        store.prepare_insert_entity("AgentAuthority", label=f"Agent {idx}") for idx in range(100)
+    ]
+    eids = []
+    for idx in range(nb_rows):
+        eid = store.prepare_insert_entity(
+            "NominaRecord",
+            stable_id=f"bench-nomina-{idx}",
+            oai_id=str(idx),
+            json_data=synthetic_json_data(idx),
+            service=service,
+        )
+        if idx % 3 == 0:
+            store.prepare_insert_relation(eid, "same_as", agents[idx % len(agents)])
+        eids.append(eid)
+    store.flush()
+    return eids
+
+
+def serialize_per_record(cnx, eids, chunksize):
+    for idx in range(0, len(eids), chunksize):
+        for eid in eids[idx : idx + chunksize]:
+            cnx.entity_from_eid(eid).cw_adapt_to("INominaIndexSerializable").serialize()
+        cnx.drop_entity_cache()
+
+
+def serialize_by_chunks(cnx, eids, chunksize):
+    for idx in range(0, len(eids), chunksize):
+        nomina.serialize_nomina_records(cnx, eids[idx : idx + chunksize])
+
+
+def timeit(func, *args):
+    nomina.NOMINA_CODETYPE_LABELS.clear()
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def run(appid, rows=100000, chunksize=1000):
+    with admincnx(appid) as cnx:
+        eids = create_records(cnx, rows)
+        print("{:>10} {:>16} {:>16}".format("rows", "per record (s)", "by chunks (s)"))
+        print(
+            "{:>10} {:>16.3f} {:>16.3f}".format(
+                rows,
+                timeit(serialize_per_record, cnx, eids, chunksize),
+                timeit(serialize_by_chunks, cnx, eids, chunksize),
+            )
+        )
+        cnx.rollback()
+
+
+if __name__ == "__main__":
+    run(sys.argv[1], *(int(arg) for arg in sys.argv[2:4]))
@@ -31,6 +31,7 @@
 import unittest
 
 from cubicweb.devtools.testlib import CubicWebTC
+from cubicweb_francearchives import suggest
 from cubicweb_francearchives.testutils import (
     PostgresTextMixin,
     EADImportMixin,
@@ -304,6 +305,41 @@ class AuthoritiesHookTests(PostgresTextMixin, EADImportMixin, CubicWebTC):
                 )
                 cnx.commit()
 
+    def test_suggest_stats(self):
+        """authorities suggest statistics are maintained by hooks"""
+
+        def stats(cnx, autheid):
+            return cnx.system_sql(
+                "SELECT archives, siteres, grouped FROM authority_suggest_stats "
+                "WHERE autheid=%(e)s",
+                {"e": autheid},
+            ).fetchone()
+
+        with self.admin_access.cnx() as cnx:
+            ce = cnx.create_entity
+            loc1 = ce("LocationAuthority", label="location 1")
+            loc2 = ce("LocationAuthority", label="location 2")
+            cnx.commit()
+            self.assertEqual(stats(cnx, loc1.eid), (0, 0, False))
+            fa1 = create_findingaid(cnx, "eadid1", self.service)
+            ce("Geogname", label="index location 1", index=fa1, authority=loc1)
+            fa2 = create_findingaid(cnx, "eadid2", self.service)
+            ce("Geogname", label="index location 2", index=fa2, authority=loc2)
+            ce("BaseContent", title="article", related_authority=loc2)
+            cnx.commit()
+            self.assertEqual(stats(cnx, loc1.eid), (1, 0, False))
+            self.assertEqual(stats(cnx, loc2.eid), (1, 1, False))
+            loc1.group([loc2.eid])
+            self.assertEqual(stats(cnx, loc1.eid), (2, 1, False))
+            self.assertEqual(stats(cnx, loc2.eid), (0, 0, True))
+            cnx.transaction_data["delete-orphans"] = True
+            cnx.execute("DELETE LocationAuthority X WHERE X eid %(e)s", {"e": loc2.eid})
+            cnx.commit()
+            self.assertIsNone(stats(cnx, loc2.eid))
+            # deleted authorities are removed from the suggest index by the
+            # next delta indexing
+            self.assertIn(loc2.eid, suggest.deleted_authorities(cnx, "LocationAuthority"))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -28,6 +28,8 @@
 # The fact that you are presently reading this means that you have had
 # knowledge of the CeCILL-C license and that you accept its terms.
 #
+import glob
+import os.path as osp
 import unittest
 
 from lxml import etree
@@ -268,5 +270,59 @@ CHAN.</p>
         self.assertUnnest(ead_source, expected_output)
 
 
+class PlainRichContentTests(unittest.TestCase):
+    """the fast path of `eadreader.html_content` must produce the same output
+    as the XSLT"""
+
+    def assertSameAsXSLT(self, node):
+        self.assertTrue(eadreader.is_plain_rich_node(node))
+        self.assertEqual(
+            eadreader.raw_content(eadreader.html_formatter(node)),
+            eadreader.plain_rich_content(node),
+        )
+
+    def test_plain_rich_content(self):
+        for ead_source in (
+            "<scopecontent/>",
+            "<acqinfo>plain text \u00e9</acqinfo>",
+            "<scopecontent><head>Title</head></scopecontent>",
+            "<scopecontent><head>Title</head><p/></scopecontent>",
+            "<scopecontent><head>Title</head><p> </p></scopecontent>",
+            "<odd><p>text</p><head>Title</head></odd>",
+            '<bioghist type="x">\n<head>\u00c9t\u00e9</head>\n'
+            "<p>a&#13;b &amp; &lt;c&gt;</p><p/></bioghist>",
+            '<scopecontent><p audience="internal">\u00a0\u2019 \U0001f600</p>tail</scopecontent>',
+        ):
+            with self.subTest(ead_source=ead_source):
+                self.assertSameAsXSLT(etree.fromstring(ead_source))
+
+    def test_not_plain_rich_nodes(self):
+        for ead_source in (
+            '<scopecontent id="sc1"><p>text</p></scopecontent>',
+            '<scopecontent label="Content"><p>text</p></scopecontent>',
+            '<scopecontent><p label="Content">text</p></scopecontent>',
+            "<scopecontent><p>Hello <lb/> world</p></scopecontent>",
+            "<scopecontent><p>text</p><!-- comment --></scopecontent>",
+            "<scopecontent><list><item>item</item></list></scopecontent>",
+            "<bibliography><head>Title</head><p>text</p></bibliography>",
+            "<unittitle>text</unittitle>",
+        ):
+            with self.subTest(ead_source=ead_source):
+                self.assertFalse(eadreader.is_plain_rich_node(etree.fromstring(ead_source)))
+
+    def test_plain_rich_content_corpus(self):
+        """all plain rich nodes of the test EAD files"""
+        datadir = osp.join(osp.dirname(__file__), "data")
+        for filepath in sorted(glob.glob(osp.join(datadir, "**", "*.xml"), recursive=True)):
+            try:
+                tree = etree.parse(filepath)
+            except etree.XMLSyntaxError:
+                continue
+            for node in tree.iter(*eadreader.PLAIN_RICH_TAGS):
+                if eadreader.is_plain_rich_node(node):
+                    with self.subTest(filepath=filepath, line=node.sourceline):
+                        self.assertSameAsXSLT(node)
+
+
 if __name__ == "__main__":
     unittest.main()
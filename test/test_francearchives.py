@@ -52,9 +52,16 @@ uncomment code below if you want to activate automatic test for your cube:
             return ('some', 'startup', 'views')
 """
 
+import datetime
+
+from mock import patch
+
+from cubicweb import Binary
 from cubicweb.devtools.testlib import CubicWebTC
+from cubicweb.server.session import Connection
 
 from cubicweb_francearchives.testutils import PostgresTextMixin
+from cubicweb_francearchives.utils import CHROME_CACHE, HP_ARTICLES_CACHE, get_hp_articles
 
 from pgfixtures import setup_module, teardown_module  # noqa
 
@@ -79,6 +86,89 @@ class FranceArchivesViewsTC(PostgresTextMixin, CubicWebTC):
         with self.new_access("anon").web_request() as req:
             self.view("index", req=req)
 
+    def count_index_queries(self):
+        with patch.object(
+            Connection, "execute", autospec=True, side_effect=Connection.execute
+        ) as execute:
+            with self.new_access("anon").web_request() as req:
+                html = self.view("index", req=req)
+            return execute.call_count, html
+
+    @patch("cubicweb_francearchives.views.templates.chrome_cache_ttl", return_value=60)
+    def test_chrome_cache(self, ttl):
+        """
+        Trying: render the homepage several times as anonymous
+        Expecting: menus, footer and hero images are only queried once, until a
+                   SiteLink is created
+        """
+        CHROME_CACHE.bump()
+        self.addCleanup(CHROME_CACHE.bump)
+        nocache, _ = self.count_index_queries()
+        cached, _ = self.count_index_queries()
+        self.assertLess(cached, nocache)
+        with self.admin_access.cnx() as cnx:
+            cnx.create_entity(
+                "SiteLink",
+                link="https://www.culture.gouv.fr",
+                label_fr="Ministère de la Culture",
+                context="footer_links",
+                order=0,
+            )
+            cnx.commit()
+        queries, html = self.count_index_queries()
+        self.assertGreater(queries, cached)
+        self.assertIn(b"https://www.culture.gouv.fr", html)
+
+    @patch("cubicweb_francearchives.utils.chrome_cache_ttl", return_value=60)
+    def test_hp_articles(self, ttl):
+        """
+        Trying: put a NewsContent with an image on the homepage, then change its title
+        Expecting: articles are built from a single query, url and image
+                   are the ones of the entities and the cache is invalidated
+                   by the title modification
+        """
+        HP_ARTICLES_CACHE.bump()
+        self.addCleanup(HP_ARTICLES_CACHE.bump)
+        with self.admin_access.cnx() as cnx:
+            ce = cnx.create_entity
+            image = ce(
+                "Image",
+                description="<p>alt</p>",
+                image_file=ce(
+                    "File",
+                    data=Binary(b"some-image-data"),
+                    data_name="image-name.png",
+                    data_format="image/png",
+                ),
+            )
+            news = ce(
+                "NewsContent",
+                title="news",
+                start_date=datetime.date(2015, 10, 12),
+                on_homepage="onhp_hp",
+                on_homepage_order=0,
+                news_image=image,
+            )
+            cnx.commit()
+        with self.new_access("anon").web_request() as req:
+            articles = get_hp_articles(req, "onhp_hp")
+            self.assertEqual(len(articles), 1)
+            news = req.entity_from_eid(news.eid)
+            self.assertEqual(articles[0]["url"], news.absolute_url())
+            self.assertEqual(
+                articles[0]["image_src"],
+                news.image.image_file[0].cw_adapt_to("IDownloadable").download_url(),
+            )
+            self.assertEqual(articles[0]["image_alt"], "alt")
+            self.assertEqual(articles[0]["dates"], news.dates)
+            self.assertIs(get_hp_articles(req, "onhp_hp"), articles)
+        with self.admin_access.cnx() as cnx:
+            cnx.entity_from_eid(news.eid).cw_set(title="other news")
+            cnx.commit()
+        with self.new_access("anon").web_request() as req:
+            articles = get_hp_articles(req, "onhp_hp")
+            self.assertEqual(articles[0]["title"], "other news")
+
 
 if __name__ == "__main__":
     from logilab.common.testlib import unittest_main
@@ -33,7 +33,8 @@ import unittest
 
 from cubicweb import Unauthorized, Binary
 from cubicweb.devtools import testlib
-from cubicweb_francearchives.testutils import S3BfssStorageTestMixin
+from cubicweb_francearchives import rgaa
+from cubicweb_francearchives.testutils import PostgresTextMixin, S3BfssStorageTestMixin
 
 
 class HookTests(S3BfssStorageTestMixin, testlib.CubicWebTC):
@@ -98,5 +99,43 @@ class HookTests(S3BfssStorageTestMixin, testlib.CubicWebTC):
             self.assertEqual(map.bottom_content, new_bottom)
 
 
+class RGAABatchTests(PostgresTextMixin, testlib.CubicWebTC):
+    def test_rgaa_batch(self):
+        """
+        Trying: bypass the rgaa hook to store a content breaking the RGAA rules
+        Expecting: the batch mode reports and writes the fixed content
+        """
+        with self.admin_access.cnx() as cnx:
+            service = cnx.create_entity(
+                "Service",
+                category="foo1",
+                level="level-R",
+                dpt_code="75",
+                name="Service de Paris",
+                other="<p>service</p>",
+            )
+            cnx.commit()
+            other = '<div><img src="../file/01c12288z2dsd/illustration_1.jpg"></div>'
+            cnx.system_sql(
+                "UPDATE cw_service SET cw_other=%(o)s WHERE cw_eid=%(e)s",
+                {"o": other, "e": service.eid},
+            )
+            cnx.commit()
+            changes = list(rgaa.rgaa_changes(cnx))
+            self.assertEqual(
+                [change[:3] for change in changes], [("Service", service.eid, "other")]
+            )
+            diff = rgaa.rgaa_diff(changes[0])
+            self.assertIn('+<img src="../file/01c12288z2dsd/illustration_1.jpg" alt="">', diff)
+            eids = rgaa.write_rgaa_changes(cnx, changes, batch_size=1)
+            self.assertEqual(eids, {service.eid})
+            cnx.drop_entity_cache()
+            expected = '<div><img src="../file/01c12288z2dsd/illustration_1.jpg" alt=""></div>'
+            service_after = cnx.entity_from_eid(service.eid)
+            self.assertEqual(service_after.other, expected)
+            self.assertGreater(service_after.modification_date, service.modification_date)
+            self.assertEqual(list(rgaa.rgaa_changes(cnx)), [])
+
+
 if __name__ == "__main__":
     unittest.main()
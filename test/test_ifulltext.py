@@ -30,6 +30,8 @@
 #
 from mock import patch
 
+from elasticsearch_dsl.response import Hit
+
 import os.path as osp
 import datetime as dt
 
@@ -50,6 +52,7 @@ from esfixtures import teardown_module as es_teardown_module  # noqa
 
 from cubicweb_francearchives.dataimport.ead import dates_for_es_doc
 from cubicweb_francearchives.dataimport.oai_nomina import compute_nomina_stable_id
+from cubicweb_francearchives.entities.nomina import serialize_nomina_records
 
 
 def teardown_module(module):
@@ -933,6 +936,7 @@ class ISuggestIndexSerializableTC(
             es_json = nomina.cw_adapt_to("INominaIndexSerializable").serialize()
             expected = {
                 "acte_type": "RM",
+                "acte_year": "1887-1889",
                 "alltext": "R P 392 NMN_E_0 22 laboureur NMN_BN 1867 NMN_R NMN_RM 1887-1889",
                 "authority": [],
                 "creation_date": nomina.creation_date,
@@ -944,7 +948,12 @@ class ISuggestIndexSerializableTC(
                 "locations": ["Arue", "Cère", "France", "Landes", "Mont-de-Marsan"],
                 "modification_date": nomina.modification_date,
                 "names": ["Duprat"],
+                "doctype": "RM",
+                "persons": ["Duprat, Barthélémy"],
                 "service": service.eid,
+                "source_url": (
+                    "http://www.archives.landes.fr/ark:/35227/s0052cbf404e1290/52cc0a4a27570"
+                ),
                 "stable_id": stable_id,
             }
             self.assertEqual(expected, es_json)
@@ -989,6 +998,7 @@ class ISuggestIndexSerializableTC(
             es_json = nomina.cw_adapt_to("INominaIndexSerializable").serialize()
             expected = {
                 "acte_type": "MORT 14-18",
+                "acte_year": "",
                 "alltext": "1R 155 110 ferronnier NMN_BN 1880 NMN_R NMN_RM 1900",
                 "authority": [],
                 "creation_date": nomina.creation_date,
@@ -1006,7 +1016,10 @@ class ISuggestIndexSerializableTC(
                     "Renwez",
                 ],
                 "modification_date": nomina.modification_date,
+                "doctype": "Môrt 14-18",
+                "persons": ["Suquez, Léon Gustave", "Suquez, Jean Gustave"],
                 "service": service.eid,
+                "source_url": "https://archives.cd08.fr/ark:/75583/s0053eb9b6047b1f/53eb9b604f5b9",
                 "stable_id": stable_id,
             }
             self.assertEqual(expected, es_json)
@@ -1044,6 +1057,7 @@ class ISuggestIndexSerializableTC(
             es_json = nomina.cw_adapt_to("INominaIndexSerializable").serialize()
             expected = {
                 "acte_type": "RM",
+                "acte_year": "1900",
                 "alltext": "1R 155 110 ferronnier NMN_RM 1900 Toto Poulet",
                 "authority": [agent.eid],
                 "creation_date": nomina.creation_date,
@@ -1059,11 +1073,49 @@ class ISuggestIndexSerializableTC(
                     "Mézières",
                 ],
                 "modification_date": nomina.modification_date,
+                "doctype": "RM",
+                "persons": ["Suquez, Léon Gustave"],
                 "service": service.eid,
+                "source_url": "https://archives.cd08.fr/ark:/75583/s0053eb9b6047b1f/53eb9b604f5b9",
                 "stable_id": stable_id,
             }
             self.assertEqual(expected, es_json)
 
+    @patch("elasticsearch.client.indices.IndicesClient.exists")
+    @patch("elasticsearch.client.Elasticsearch.index")
+    def test_serialize_nomina_records(self, index, exists):
+        """Check that the chunk serializer produces the same documents as
+        INominaIndexSerializable.serialize"""
+        with self.admin_access.cnx() as cnx:
+            service = cnx.create_entity(
+                "Service", category="cat", name="Ardennes", short_name="Ardennes", code="FRAD008"
+            )
+            agent1 = cnx.create_entity("AgentAuthority", label="Toto Poulet")
+            agent2 = cnx.create_entity("AgentAuthority", label="Jean Lapin")
+            eids = []
+            for oai_id, same_as in (("887", ()), ("888", (agent1,)), ("889", (agent1, agent2))):
+                eids.append(
+                    cnx.create_entity(
+                        "NominaRecord",
+                        stable_id=compute_nomina_stable_id(service.code, oai_id),
+                        oai_id=oai_id,
+                        json_data={
+                            "e": {"RM": {"d": [{"y": "1900"}], "l": [{"d": "Ardennes"}]}},
+                            "p": [{"f": "Léon Gustave", "n": "Suquez"}],
+                            "t": "RM" if oai_id != "889" else None,
+                        },
+                        service=service,
+                        same_as=same_as,
+                    ).eid
+                )
+            cnx.commit()
+            expected = [
+                cnx.entity_from_eid(eid).cw_adapt_to("INominaIndexSerializable").serialize()
+                for eid in eids
+            ]
+            self.assertEqual(expected, serialize_nomina_records(cnx, eids))
+            self.assertEqual([], serialize_nomina_records(cnx, []))
+
     @patch("elasticsearch.client.indices.IndicesClient.exists")
     @patch("elasticsearch.client.Elasticsearch.index")
     def test_nomina_acte_type(self, index, exists):
@@ -1089,6 +1141,7 @@ class ISuggestIndexSerializableTC(
             es_json = nomina.cw_adapt_to("INominaIndexSerializable").serialize()
             expected = {
                 "acte_type": "AU",
+                "acte_year": "",
                 "alltext": "1R 155 110 ferronnier",
                 "authority": [],
                 "creation_date": nomina.creation_date,
@@ -1099,11 +1152,46 @@ class ISuggestIndexSerializableTC(
                 "forenames": ["Léon Gustave"],
                 "modification_date": nomina.modification_date,
                 "names": ["Suquez"],
+                "doctype": "zz",
+                "persons": ["Suquez, Léon Gustave"],
                 "service": service.eid,
+                "source_url": "https://archives.cd08.fr/ark:/75583/s0053eb9b6047b1f/53eb9b604f5b9",
                 "stable_id": stable_id,
             }
             self.assertEqual(expected, es_json)
 
+    @patch("elasticsearch.client.indices.IndicesClient.exists")
+    @patch("elasticsearch.client.Elasticsearch.index")
+    def test_nomina_search_hit_view(self, index, exists):
+        """Trying: render a NominaRecord search result from its ES document
+        Expecting: the same html as the one rendered from the entity
+        """
+        with self.admin_access.cnx() as cnx:
+            service = cnx.create_entity(
+                "Service", category="cat", name="Ardennes", short_name="Ardennes", code="FRAD008"
+            )
+            nomina = cnx.create_entity(
+                "NominaRecord",
+                stable_id=compute_nomina_stable_id(service.code, "888"),
+                oai_id="888",
+                json_data={
+                    "e": {"RM": {"d": [{"y": "1900"}], "l": [{"d": "Ardennes"}]}},
+                    "p": [{"f": "Léon Gustave", "n": "Suquez"}],
+                    "t": "RM",
+                    "u": "https://archives.cd08.fr/ark:/75583/s0053eb9b6047b1f/53eb9b604f5b9",
+                },
+                service=service,
+            )
+            cnx.commit()
+            es_json = nomina.cw_adapt_to("INominaIndexSerializable").serialize()
+        hit = Hit({"_id": es_json["stable_id"], "_source": es_json})
+        with self.admin_access.web_request() as req:
+            entity = req.entity_from_eid(nomina.eid)
+            expected = entity.view("pniasearch-item", es_response=hit)
+            hit_view = req.vreg["views"].select("pniasearch-nomina-hit", req)
+            self.assertTrue(hit_view.can_render(hit))
+            self.assertEqual(expected, hit_view.render(es_response=hit))
+
 
 if __name__ == "__main__":
     unittest.main()
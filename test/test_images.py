@@ -37,7 +37,11 @@ import unittest
 
 from cubicweb import Binary
 from cubicweb.devtools import testlib
-from cubicweb_francearchives.cssimages import static_css_dir, HERO_SIZES
+from cubicweb_francearchives.cssimages import (
+    static_css_dir,
+    HERO_SIZES,
+    regenerate_css_thumbnails,
+)
 from cubicweb_francearchives.testutils import S3BfssStorageTestMixin
 
 
@@ -59,6 +63,11 @@ class ImageTests(S3BfssStorageTestMixin, testlib.CubicWebTC):
                 fullname = osp.join(directory, fname)
                 os.unlink(fullname)
 
+    def wait_for_thumbnails(self):
+        """thumbnails are generated in a thread once the transaction is committed"""
+        for thread in list(self.repo._running_threads):
+            thread.join()
+
     def static_filepath(self, filepath):
         if self.s3_bucket_name:
             return f"static/css/{filepath}"
@@ -89,6 +98,7 @@ class ImageTests(S3BfssStorageTestMixin, testlib.CubicWebTC):
                 image_file=image_file,
             )
             cnx.commit()
+            self.wait_for_thumbnails()
             for size, suffix in HERO_SIZES:
                 image_path = "hero-decouvrir-%s.jpg" % suffix
                 content = self.getFileContent(self.static_filepath(image_path))
@@ -129,6 +139,7 @@ class ImageTests(S3BfssStorageTestMixin, testlib.CubicWebTC):
                 )
                 ce("CssImage", cssid="hero-gerer", order=1, caption="Gerer", image_file=image_file)
                 cnx.commit()
+            self.wait_for_thumbnails()
             sm_filename = self.static_filepath("hero-gerer-sm.jpg")
             content = self.getFileContent(sm_filename)
             image = cnx.find("CssImage", cssid="hero-gerer").one()
@@ -136,9 +147,33 @@ class ImageTests(S3BfssStorageTestMixin, testlib.CubicWebTC):
             with open(osp.join(self.datadir, "hero-gerer.jpg"), "rb") as stream:
                 image.image_file[0].cw_set(data=Binary(stream.read()))
                 cnx.commit()
+            self.wait_for_thumbnails()
             new_content = self.getFileContent(sm_filename)
             self.assertNotEqual(content, new_content)
 
+    def test_regenerate_thumbnails(self):
+        """thumbnails are only generated once for a given image content"""
+        with self.admin_access.cnx() as cnx:
+            self.get_or_create_imported_filepath("hero-decouvrir.jpg")
+            with open(osp.join(self.datadir, "hero-decouvrir.jpg"), "rb") as stream:
+                image_file = cnx.create_entity(
+                    "File",
+                    data_name="hero-decouvrir.jpg",
+                    data_format="image/jpeg",
+                    data=Binary(stream.read()),
+                )
+            cnx.create_entity(
+                "CssImage", cssid="hero-gerer", order=1, caption="Gerer", image_file=image_file
+            )
+            cnx.commit()
+            self.wait_for_thumbnails()
+            self.assertEqual(0, regenerate_css_thumbnails(cnx))
+            self.assertEqual(1, regenerate_css_thumbnails(cnx, force=True))
+            rset = cnx.execute(
+                "Any T WHERE X is File, X title T, X title LIKE 'static/css/hero-gerer-%'"
+            )
+            self.assertEqual(len(HERO_SIZES), len(rset))
+
     def test_dont_update_thumbnails(self):
         with self.admin_access.cnx() as cnx:
             ce = cnx.create_entity
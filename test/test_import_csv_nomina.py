@@ -472,6 +472,7 @@ class CSVNominaImportTC(PostgresTextMixin, NominaImportMixin, CubicWebTC):
                 "_op_type": "index",
                 "_source": {
                     "acte_type": "RM",
+                    "acte_year": "1887",
                     "alltext": "R P 392 domestique NMN_E_0 15 NMN_RM 1887 NMN_BN 1867 NMN_R",
                     "creation_date": nomina.creation_date,
                     "cw_etype": "NominaRecord",
@@ -487,7 +488,12 @@ class CSVNominaImportTC(PostgresTextMixin, NominaImportMixin, CubicWebTC):
                         "Mont-de-Marsan",
                     ],
                     "modification_date": nomina.creation_date,
+                    "doctype": "RM",
+                    "persons": ["Béton, Pierre"],
                     "service": self.service.eid,
+                    "source_url": (
+                        "http://www.archives.landes.fr/ark:/35227/s0052cbf404e1290/52cc0a4a252be"
+                    ),
                     "stable_id": stable_id,
                     "authority": [],
                 },
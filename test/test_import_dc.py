@@ -278,6 +278,8 @@ class CSVDCImportTC(CSVImportMixIn, PostgresTextMixin, testlib.CubicWebTC):
                     "eadid",
                     "scopecontent",
                     "digitized",
+                    "illustration_url",
+                    "digitized_urls",
                     "creation_date",
                     "sortdate",
                     "startyear",
@@ -304,6 +306,8 @@ class CSVDCImportTC(CSVImportMixIn, PostgresTextMixin, testlib.CubicWebTC):
                         "eid": None,
                     },
                     "digitized": True,
+                    "illustration_url": None,
+                    "digitized_urls": [],
                     "eadid": None,
                     "eid": None,
                     "escategory": "archives",
@@ -126,6 +126,26 @@ class EACImportTC(S3BfssStorageTestMixin, PostgresTextMixin, CubicWebTC):
             ]
             self.assertEqual(["FRAN", "FRAN"], services_codes)
 
+    def test_import_eac_files_processes(self):
+        """Test import eac with a pool of parsing processes
+
+        Trying: Import 2 eac notices and an invalid one with 2 processes
+        Expecting: the 2 valid AuthorityRecords are created
+        """
+        with self.admin_access.cnx() as cnx:
+            fspaths = [
+                self.eac_filepath("FRAN_NP_010232.xml"),
+                self.eac_filepath("FRAN_NP_150159.xml"),
+                self.eac_filepath("FRAN_NP_010931.xml"),
+            ]
+            store = create_massive_store(cnx, nodrop=True)
+            eac.eac_import_files(cnx, fspaths, store=store, processes=2)
+            record_ids = [
+                r[0]
+                for r in cnx.execute("Any R ORDERBY R WHERE A record_id R, A is AuthorityRecord")
+            ]
+            self.assertEqual(["FRAN_NP_010232", "FRAN_NP_010931"], record_ids)
+
     def test_import_invalid_eac(self):
         """Test do not import invalid eac notice
 
@@ -62,6 +62,7 @@ from cubicweb_francearchives.dataimport import (
     service_infos_from_filepath,
 )
 from cubicweb_francearchives.dataimport.sqlutil import delete_from_filename
+from cubicweb_francearchives.dataimport.stores import DeferredMassiveObjectStore
 
 from pgfixtures import setup_module, teardown_module  # noqa
 
@@ -392,6 +393,40 @@ class EADImporterTC(EADImportMixin, PostgresTextMixin, CubicWebTC):
             ]
             self.assertCountEqual(got, expected)
 
+    def test_facomponent_precomputed_illustration_url(self):
+        """Illustration and digitized URLs are precomputed in EsDocument
+
+        Trying: import a FAComponent with daos for a service with a thumbnail_url
+        Expecting: EsDocument urls are those computed by the entity
+        """
+        fc_rql = "Any X WHERE X is FAComponent, X did D, D unitid %(u)s"
+        with self.admin_access.cnx() as cnx:
+            cnx.create_entity(
+                "Service",
+                code="FRAD085",
+                category="foo",
+                thumbnail_url="https://archives.vendee.fr/thumbnails/{url}",
+            )
+            cnx.commit()
+            self.import_filepath(cnx, "FRAD085_6Fi.xml")
+            fc = cnx.execute(fc_rql, {"u": "6 Fi 1130"}).one()
+            es_doc = fc.reverse_entity[0].doc
+            self.assertEqual(
+                es_doc["illustration_url"],
+                "https://archives.vendee.fr/thumbnails/Fr/Ad85/2Num8/2Num8_126/2Num8_126_001.jpg",
+            )
+            self.assertEqual(es_doc["illustration_url"], fc.illustration_url)
+            self.assertEqual(es_doc["digitized_urls"], fc.digitized_urls)
+            # modifying the service thumbnail_url updates the EsDocument
+            service = cnx.find("Service", code="FRAD085").one()
+            service.cw_set(thumbnail_url="https://vendee.fr/{url}")
+            cnx.commit()
+            fc = cnx.execute(fc_rql, {"u": "6 Fi 1130"}).one()
+            self.assertEqual(
+                fc.reverse_entity[0].doc["illustration_url"],
+                "https://vendee.fr/Fr/Ad85/2Num8/2Num8_126/2Num8_126_001.jpg",
+            )
+
     def test_facomponent_dao_FRAD085_2C(self):
         """specific rules for Vendée"""
         fc_rql = "Any X WHERE X is FAComponent, X did D, D unitid %(u)s"
@@ -737,6 +772,28 @@ class EADImporterTC(EADImportMixin, PostgresTextMixin, CubicWebTC):
             ]
             self.assertCountEqual(expected, agents)
 
+    def test_store_autoflush(self):
+        """
+        Trying: import a file with a store flushing its buffers every 3 rows
+        Expecting: several flushes occur and all entities and relations are imported
+        """
+        self.store_options = {"autoflush_rows": 3}
+        with patch.object(
+            DeferredMassiveObjectStore,
+            "_flush_buffers",
+            side_effect=DeferredMassiveObjectStore._flush_buffers,
+            autospec=True,
+        ) as flush:
+            with self.admin_access.cnx() as cnx:
+                self.import_filepath(cnx, "FRAN_IR_0261167_excerpt.xml")
+                self.assertGreater(flush.call_count, 2)
+                self.assertEqual(len(cnx.find("AgentName")), 4)
+                comp = cnx.find("FAComponent").one()
+                agents = [i.label for i in comp.agent_indexes().entities()]
+                self.assertCountEqual(
+                    ["Direction de l'eau", "Jean-Michel", "Jean-Paul", "jean-Michel"], agents
+                )
+
     def test_subject_index_creation(self):
         with self.admin_access.cnx() as cnx:
             self.import_filepath(cnx, "FRAN_IR_0261167_excerpt.xml")
@@ -102,7 +102,10 @@ class OaiEadImportTC(EADImportMixin, PostgresTextMixin, OaiSickleMixin, CubicWeb
             self.service_infos = service_infos_from_service_code(self.service.code, services_map)
 
     def test_service_infos(self):
-        self.assertEqual(set(self.service_infos.keys()), {"code", "name", "eid", "level", "title"})
+        self.assertEqual(
+            set(self.service_infos.keys()),
+            {"code", "name", "eid", "level", "title", "thumbnail_url"},
+        )
 
     def test_dump(self):
         """Test OAI EAD standard importing.
@@ -53,6 +53,7 @@ from cubicweb_francearchives.testutils import (
     PostgresTextMixin,
     S3BfssStorageTestMixin,
     create_authority_record,
+    create_findingaid,
 )
 from pgfixtures import setup_module, teardown_module  # noqa
 from cubicweb_francearchives import S3_ACTIVE
@@ -227,6 +228,94 @@ class FARoutesTests(S3BfssStorageTestMixin, PostgresTextMixin, PyramidCWTest):
     def test_noresult_yields_404(self):
         self.webapp.get("/findingaid/abc123/rdf.xml", status=404)
 
+    def test_famap_data(self):
+        """
+        Trying: index a FindingAid with a geolocated LocationAuthority
+        Expecting: the geomap is updated by hooks and served with an ETag
+                   supporting conditional requests
+        """
+        with self.admin_access.cnx() as cnx:
+            service = cnx.create_entity("Service", code="FRAD054", category="foo")
+            fa = create_findingaid(cnx, "eadid", service)
+            loc = cnx.create_entity(
+                "LocationAuthority", label="Nancy", latitude=48.69, longitude=6.18
+            )
+            cnx.create_entity("Geogname", label="Nancy", index=fa, authority=loc)
+            cnx.commit()
+        resp = self.webapp.get("/fa-map.json")
+        markers = json.loads(resp.body)
+        self.assertEqual(
+            [(m["eid"], m["label"], m["lat"], m["lng"], m["count"]) for m in markers],
+            [(loc.eid, "Nancy", 48.69, 6.18, 1)],
+        )
+        # urls are built with the base url of the serving instance
+        self.assertEqual(
+            markers[0]["url"], "http://testing.fr/cubicweb/location/{}".format(loc.eid)
+        )
+        self.webapp.get("/fa-map.json", headers={"If-None-Match": resp.etag}, status=304)
+        with self.admin_access.cnx() as cnx:
+            # the geomap of the consultation instance is also updated
+            cache = cnx.find("Caches", name="geomap", instance_type="consultation").one()
+            self.assertEqual(
+                [(m["eid"], m["url"]) for m in cache.values],
+                [(loc.eid, "location/{}".format(loc.eid))],
+            )
+        with self.admin_access.cnx() as cnx:
+            cnx.entity_from_eid(loc.eid).cw_set(latitude=None)
+            cnx.commit()
+        resp = self.webapp.get("/fa-map.json", headers={"If-None-Match": resp.etag})
+        self.assertEqual(json.loads(resp.body), [])
+
+    def test_services_map_data(self):
+        """
+        Trying: get the services map of a department before and after a
+                service contributes a FindingAid
+        Expecting: services are flagged as partners and the map is served
+                   with an ETag supporting conditional requests
+        """
+        with self.admin_access.cnx() as cnx:
+            sn = cnx.create_entity("SocialNetwork", name="facebook", url="http://fb.com/ad54")
+            service = cnx.create_entity(
+                "Service",
+                code="FRAD054",
+                category="foo",
+                name="AD 54",
+                level="level-D",
+                dpt_code="54",
+                latitude=48.69,
+                longitude=6.18,
+                service_social_network=sn,
+            )
+            cnx.create_entity(
+                "Service", code="FRAD055", category="foo", level="level-D", dpt_code="55"
+            )
+            cnx.commit()
+        resp = self.webapp.get("/services-map.json", params={"dpt": "54"})
+        data = json.loads(resp.body)["data"]
+        self.assertEqual(list(data), ["D"])
+        (feature,) = data["D"]["features"]
+        self.assertEqual(feature["properties"]["eid"], str(service.eid))
+        self.assertEqual(feature["properties"]["partner"], "0")
+        self.assertEqual(
+            feature["properties"]["service_social_network"], [["facebook", "http://fb.com/ad54"]]
+        )
+        self.webapp.get(
+            "/services-map.json",
+            params={"dpt": "54"},
+            headers={"If-None-Match": resp.etag},
+            status=304,
+        )
+        with self.admin_access.cnx() as cnx:
+            create_findingaid(cnx, "eadid", cnx.entity_from_eid(service.eid))
+            cnx.commit()
+        resp = self.webapp.get(
+            "/services-map.json", params={"dpt": "54"}, headers={"If-None-Match": resp.etag}
+        )
+        (feature,) = json.loads(resp.body)["data"]["D"]["features"]
+        self.assertEqual(feature["properties"]["partner"], "1")
+        self.assertEqual(feature["properties"]["ead"], "1")
+        self.assertEqual(feature["properties"]["nomina"], "0")
+
 
 def mock_file_download_view(entity_call):
     class MockFileDownloadView(EntityView):
@@ -758,6 +847,9 @@ index_entry,index_type,documents
             )
             self.assertEqual(res.body, expected.encode("utf-8"))
 
+    def test_indices_csv_export_unknown_type(self):
+        self.webapp.get("/indices-unknown.csv", status=404)
+
     def test_authorityrecord_csv_export(self):
         with self.admin_access.cnx() as cnx:
             with self.admin_access.cnx() as cnx:
@@ -33,8 +33,12 @@
 # flake8: noqa
 
 
+import os
+import os.path as osp
+import tempfile
 import unittest
-from mock import Mock, MagicMock
+from mock import Mock, MagicMock, patch
+from elasticsearch.serializer import JSONSerializer
 import string
 
 from cubicweb.devtools.testlib import CubicWebTC
@@ -48,9 +52,14 @@ from cubicweb_francearchives.dataimport import (
     normalize_entry,
     clean,
 )
+from cubicweb_francearchives.dataimport import importall
+from cubicweb_francearchives.dataimport.importstats import STATS, file_stats, log_summary
+from cubicweb_francearchives.dataimport.esbulk import action_size, chunk_actions
 from cubicweb_francearchives.xmlutils import process_html, fix_fa_external_links as fa_fix_links
+from cubicweb_francearchives.xmlutils import PROCESS_HTML_CACHE
 
-from cubicweb_francearchives.testutils import S3BfssStorageTestMixin
+from cubicweb_francearchives.facomponents import facomponent_rows
+from cubicweb_francearchives.testutils import S3BfssStorageTestMixin, create_findingaid
 from cubicweb_francearchives.views.forms import EMAIL_REGEX
 from cubicweb_francearchives.views.search import PniaElasticSearchView
 from cubicweb_francearchives.utils import (
@@ -59,6 +68,17 @@ from cubicweb_francearchives.utils import (
     find_card,
     id_for_anchor,
     merge_dicts,
+    bump_es_index_generation,
+    es_index_generation,
+    ES_GENERATION_META,
+    iter_rql_chunks,
+    iter_rql_entities,
+    iter_sql_chunks,
+    keyset_rql,
+    LRUCache,
+    rql_chunk_boundaries,
+    services_registry,
+    services_short_names,
 )
 from cubicweb_francearchives.xmlutils import (
     enhance_accessibility,
@@ -138,6 +158,25 @@ class UtilsTest(S3BfssStorageTestMixin, CubicWebTC):
             got = process_html(cnx, html, labels=labels)
             self.assertEqual(got, expected)
 
+    def test_process_html_cache(self):
+        """
+        Trying: process the same html twice, then in another language
+        Expecting: the html is only parsed once per language
+        """
+        html = '<div class="ead-section ead-p"><a href="http://www.example.com">example</a></div>'
+        PROCESS_HTML_CACHE.clear()
+        with patch(
+            "cubicweb_francearchives.xmlutils.fix_fa_external_links", side_effect=fa_fix_links
+        ) as fix_links:
+            with self.admin_access.cnx() as cnx:
+                first = process_html(cnx, html)
+                self.assertIn('target="_blank"', first)
+                self.assertEqual(process_html(cnx, html), first)
+                self.assertEqual(fix_links.call_count, 1)
+                cnx.set_language("en")
+                self.assertEqual(process_html(cnx, html), first)
+                self.assertEqual(fix_links.call_count, 2)
+
     def test_process_links_for_csv_ok(self):
         html = """<div class="related-productors"><a href="http://localhost:9998/fr/authorityrecord/FRAN_NP_003944" title="">France. Ministère des Universités (1974-1981)</a><div class="related-productors__dates"><span class="eac-sub-label">dates :</span> 5/07/1974-31/12/1975</div></div>"""
         expected = """(http://localhost:9998/fr/authorityrecord/FRAN_NP_003944) France. Ministère des Universités (1974-1981) dates :  5/07/1974-31/12/1975"""
@@ -162,6 +201,70 @@ class UtilsTest(S3BfssStorageTestMixin, CubicWebTC):
         for args in test_cases:
             self.assertEqual(old_merge_dicts(*args), merge_dicts(*args))
 
+    def test_services_registry(self):
+        """
+        Trying: load the services registry
+        Expecting: records give the same labels as the Service entities
+        """
+        with self.admin_access.cnx() as cnx:
+            service = cnx.create_entity(
+                "Service",
+                category="foo",
+                level="level-D",
+                code="fr_ad75",
+                name="Archives de Paris",
+                name2="AD 75",
+            )
+            other = cnx.create_entity(
+                "Service", category="foo", level="level-R", name="Archives", short_name="AR"
+            )
+            cnx.commit()
+            by_code, by_eid = services_registry(cnx)
+            record = by_code["FR_AD75"]
+            self.assertEqual(record.eid, service.eid)
+            self.assertEqual(record.publisher(), service.publisher())
+            self.assertEqual(record.dc_title(), service.dc_title())
+            self.assertEqual(by_eid[other.eid].publisher(), "AR")
+            self.assertEqual(
+                services_short_names(cnx, [str(other.eid), "foo", None]), {other.eid: "AR"}
+            )
+
+    def test_facomponent_rows(self):
+        """
+        Trying: load the components of a finding aid as rows
+        Expecting: rows are in document order and hold did, dao and indexes
+        """
+        with self.admin_access.cnx() as cnx:
+            service = cnx.create_entity("Service", category="foo", name="Service")
+            fa = create_findingaid(cnx, "eadid", service)
+
+            def component(stable_id, order, parent=None):
+                return cnx.create_entity(
+                    "FAComponent",
+                    finding_aid=fa,
+                    stable_id=stable_id,
+                    component_order=order,
+                    parent_component=parent,
+                    did=cnx.create_entity("Did", unitid=stable_id, unittitle=stable_id),
+                )
+
+            c2 = component("c2", 2)
+            c1 = component("c1", 1)
+            component("c1-2", 2, c1)
+            c11 = component("c1-1", 1, c1)
+            component("c2-1", 1, c2)
+            cnx.create_entity(
+                "DigitizedVersion", illustration_url="http://a.jpg", reverse_digitized_versions=c11
+            )
+            cnx.create_entity("Geogname", label="Paris", index=c11)
+            cnx.commit()
+            rows = facomponent_rows(cnx, fa.eid)
+            self.assertEqual([row.stable_id for row in rows], ["c1", "c1-1", "c1-2", "c2", "c2-1"])
+            self.assertEqual(rows[1].unittitle, "c1-1")
+            self.assertEqual(rows[1].dao, ("http://a.jpg",))
+            self.assertEqual(rows[1].indexes, [("geogname", "Paris")])
+            self.assertEqual(rows[0].dao, ())
+
     def test_find_card_nocard(self):
         with self.admin_access.cnx() as cnx:
             self.assertIsNone(find_card(cnx, "no-such-wikiid"))
@@ -296,6 +399,81 @@ class UtilsTest(S3BfssStorageTestMixin, CubicWebTC):
         self.assertEqual(len(pagination[0]), 2)
         self.assertEqual(len(pagination[1]), 0)
 
+    def test_lru_cache(self):
+        cache = LRUCache(10)
+        self.assertEqual(cache.get("a", lambda: "aaaa"), "aaaa")
+        self.assertEqual(cache.get("b", lambda: "bbbb"), "bbbb")
+        # cached value is returned
+        self.assertEqual(cache.get("a", lambda: "other"), "aaaa")
+        # "b" is the least recently used value
+        self.assertEqual(cache.get("c", lambda: "cccc"), "cccc")
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.size, 8)
+        self.assertEqual(cache.get("b", lambda: "new"), "new")
+        # values bigger than the cache are not stored
+        self.assertEqual(cache.get("d", lambda: "d" * 11), "d" * 11)
+        self.assertEqual(cache.get("d", lambda: "d"), "d")
+
+    def test_es_index_generation(self):
+        es = Mock()
+        es.indices.get_mapping.return_value = {"idx_1": {"mappings": {"_meta": {"other": 1}}}}
+        bump_es_index_generation(es, {"idx_all", None})
+        es.indices.refresh.assert_called_once_with(index=["idx_all"], ignore_unavailable=True)
+        # the existing `_meta` is kept
+        meta = es.indices.put_mapping.call_args[1]["body"]["_meta"]
+        self.assertEqual(meta["other"], 1)
+        es.indices.put_mapping.assert_called_once_with(index="idx_1", body={"_meta": meta})
+        es.indices.get_mapping.return_value = {"idx_1": {"mappings": {"_meta": meta}}}
+        self.assertEqual(es_index_generation(es, "idx_all"), (("idx_1", meta[ES_GENERATION_META]),))
+        # the generation is cached for a few seconds
+        es.indices.get_mapping.return_value = {}
+        self.assertEqual(es_index_generation(es, "idx_all"), (("idx_1", meta[ES_GENERATION_META]),))
+        # nothing has been indexed
+        es.reset_mock()
+        bump_es_index_generation(es, {None})
+        es.indices.put_mapping.assert_not_called()
+
+    def test_keyset_rql(self):
+        self.assertEqual(
+            keyset_rql("Any X, L where X is Card, X title L", 10),
+            "Any X,L ORDERBY X LIMIT 10 WHERE X is Card, X title L, X eid > %(keyset_last)s",
+        )
+        self.assertEqual(
+            keyset_rql("Any X WHERE X is Card, NOT EXISTS(Y is Card, Y eid > X)", 10),
+            "Any X ORDERBY X LIMIT 10 WHERE X is Card, NOT EXISTS(Y is Card, Y eid > X), "
+            "X eid > %(keyset_last)s",
+        )
+        with self.assertRaises(AssertionError):
+            keyset_rql("Any L, X WHERE X is Card, X title L", 10)
+
+    def test_keyset_pagination(self):
+        with self.admin_access.cnx() as cnx:
+            eids = [
+                cnx.create_entity("Card", title=f"card {i}", wikiid=f"card-{i}").eid
+                for i in range(7)
+            ]
+            cnx.commit()
+            query = "Any X, T WHERE X is Card, X title T, X wikiid LIKE %(w)s"
+            kwargs = {"w": "card-%"}
+            rsets = list(iter_rql_chunks(cnx, query, kwargs, chunksize=3))
+            self.assertEqual([len(rset) for rset in rsets], [3, 3, 1])
+            entities = iter_rql_entities(cnx, query, kwargs, chunksize=3)
+            self.assertEqual([e.eid for e in entities], eids)
+            self.assertEqual(
+                rql_chunk_boundaries(cnx, query, kwargs, chunksize=3), [0, eids[2], eids[5]]
+            )
+            self.assertEqual(rql_chunk_boundaries(cnx, query, kwargs, chunksize=3, max_rows=3), [0])
+            # no empty chunk when the number of rows is a multiple of chunksize
+            self.assertEqual(rql_chunk_boundaries(cnx, query, kwargs, chunksize=7), [0])
+            chunks = list(
+                iter_sql_chunks(
+                    cnx,
+                    "SELECT cw_eid, cw_title FROM cw_card WHERE cw_wikiid LIKE 'card-%%'",
+                    chunksize=4,
+                )
+            )
+            self.assertEqual([[row[0] for row in rows] for rows in chunks], [eids[:4], eids[4:]])
+
     def test_clean_up_punctuation(self):
         """Test filename clean-up.
 
@@ -590,6 +768,156 @@ class ImportUtiles(S3BfssStorageTestMixin, CubicWebTC):
         data = pdf.pdf_infos(pdffile)
         self.assertEqual(data["text"], "Test\nCirculaire chat\n\n\x0c")
 
+    def test_pdf_text_cache(self):
+        """
+        Trying: extract the text of a pdf file twice with a text cache
+        Expecting: the second extraction is read from the cache
+        """
+        pdffile = self.get_or_create_imported_filepath("pdf.pdf")
+        with tempfile.TemporaryDirectory() as cachedir:
+            cache = pdf.PdfTextCache(cachedir)
+            data = pdf.pdf_infos(pdffile, sha1="a" * 40, cache=cache)
+            self.assertEqual(data["text"], "Test\nCirculaire chat\n\n\x0c")
+            self.assertEqual(cache.get("a" * 40), data["text"])
+            with patch("cubicweb_francearchives.dataimport.pdf.pdftotext") as pdftotext:
+                data = pdf.pdf_infos(pdffile, sha1="a" * 40, cache=cache)
+                pdftotext.assert_not_called()
+            self.assertEqual(data["text"], "Test\nCirculaire chat\n\n\x0c")
+
+    def test_pdf_text_cache_failure(self):
+        """
+        Trying: extract the text of a pdf file with a text cache while pdftotext fails
+        Expecting: the empty text is not cached and the next extraction is tried again
+        """
+        pdffile = self.get_or_create_imported_filepath("pdf.pdf")
+        with tempfile.TemporaryDirectory() as cachedir:
+            cache = pdf.PdfTextCache(cachedir)
+            with patch(
+                "cubicweb_francearchives.dataimport.pdf.pdftotext", return_value=None
+            ) as pdftotext:
+                data = pdf.pdf_infos(pdffile, sha1="a" * 40, cache=cache)
+                pdftotext.assert_called_once()
+            self.assertEqual(data["text"], "")
+            self.assertIsNone(cache.get("a" * 40))
+            data = pdf.pdf_infos(pdffile, sha1="a" * 40, cache=cache)
+            self.assertEqual(data["text"], "Test\nCirculaire chat\n\n\x0c")
+
+    def test_pdf_text_cache_prune(self):
+        """
+        Trying: fill a pdf text cache over its size limit
+        Expecting: least recently used texts are removed
+        """
+        with tempfile.TemporaryDirectory() as cachedir:
+            cache = pdf.PdfTextCache(cachedir, max_size=25)
+            cache.set("a" * 40, "a" * 10)
+            cache.set("b" * 40, "b" * 10)
+            os.utime(cache.path("a" * 40), (0, 0))
+            cache.set("c" * 40, "c" * 10)
+            self.assertIsNone(cache.get("a" * 40))
+            self.assertEqual(cache.get("b" * 40), "b" * 10)
+            self.assertEqual(cache.get("c" * 40), "c" * 10)
+
+    def test_chunk_es_actions(self):
+        """
+        Trying: chunk a stream of ES bulk actions
+        Expecting: chunks are bounded by a number of actions and a size in bytes
+        """
+        actions = ({"_id": i, "_index": "idx", "_source": {"n": i}} for i in range(10))
+        chunks = list(chunk_actions(actions, 4, 1000, lambda action: 10))
+        self.assertEqual([len(chunk) for chunk in chunks], [4, 4, 2])
+        actions = [{"_id": i, "_index": "idx", "_source": {"n": i}} for i in range(10)]
+        chunks = list(chunk_actions(actions, 4, 25, lambda action: 10))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 2, 2, 2])
+        # an action bigger than the limit is sent alone
+        chunks = list(chunk_actions(actions[:3], 4, 5, lambda action: 10))
+        self.assertEqual([len(chunk) for chunk in chunks], [1, 1, 1])
+        serializer = JSONSerializer()
+        action = {"_op_type": "delete", "_index": "idx", "_id": "1"}
+        self.assertEqual(
+            action_size(serializer, action),
+            len('{"delete":{"_index":"idx","_id":"1"}}') + 1,
+        )
+
+    def test_import_all_steps(self):
+        """
+        Trying: schedule import-all steps with declared dependencies
+        Expecting: independent steps run together within the slots budget,
+                   massive store imports run one at a time and steps
+                   depending on a failed one are not run
+        """
+        yamlconfig = {
+            "commands": ["import-directories", "import-maps", "import-ead", "es"],
+            "import-maps": {"depends_on": []},
+            "import-ead": {"depends_on": ["import-directories"], "slots": 2},
+            "es": {"depends_on": ["import-ead", "import-maps"]},
+        }
+        steps = importall.build_steps(yamlconfig, lambda name: [name])
+        self.assertEqual(steps["es"].depends_on, ("import-ead", "import-maps"))
+        rounds = []
+
+        def spawn(step):
+            rounds[-1].append(step.name)
+            return Mock(poll=Mock(return_value=1 if step.name == "import-ead" else 0))
+
+        journal = Mock()
+        with patch("time.sleep", side_effect=lambda _: rounds.append([])):
+            rounds.append([])
+            failed = importall.run_steps(steps, 2, journal, spawn=spawn, poll_interval=0)
+        self.assertEqual(failed, ["import-ead"])
+        self.assertEqual(rounds, [["import-directories", "import-maps"], ["import-ead"], []])
+        journal.finished.assert_any_call("import-ead", False)
+        self.assertTrue(steps["import-ead"].exclusive)
+        self.assertFalse(steps["import-maps"].exclusive)
+        # massive store imports do not run together even if independent
+        yamlconfig = {
+            "commands": ["ead-1", "ead-2", "import-maps"],
+            "ead-1": {"command": "import-ead", "depends_on": []},
+            "ead-2": {"command": "import-ead", "depends_on": []},
+            "import-maps": {"depends_on": []},
+        }
+        steps = importall.build_steps(
+            yamlconfig, lambda name: [yamlconfig[name].get("command", name)]
+        )
+        rounds = []
+        with patch("time.sleep", side_effect=lambda _: rounds.append([])):
+            rounds.append([])
+            failed = importall.run_steps(steps, 3, journal, spawn=spawn, poll_interval=0)
+        self.assertEqual(failed, [])
+        self.assertEqual(rounds, [["ead-1", "import-maps"], ["ead-2"], []])
+        # without declared dependencies, steps are chained
+        steps = importall.build_steps({"commands": ["a", "b"]}, lambda name: [name])
+        self.assertEqual(steps["b"].depends_on, ("a",))
+        with self.assertRaises(ValueError):
+            importall.build_steps(
+                {"commands": ["a", "b"], "a": {"depends_on": "b"}, "b": {"depends_on": "a"}},
+                lambda name: [name],
+            )
+
+    def test_import_stats(self):
+        """
+        Trying: time import stages of two files with statistics enabled
+        Expecting: stages and counters are dumped per file and summarized,
+                   stages timed outside of an imported file are ignored
+        """
+        with tempfile.TemporaryDirectory() as stats_dir:
+            for filepath in ("a.xml", "b.xml"):
+                with file_stats({"stats_dir": stats_dir}, filepath):
+                    with STATS.timer("preprocess_ead"):
+                        pass
+                    list(STATS.timed_iter("walk", range(3)))
+                    STATS.incr("es_documents", 2)
+            with STATS.timer("outside"):
+                pass
+            summary = log_summary(stats_dir)
+            self.assertTrue(osp.isfile(osp.join(stats_dir, "summary.json")))
+        self.assertEqual(summary["files"], 2)
+        self.assertEqual(summary["stages"]["preprocess_ead"]["calls"], 2)
+        # the end of each iteration is also timed
+        self.assertEqual(summary["stages"]["walk"]["calls"], 8)
+        self.assertNotIn("outside", summary["stages"])
+        self.assertEqual(summary["counters"], {"es_documents": 4})
+        self.assertCountEqual([s["file"] for s in summary["slowest"]], ["a.xml", "b.xml"])
+
 
 if __name__ == "__main__":
     unittest.main()